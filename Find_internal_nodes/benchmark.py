@@ -0,0 +1,84 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from find_internal_node import (find_internal_nodes_num, find_internal_nodes_num_np, count_internal_nodes_file,
+                                count_internal_nodes_shards, shard_parent_bitmap)
+
+
+def random_tree(n, seed=0):
+    """
+        Generate a random parent array where every node's parent has a smaller index.
+
+        Args:
+            n (int): The number of nodes.
+            seed (int): The random seed.
+
+        Returns:
+            np.ndarray: The int32 parent array, -1 for the root at index 0.
+    """
+    rng = np.random.default_rng(seed)
+    parents = (rng.random(n) * np.arange(n)).astype(np.int32)
+    parents[0] = -1
+    return parents
+
+
+def measure(func, *args):
+    """
+        Run a function once, measuring wall time and peak traced memory.
+
+        Returns:
+            tuple: The result, the seconds taken, and the peak memory in MiB.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the set and NumPy internal-node counters.')
+    parser.add_argument('-n', type=int, default=10 ** 7, help='number of nodes')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='also time the process pool on this many shard files, for 1..CPU count workers')
+    args = parser.parse_args()
+
+    tree = random_tree(args.n)
+    # The set version works on a Python list, which is built outside the measurement
+    tree_list = tree.tolist()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'tree.bin')
+        tree.tofile(path)
+        runs = [
+            ('set (list input)', find_internal_nodes_num, tree_list),
+            ('numpy (in memory)', find_internal_nodes_num_np, tree),
+            ('numpy (memory-mapped file)', count_internal_nodes_file, path),
+        ]
+        print(f"{'implementation':<28}{'count':>12}{'seconds':>10}{'peak MiB':>10}")
+        for name, func, arg in runs:
+            result, elapsed, peak = measure(func, arg)
+            print(f"{name:<28}{result:>12}{elapsed:>10.3f}{peak:>10.1f}")
+
+        if args.shards:
+            paths = []
+            for i, shard in enumerate(np.array_split(tree, args.shards)):
+                paths.append(os.path.join(tmp, f'shard-{i}.bin'))
+                shard.tofile(paths[-1])
+            # Each worker holds the packed bitmap of its shard, one bit per node
+            _, elapsed, peak = measure(shard_parent_bitmap, paths[-1])
+            print(f"\none shard bitmap: {elapsed:.3f} s, peak {peak:.1f} MiB")
+            workers = 1
+            baseline = None
+            print(f"\n{'workers':<10}{'count':>12}{'seconds':>10}{'speedup':>10}")
+            while workers <= os.cpu_count():
+                start = time.perf_counter()
+                result = count_internal_nodes_shards(paths, workers=workers)
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                print(f"{workers:<10}{result:>12}{elapsed:>10.3f}{baseline / elapsed:>10.2f}")
+                workers *= 2
@@ -1,3 +1,16 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+# Number of parent indices processed at once by the streaming readers
+DEFAULT_CHUNK_SIZE = 1 << 22
+# Bytes of text read at once; each parent index takes a few bytes
+TEXT_BLOCK_SIZE = 1 << 24
+# Number of set bits in every byte value, to count the bits of packed bitmaps
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
 def find_internal_nodes_num(tree):
     # Create a set to store unique parent nodes
     internal_nodes = set()
@@ -11,5 +24,266 @@ def find_internal_nodes_num(tree):
     return len(internal_nodes)
 
 
-my_tree = [4, 4, 1, 5, -1, 4, 5]
-print(find_internal_nodes_num(my_tree))
+def mark_parents(parents, bitmap=None):
+    """
+        Mark the parent indices of a chunk in a bitmap of internal nodes.
+
+        The bitmap holds one byte per node, so memory stays proportional to the
+        number of nodes instead of growing with Python objects per parent.
+
+        Args:
+            parents (array-like): Parent indices, -1 for the root.
+            bitmap (np.ndarray, optional): The bitmap to update; grown as needed.
+
+        Returns:
+            np.ndarray: The updated boolean bitmap.
+    """
+    parents = np.asarray(parents)
+    parents = parents[parents >= 0]
+    if bitmap is None:
+        bitmap = np.zeros(0, dtype=bool)
+    if parents.size == 0:
+        return bitmap
+    size = int(parents.max()) + 1
+    if size > bitmap.size:
+        grown = np.zeros(max(size, 2 * bitmap.size), dtype=bool)
+        grown[:bitmap.size] = bitmap
+        bitmap = grown
+    bitmap[parents] = True
+    return bitmap
+
+
+def mark_parents_packed(parents, packed=None):
+    """
+        Mark the parent indices of a chunk in a bitmap packed eight nodes per byte.
+
+        The bits are set in place, most significant first like np.packbits, so the
+        bitmap costs one bit per node instead of the byte of mark_parents.
+
+        Args:
+            parents (array-like): Parent indices, -1 for the root.
+            packed (np.ndarray, optional): The packed bitmap to update; grown as needed.
+
+        Returns:
+            np.ndarray: The updated packed bitmap.
+    """
+    parents = np.asarray(parents)
+    parents = parents[parents >= 0]
+    if packed is None:
+        packed = np.zeros(0, dtype=np.uint8)
+    if parents.size == 0:
+        return packed
+    size = (int(parents.max()) >> 3) + 1
+    if size > packed.size:
+        grown = np.zeros(max(size, 2 * packed.size), dtype=np.uint8)
+        grown[:packed.size] = packed
+        packed = grown
+    # uint8 masks keep the temporaries of a chunk at a byte per parent
+    masks = np.right_shift(np.uint8(0x80), parents.astype(np.uint8) & np.uint8(7))
+    np.bitwise_or.at(packed, parents >> 3, masks)
+    return packed
+
+
+def iter_chunks(tree, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Split an in-memory or memory-mapped parent array into chunks.
+
+        Args:
+            tree (array-like): The parent array.
+            chunk_size (int): The number of parent indices per chunk.
+
+        Yields:
+            np.ndarray: Views of consecutive parent indices.
+    """
+    tree = np.asarray(tree)
+    for start in range(0, tree.size, chunk_size):
+        yield tree[start:start + chunk_size]
+
+
+def find_internal_nodes_num_np(tree, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Count the internal nodes of a parent array with a NumPy bitmap.
+
+        Args:
+            tree (array-like): The parent array, -1 for the root.
+            chunk_size (int): The number of parent indices processed at once.
+
+        Returns:
+            int: The number of internal nodes.
+    """
+    tree = np.asarray(tree)
+    # Parents of a valid tree index into the array itself, so the bitmap never grows
+    return count_internal_nodes(iter_chunks(tree, chunk_size), size_hint=tree.size)
+
+
+def count_internal_nodes(chunks, size_hint=0):
+    """
+        Count the internal nodes of a parent array given as a stream of chunks.
+
+        Args:
+            chunks (iterable[np.ndarray]): Consecutive parent indices.
+            size_hint (int): The expected number of nodes, to size the bitmap up front.
+
+        Returns:
+            int: The number of internal nodes.
+    """
+    bitmap = np.zeros(size_hint, dtype=bool)
+    for chunk in chunks:
+        bitmap = mark_parents(chunk, bitmap)
+    return int(np.count_nonzero(bitmap))
+
+
+def detect_format(path):
+    """
+        Guess the format of a parent array file from its extension.
+
+        Args:
+            path (str): The file path.
+
+        Returns:
+            str: npy for NumPy files, bin for raw little-endian int32, text otherwise.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.npy':
+        return 'npy'
+    if extension in ('.bin', '.i32'):
+        return 'bin'
+    return 'text'
+
+
+def read_parent_chunks(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Stream a parent array file in chunks.
+
+        Binary files are memory-mapped, so only the pages of the current chunk are
+        resident. Text files hold integers separated by whitespace or commas,
+        optionally wrapped in brackets like a Python list, and are parsed block by block.
+
+        Args:
+            path (str): The file path.
+            fmt (str, optional): npy, bin or text; detected from the extension if None.
+            chunk_size (int): The number of parent indices per chunk for binary files.
+
+        Yields:
+            np.ndarray: Consecutive parent indices.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == 'npy':
+        yield from iter_chunks(np.load(path, mmap_mode='r').ravel(), chunk_size)
+    elif fmt == 'bin':
+        if os.path.getsize(path):
+            yield from iter_chunks(np.memmap(path, dtype='<i4', mode='r'), chunk_size)
+    elif fmt == 'text':
+        separators = str.maketrans('[],\t\r', '     ')
+        with open(path) as f:
+            tail = ''
+            while True:
+                block = f.read(TEXT_BLOCK_SIZE)
+                if not block:
+                    break
+                block = tail + block.translate(separators)
+                # Keep a number split across blocks for the next block
+                cut = max(block.rfind(' '), block.rfind('\n'))
+                block, tail = block[:cut + 1], block[cut + 1:]
+                # fromstring parses a blank block as a single 0
+                if block.strip():
+                    yield np.fromstring(block, dtype=np.int64, sep=' ')
+            if tail.strip():
+                yield np.fromstring(tail, dtype=np.int64, sep=' ')
+    else:
+        raise ValueError(f"Unknown parent array format: {fmt}")
+
+
+def count_internal_nodes_file(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Count the internal nodes of a parent array stored in a file.
+
+        Args:
+            path (str): The file path.
+            fmt (str, optional): npy, bin or text; detected from the extension if None.
+            chunk_size (int): The number of parent indices processed at once.
+
+        Returns:
+            int: The number of internal nodes.
+    """
+    return count_internal_nodes(read_parent_chunks(path, fmt, chunk_size))
+
+
+def shard_parent_bitmap(path, fmt=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Build the packed bitmap of the parents referenced by one shard file.
+
+        Shards hold consecutive slices of one global parent array, so parent indices
+        are global and the bitmaps of all shards can be merged with a bitwise OR. The
+        bits are set directly in the packed bitmap, so a worker holds one bit per node.
+
+        Args:
+            path (str): The shard file path.
+            fmt (str, optional): npy, bin or text; detected from the extension if None.
+            chunk_size (int): The number of parent indices processed at once.
+
+        Returns:
+            np.ndarray: The bitmap packed eight nodes per byte.
+    """
+    packed = None
+    for chunk in read_parent_chunks(path, fmt, chunk_size):
+        packed = mark_parents_packed(chunk, packed)
+    return packed if packed is not None else np.zeros(0, dtype=np.uint8)
+
+
+def merge_bitmaps(merged, packed):
+    """
+        Merge a packed bitmap into another with a bitwise OR, growing it as needed.
+
+        Args:
+            merged (np.ndarray): The packed bitmap merged so far.
+            packed (np.ndarray): The packed bitmap to merge in.
+
+        Returns:
+            np.ndarray: The merged packed bitmap.
+    """
+    if packed.size > merged.size:
+        merged, packed = packed.copy(), merged
+    merged[:packed.size] |= packed
+    return merged
+
+
+def count_internal_nodes_shards(paths, fmt=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+        Count the internal nodes of a tree split across shard files, one process per shard.
+
+        Workers return packed bitmaps, so each shard costs one bit per node to ship
+        back, and results are merged as they complete.
+
+        Args:
+            paths (list[str]): The shard file paths.
+            fmt (str, optional): npy, bin or text; detected from each extension if None.
+            workers (int, optional): The number of processes; the CPU count if None.
+            chunk_size (int): The number of parent indices processed at once.
+
+        Returns:
+            int: The number of internal nodes.
+    """
+    merged = np.zeros(0, dtype=np.uint8)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(shard_parent_bitmap, path, fmt, chunk_size) for path in paths]
+        for future in as_completed(futures):
+            merged = merge_bitmaps(merged, future.result())
+    return int(POPCOUNT[merged].sum(dtype=np.int64))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count the internal nodes of a parent-array tree.')
+    parser.add_argument('paths', nargs='*', metavar='path',
+                        help='parent array file (.npy, .bin/.i32 int32, or text); several for shards')
+    parser.add_argument('--format', choices=['npy', 'bin', 'text'], help='override the detected file format')
+    parser.add_argument('--workers', type=int, help='number of processes for shards (default: CPU count)')
+    args = parser.parse_args()
+
+    if len(args.paths) > 1 or args.workers:
+        print(count_internal_nodes_shards(args.paths, args.format, args.workers))
+    elif args.paths:
+        print(count_internal_nodes_file(args.paths[0], args.format))
+    else:
+        my_tree = [4, 4, 1, 5, -1, 4, 5]
+        print(find_internal_nodes_num(my_tree))
@@ -0,0 +1,151 @@
+import numpy as np
+
+# Parent value of a node slot that has been removed
+REMOVED = -2
+
+
+class InternalNodeTracker:
+    """
+        Keep the internal-node count of a parent-array tree up to date under edits.
+
+        A per-parent child count is kept in a compact array, so every edit only
+        touches the counts of the parents involved and the internal-node count
+        changes when one of them goes from or to zero children.
+
+        Node ids are indices into the parent array. Removed nodes keep their slot,
+        with REMOVED as parent, so ids stay stable. Like the parent-array format
+        itself, the tracker does not check re-parenting for cycles; use
+        tree_analytics.validate on the parents to check the whole tree.
+
+        Attributes:
+            nodes (int): The number of live nodes.
+            internal_nodes (int): The number of live nodes with at least one child.
+    """
+
+    def __init__(self, capacity=16):
+        self._parents = np.full(capacity, REMOVED, dtype=np.int64)
+        self._child_counts = np.zeros(capacity, dtype=np.int32)
+        self._size = 0
+        self.nodes = 0
+        self.internal_nodes = 0
+
+    @classmethod
+    def from_parents(cls, parents):
+        """
+            Seed a tracker from an existing parent array.
+
+            Args:
+                parents (array-like): The parent array, -1 for the root.
+
+            Returns:
+                InternalNodeTracker: The tracker, with node ids equal to array indices.
+        """
+        parents = np.asarray(parents, dtype=np.int64)
+        tracker = cls(capacity=max(parents.size, 16))
+        tracker._size = parents.size
+        tracker._parents[:parents.size] = parents
+        counts = np.bincount(parents[parents >= 0], minlength=parents.size)
+        tracker._child_counts[:counts.size] = counts
+        tracker.nodes = int(np.count_nonzero(parents != REMOVED))
+        tracker.internal_nodes = int(np.count_nonzero(counts))
+        return tracker
+
+    @property
+    def leaves(self):
+        """
+            The number of live nodes without children.
+        """
+        return self.nodes - self.internal_nodes
+
+    @property
+    def parents(self):
+        """
+            The parent array, with REMOVED for the slots of removed nodes.
+        """
+        return self._parents[:self._size]
+
+    def child_count(self, node):
+        """
+            Return the number of children of a live node.
+        """
+        self._check_live(node)
+        return int(self._child_counts[node])
+
+    def add_node(self, parent):
+        """
+            Add a node under a parent, in amortized O(1).
+
+            Args:
+                parent (int): The parent node, or -1 for a root.
+
+            Returns:
+                int: The id of the new node.
+        """
+        if parent != -1:
+            self._check_live(parent)
+        if self._size == self._parents.size:
+            self._grow()
+        node = self._size
+        self._size += 1
+        self._parents[node] = parent
+        self.nodes += 1
+        self._link(parent)
+        return node
+
+    def remove_node(self, node):
+        """
+            Remove a leaf node in O(1).
+
+            Args:
+                node (int): The node to remove.
+
+            Raises:
+                ValueError: If the node has children.
+        """
+        self._check_live(node)
+        if self._child_counts[node]:
+            raise ValueError(f"Node {node} has children; remove or re-parent them first")
+        self._unlink(int(self._parents[node]))
+        self._parents[node] = REMOVED
+        self.nodes -= 1
+
+    def reparent(self, node, parent):
+        """
+            Move a node, with its subtree, under another parent in O(1).
+
+            Args:
+                node (int): The node to move.
+                parent (int): The new parent, or -1 to make the node a root.
+        """
+        self._check_live(node)
+        if parent != -1:
+            self._check_live(parent)
+        if parent == node:
+            raise ValueError(f"Node {node} cannot be its own parent")
+        self._unlink(int(self._parents[node]))
+        self._parents[node] = parent
+        self._link(parent)
+
+    def _link(self, parent):
+        if parent >= 0:
+            self._child_counts[parent] += 1
+            if self._child_counts[parent] == 1:
+                self.internal_nodes += 1
+
+    def _unlink(self, parent):
+        if parent >= 0:
+            self._child_counts[parent] -= 1
+            if self._child_counts[parent] == 0:
+                self.internal_nodes -= 1
+
+    def _check_live(self, node):
+        if not 0 <= node < self._size or self._parents[node] == REMOVED:
+            raise ValueError(f"Node {node} does not exist")
+
+    def _grow(self):
+        capacity = 2 * self._parents.size
+        parents = np.full(capacity, REMOVED, dtype=np.int64)
+        parents[:self._size] = self._parents[:self._size]
+        child_counts = np.zeros(capacity, dtype=np.int32)
+        child_counts[:self._size] = self._child_counts[:self._size]
+        self._parents, self._child_counts = parents, child_counts
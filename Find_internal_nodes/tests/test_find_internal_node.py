@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import find_internal_node
+from find_internal_node import find_internal_nodes_num, find_internal_nodes_num_np, read_parent_chunks, \
+    count_internal_nodes_file
+
+
+class TestFindInternalNodesFile(unittest.TestCase):
+    """
+        Unit test case class for counting the internal nodes of parent array files.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'wb' if isinstance(data, bytes) else 'w') as f:
+            f.write(data)
+        return path
+
+    def test_chunked_count(self):
+        """
+                Test case for the chunked count matching the reference count across chunk sizes.
+        """
+        tree = [-1, 0, 0, 1, 1, 2, 5, 5, 12, 8, 8, 10, 3]
+        for chunk_size in (1, 2, 5, len(tree), 100):
+            self.assertEqual(find_internal_nodes_num_np(tree, chunk_size), find_internal_nodes_num(tree))
+
+    def test_text_numbers_split_across_blocks(self):
+        """
+                Test case for multi-digit text numbers cut by the block boundary.
+        """
+        expected = [-1] + list(range(2000))
+        path = self.write('tree.txt', ' '.join(map(str, expected)) + '\n')
+        for block_size in (1, 2, 3, 7, 64):
+            with mock.patch.object(find_internal_node, 'TEXT_BLOCK_SIZE', block_size):
+                values = np.concatenate(list(read_parent_chunks(path))).tolist()
+                self.assertEqual(values, expected)
+                self.assertEqual(count_internal_nodes_file(path), find_internal_nodes_num(expected))
+
+    def test_text_brackets_and_commas(self):
+        """
+                Test case for text files written as a Python list or comma-separated values.
+        """
+        tree = [-1, 0, 0, 1, 1, 2, 10, 6, 6, 3, 12, 12, 3]
+        contents = (str(tree), ','.join(map(str, tree)), ',\t'.join(map(str, tree)) + ',\r\n',
+                    '[\n' + ',\n'.join(map(str, tree)) + '\n]\n')
+        for i, text in enumerate(contents):
+            path = self.write(f'tree{i}.txt', text)
+            for block_size in (3, 1 << 24):
+                with mock.patch.object(find_internal_node, 'TEXT_BLOCK_SIZE', block_size):
+                    self.assertEqual(np.concatenate(list(read_parent_chunks(path))).tolist(), tree)
+                    self.assertEqual(count_internal_nodes_file(path), find_internal_nodes_num(tree))
+
+    def test_empty_files(self):
+        """
+                Test case for empty binary and text files holding no nodes.
+        """
+        for name in ('tree.bin', 'tree.i32', 'tree.txt'):
+            path = self.write(name, b'')
+            self.assertEqual(list(read_parent_chunks(path)), [])
+            self.assertEqual(count_internal_nodes_file(path), 0)
+        path = self.write('blank.txt', '[ ]\n')
+        self.assertEqual(list(read_parent_chunks(path)), [])
+        self.assertEqual(count_internal_nodes_file(path), 0)
+
+    def test_binary_and_npy_files(self):
+        """
+                Test case for binary int32 and NumPy files read in chunks.
+        """
+        tree = [-1, 0, 0, 1, 1, 2, 10, 6, 6, 3, 12, 12, 3]
+        bin_path = self.write('tree.bin', np.asarray(tree, dtype='<i4').tobytes())
+        npy_path = os.path.join(self.tmp.name, 'tree.npy')
+        np.save(npy_path, np.asarray(tree))
+        for path in (bin_path, npy_path):
+            for chunk_size in (1, 4, 100):
+                self.assertEqual(count_internal_nodes_file(path, chunk_size=chunk_size), find_internal_nodes_num(tree))
+
+
+if __name__ == '__main__':
+    unittest.main()
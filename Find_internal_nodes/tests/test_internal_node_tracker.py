@@ -0,0 +1,78 @@
+import random
+import unittest
+from find_internal_node import find_internal_nodes_num
+from internal_node_tracker import InternalNodeTracker, REMOVED
+
+
+class TestInternalNodeTracker(unittest.TestCase):
+    """
+        Unit test case class for the incremental internal-node tracker.
+    """
+
+    def assertMatchesBatch(self, tracker):
+        """
+                Check the tracker counts against a from-scratch count of its live nodes.
+        """
+        live = [int(parent) for parent in tracker.parents if parent != REMOVED]
+        self.assertEqual(tracker.internal_nodes, find_internal_nodes_num(live))
+        self.assertEqual(tracker.nodes, len(live))
+        self.assertEqual(tracker.leaves, len(live) - find_internal_nodes_num(live))
+
+    def test_from_parents(self):
+        """
+                Test case for seeding the tracker from an existing parent array.
+        """
+        tracker = InternalNodeTracker.from_parents([4, 4, 1, 5, -1, 4, 5])
+        self.assertEqual(tracker.internal_nodes, 3)
+        self.assertEqual(tracker.leaves, 4)
+        self.assertEqual(tracker.child_count(4), 3)
+
+    def test_edits(self):
+        """
+                Test case for adding, re-parenting and removing nodes.
+        """
+        tracker = InternalNodeTracker.from_parents([-1])
+        child = tracker.add_node(0)
+        grandchild = tracker.add_node(child)
+        self.assertEqual((tracker.internal_nodes, tracker.leaves), (2, 1))
+
+        tracker.reparent(grandchild, 0)
+        self.assertEqual((tracker.internal_nodes, tracker.leaves), (1, 2))
+
+        with self.assertRaises(ValueError):
+            tracker.remove_node(0)
+        tracker.remove_node(child)
+        self.assertEqual((tracker.internal_nodes, tracker.leaves), (1, 1))
+        with self.assertRaises(ValueError):
+            tracker.add_node(child)
+
+    def test_random_edits_match_batch(self):
+        """
+                Property test: after any random sequence of edits the counts match the batch function.
+        """
+        rng = random.Random(888)
+        for _ in range(20):
+            tracker = InternalNodeTracker.from_parents([-1] + [rng.randrange(i) for i in range(1, rng.randrange(2, 30))])
+            for _ in range(300):
+                live = [node for node, parent in enumerate(tracker.parents) if parent != REMOVED]
+                operation = rng.random()
+                if operation < 0.5:
+                    tracker.add_node(rng.choice(live))
+                elif operation < 0.75:
+                    leaves = [node for node in live if node != 0 and tracker.child_count(node) == 0]
+                    if leaves:
+                        tracker.remove_node(rng.choice(leaves))
+                elif len(live) > 1:
+                    node = rng.choice(live[1:])
+                    parent = rng.choice(live)
+                    # Skip moves into the node's own subtree, which would create a cycle
+                    ancestor = parent
+                    while ancestor not in (-1, node):
+                        ancestor = int(tracker.parents[ancestor])
+                    if ancestor == -1:
+                        tracker.reparent(node, parent)
+                self.assertMatchesBatch(tracker)
+
+
+if __name__ == '__main__':
+    unittest.main()
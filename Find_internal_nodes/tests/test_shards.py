@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from find_internal_node import find_internal_nodes_num, mark_parents, mark_parents_packed, shard_parent_bitmap, \
+    merge_bitmaps, count_internal_nodes_shards
+
+
+class TestShards(unittest.TestCase):
+    """
+        Unit test case class for counting the internal nodes of a tree split across shard files.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write_shards(self, tree, bounds, extension='.bin'):
+        paths = []
+        for i, (start, stop) in enumerate(zip(bounds, bounds[1:])):
+            path = os.path.join(self.tmp.name, f'shard{i}{extension}')
+            if extension == '.npy':
+                np.save(path, np.asarray(tree[start:stop]))
+            else:
+                np.asarray(tree[start:stop], dtype='<i4').tofile(path)
+            paths.append(path)
+        return paths
+
+    def test_mark_parents_packed(self):
+        """
+                Test case for packed marking matching the packed byte bitmap, grown across chunks.
+        """
+        rng = np.random.default_rng(5)
+        for n in (1, 7, 8, 9, 100, 1000):
+            chunks = [rng.integers(-1, n, size=int(rng.integers(0, 50))) for _ in range(4)]
+            bitmap, packed = None, None
+            for chunk in chunks:
+                bitmap = mark_parents(chunk, bitmap)
+                packed = mark_parents_packed(chunk, packed)
+            expected = np.packbits(bitmap).tolist()
+            self.assertEqual(packed[:len(expected)].tolist(), expected)
+            self.assertFalse(packed[len(expected):].any())
+
+    def test_merge_bitmaps(self):
+        """
+                Test case for merging packed bitmaps of different sizes in either order.
+        """
+        small = np.packbits([1, 0, 1])
+        large = np.packbits([0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 1])
+        expected = np.packbits([1, 1, 1, 0, 0, 0, 0, 0, 0, 0, 1]).tolist()
+        self.assertEqual(merge_bitmaps(small.copy(), large).tolist(), expected)
+        self.assertEqual(merge_bitmaps(large.copy(), small).tolist(), expected)
+        empty = np.zeros(0, dtype=np.uint8)
+        self.assertEqual(merge_bitmaps(empty, large).tolist(), large.tolist())
+
+    def test_shards_of_different_sizes(self):
+        """
+                Test case for shards whose bitmaps span different node ranges.
+        """
+        # The first shard references the highest parent, the last one only the root
+        tree = [-1, 0, 20, 1, 1, 3, 4, 6, 6, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 0, 0]
+        expected = find_internal_nodes_num(tree)
+        for bounds in ([0, 3, 10, 21, 23], [0, 1, 22, 23], [0, 23], [0, 0, 5, 5, 23]):
+            paths = self.write_shards(tree, bounds)
+            sizes = {shard_parent_bitmap(path).size for path in paths}
+            if len(bounds) > 3:
+                self.assertGreater(len(sizes), 1)
+            for workers in (1, 2):
+                self.assertEqual(count_internal_nodes_shards(paths, workers=workers), expected)
+
+    def test_random_shards(self):
+        """
+                Test case for randomly sharded random trees, with small chunks.
+        """
+        rng = np.random.default_rng(7)
+        for _ in range(5):
+            n = int(rng.integers(2, 300))
+            tree = [-1] + [int(rng.integers(0, i)) for i in range(1, n)]
+            bounds = [0] + sorted(int(bound) for bound in rng.integers(0, n, 3)) + [n]
+            paths = self.write_shards(tree, bounds, '.npy')
+            self.assertEqual(count_internal_nodes_shards(paths, workers=2, chunk_size=7),
+                             find_internal_nodes_num(tree))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from tree_analytics import InvalidTreeError, load_parents, validate, depths, subtree_sizes, analyze
+
+
+class TestTreeAnalytics(unittest.TestCase):
+    """
+        Unit test case class for whole-tree validation and statistics.
+    """
+
+    def test_valid_tree(self):
+        """
+                Test case for the depths, subtree sizes and statistics of a valid tree.
+        """
+        tree = [1, -1, 1, 0, 0, 2, 5]
+        self.assertEqual(validate(tree).tolist(), [1, 0, 1, 2, 2, 2, 3])
+        self.assertEqual(subtree_sizes(tree).tolist(), [3, 7, 3, 1, 1, 2, 1])
+        self.assertEqual(analyze(tree), {'nodes': 7, 'root': 1, 'internal_nodes': 4, 'leaves': 3,
+                                         'height': 3, 'max_children': 2})
+
+    def test_deep_chain(self):
+        """
+                Test case for a path-shaped tree, contracted by splicing out nodes with one child.
+        """
+        n = 1000
+        tree = np.arange(-1, n - 1)
+        self.assertEqual(validate(tree).tolist(), list(range(n)))
+        self.assertEqual(subtree_sizes(tree).tolist(), list(range(n, 0, -1)))
+
+    def test_random_trees(self):
+        """
+                Test case for the depths and subtree sizes of random trees against walks to the root.
+        """
+        rng = np.random.default_rng(3)
+        for n in range(1, 150, 7):
+            # Mostly long paths with random branches, with shuffled node indices
+            parents = [-1] + [i - 1 if rng.random() < 0.7 else int(rng.integers(0, i)) for i in range(1, n)]
+            order = rng.permutation(n)
+            tree = np.full(n, -1)
+            tree[order[1:]] = order[parents[1:]]
+            expected_depths, expected_sizes = np.zeros(n, dtype=int), np.ones(n, dtype=int)
+            for node in range(n):
+                ancestor = tree[node]
+                while ancestor != -1:
+                    expected_depths[node] += 1
+                    expected_sizes[ancestor] += 1
+                    ancestor = tree[ancestor]
+            self.assertEqual(depths(tree).tolist(), expected_depths.tolist())
+            self.assertEqual(subtree_sizes(tree).tolist(), expected_sizes.tolist())
+
+    def test_cycle(self):
+        """
+                Test case for a cycle beside the root, and a self-loop.
+        """
+        for tree in ([-1, 0, 3, 4, 2], [-1, 0, 2], [-1, 0, 1, 5, 3, 4, 3]):
+            with self.assertRaisesRegex(InvalidTreeError, 'Cycle detected'):
+                validate(tree)
+
+    def test_dangling_parent(self):
+        """
+                Test case for parents outside the node range.
+        """
+        for tree, node in (([-1, 0, 3], 2), ([-1, -2, 0], 1), ([-1, 0, 0, 100], 3)):
+            with self.assertRaisesRegex(InvalidTreeError, f'Dangling parent: node {node} '):
+                validate(tree)
+
+    def test_root_count(self):
+        """
+                Test case for trees with several roots, no root, or no nodes.
+        """
+        with self.assertRaisesRegex(InvalidTreeError, 'found 2'):
+            validate([-1, 0, -1, 2])
+        with self.assertRaisesRegex(InvalidTreeError, 'found 0'):
+            validate([1, 0])
+        with self.assertRaisesRegex(InvalidTreeError, 'empty'):
+            validate([])
+
+    def test_load_parents(self):
+        """
+                Test case for loading text, binary and empty parent array files.
+        """
+        tree = [-1, 0, 0, 1]
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = {name: os.path.join(tmp, name) for name in ('tree.txt', 'tree.bin', 'empty.bin')}
+            with open(paths['tree.txt'], 'w') as f:
+                f.write(str(tree))
+            np.asarray(tree, dtype='<i4').tofile(paths['tree.bin'])
+            open(paths['empty.bin'], 'wb').close()
+            self.assertEqual(load_parents(paths['tree.txt']).tolist(), tree)
+            self.assertEqual(load_parents(paths['tree.bin']).tolist(), tree)
+            self.assertEqual(load_parents(paths['empty.bin']).size, 0)
+            with self.assertRaises(InvalidTreeError):
+                validate(load_parents(paths['empty.bin']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import numpy as np
+from find_internal_node import read_parent_chunks, detect_format
+
+
+class InvalidTreeError(ValueError):
+    """
+        Raised when a parent array does not describe a single rooted tree.
+    """
+
+
+def _index_dtype(n):
+    # int32 halves the memory of every per-node array whenever the indices fit
+    return np.int32 if n < 2 ** 31 else np.int64
+
+
+def load_parents(path, fmt=None):
+    """
+        Load a parent array file for whole-tree analytics.
+
+        Binary files are memory-mapped; text files are parsed in blocks and concatenated.
+
+        Args:
+            path (str): The file path.
+            fmt (str, optional): npy, bin or text; detected from the extension if None.
+
+        Returns:
+            np.ndarray: The parent array.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == 'npy':
+        return np.load(path, mmap_mode='r').ravel()
+    if fmt == 'bin' and os.path.getsize(path):
+        return np.memmap(path, dtype='<i4', mode='r')
+    chunks = list(read_parent_chunks(path, fmt))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+
+
+def child_counts(parents):
+    """
+        Count the children of every node.
+
+        Args:
+            parents (array-like): The parent array, -1 for the root.
+
+        Returns:
+            np.ndarray: The number of children per node.
+    """
+    parents = np.asarray(parents)
+    return np.bincount(parents[parents >= 0], minlength=parents.size)
+
+
+def _scatter_add(target, index, values):
+    """
+        Add values, or one value, to the target at indices that may repeat.
+    """
+    # bincount is much faster than ufunc.at but costs a pass over the target, so it is only
+    # used for indices numerous enough to pay for it; that keeps the work linear overall
+    if index.size * 8 < target.size:
+        np.add.at(target, index, values)
+    elif np.ndim(values):
+        target += np.bincount(index, values, minlength=target.size).astype(target.dtype)
+    else:
+        target += np.bincount(index, minlength=target.size).astype(target.dtype) * values
+
+
+def _contract(parents):
+    """
+        Compute the depth and subtree size of every node in linear work.
+
+        The tree is contracted in rounds of vectorized passes over the remaining nodes:
+        leaves are raked into their parent, then a random independent set of nodes with
+        one child is spliced out, their child taking their parent. Each round removes a
+        constant fraction of the nodes in expectation, so the rounds cost O(n) in total
+        and their number grows with log(n), paths included. The removed nodes are then
+        expanded in reverse order, which visits every parent before its children.
+
+        Args:
+            parents (array-like): The parent array, -1 for the root.
+
+        Returns:
+            tuple: The depth and the subtree size per node.
+
+        Raises:
+            InvalidTreeError: If the parent array contains a cycle.
+    """
+    parents = np.asarray(parents)
+    n = parents.size
+    dtype = _index_dtype(n)
+    # Per node, as of its removal: its parent among the remaining nodes, the edges to it, the
+    # nodes spliced out on the way with their subtrees, and its only child when spliced out
+    parent = parents.astype(dtype)
+    dist = np.ones(n, dtype=dtype)
+    extra = np.zeros(n, dtype=dtype)
+    child = np.zeros(n, dtype=dtype)
+    # The remaining children, and the subtree nodes outside the subtrees of the remaining children
+    children = np.bincount(parent[parent >= 0], minlength=n).astype(dtype)
+    own = np.ones(n, dtype=dtype)
+    size = np.zeros(n, dtype=dtype)
+    heads = np.zeros(n, dtype=bool)
+    rng = np.random.default_rng(0)
+    rounds = []
+    nodes = np.arange(n, dtype=dtype)
+    while nodes.size:
+        leaf = children[nodes] == 0
+        if not leaf.any():
+            # Every rooted part has a leaf, so the remaining nodes lie on cycles
+            raise InvalidTreeError(f"Cycle detected: node {int(nodes[0])} never reaches the root")
+        raked = nodes[leaf]
+        size[raked] = own[raked]
+        up = parent[raked]
+        rooted = up >= 0
+        _scatter_add(own, up[rooted], own[raked[rooted]] + extra[raked[rooted]])
+        _scatter_add(children, up[rooted], -1)
+        nodes = nodes[~leaf]
+
+        up = parent[nodes]
+        rooted = up >= 0
+        child[up[rooted]] = nodes[rooted]
+        heads[nodes] = (children[nodes] == 1) & rooted & (rng.random(nodes.size) < 0.5)
+        # A node is spliced out unless its parent is, so that no two adjacent nodes are
+        splice = heads[nodes] & ~heads[up]
+        spliced = nodes[splice]
+        below = child[spliced]
+        # The size of the child is added on expansion
+        size[spliced] = own[spliced] + extra[below]
+        extra[below] += own[spliced] + extra[spliced]
+        dist[below] += dist[spliced]
+        parent[below] = parent[spliced]
+        nodes = nodes[~splice]
+        rounds.append((raked, spliced))
+
+    depth = np.zeros(n, dtype=dtype)
+    for raked, spliced in reversed(rounds):
+        # Spliced nodes were removed after the leaves raked in the same round
+        size[spliced] += size[child[spliced]]
+        depth[spliced] = depth[parent[spliced]] + dist[spliced]
+        up = parent[raked]
+        depth[raked] = np.where(up >= 0, depth[up] + dist[raked], 0)
+    return depth, size
+
+
+def depths(parents):
+    """
+        Compute the depth of every node, the root being at depth 0.
+
+        Args:
+            parents (array-like): The parent array, -1 for the root.
+
+        Returns:
+            np.ndarray: The depth per node.
+
+        Raises:
+            InvalidTreeError: If the parent array contains a cycle.
+    """
+    return _contract(parents)[0]
+
+
+def validate(parents):
+    """
+        Check that a parent array describes a single rooted tree.
+
+        Args:
+            parents (array-like): The parent array, -1 for the root.
+
+        Returns:
+            np.ndarray: The depth per node, computed while checking for cycles.
+
+        Raises:
+            InvalidTreeError: If a parent is dangling, there is not exactly one root,
+                or the parent array contains a cycle.
+    """
+    parents = np.asarray(parents)
+    n = parents.size
+    if n == 0:
+        raise InvalidTreeError("The tree is empty")
+    dangling = np.flatnonzero((parents < -1) | (parents >= n))
+    if dangling.size:
+        node = int(dangling[0])
+        raise InvalidTreeError(f"Dangling parent: node {node} points to {int(parents[node])}")
+    roots = np.flatnonzero(parents == -1)
+    if roots.size != 1:
+        raise InvalidTreeError(f"Expected exactly one root, found {roots.size}")
+    return depths(parents)
+
+
+def subtree_sizes(parents):
+    """
+        Compute the number of nodes in the subtree of every node, itself included.
+
+        Args:
+            parents (array-like): The parent array, -1 for the root.
+
+        Returns:
+            np.ndarray: The subtree size per node.
+
+        Raises:
+            InvalidTreeError: If the parent array contains a cycle.
+    """
+    return _contract(parents)[1]
+
+
+def analyze(parents, depth=None):
+    """
+        Validate a parent array and compute its summary statistics.
+
+        Args:
+            parents (array-like): The parent array, -1 for the root.
+            depth (np.ndarray, optional): The depths returned by validate, if already validated.
+
+        Returns:
+            dict: The node, internal node and leaf counts, the root, the height and the
+            largest number of children of a node.
+
+        Raises:
+            InvalidTreeError: If the parent array is not a single rooted tree.
+    """
+    parents = np.asarray(parents)
+    if depth is None:
+        depth = validate(parents)
+    counts = child_counts(parents)
+    internal_nodes = int(np.count_nonzero(counts))
+    return {
+        'nodes': int(parents.size),
+        'root': int(np.flatnonzero(parents == -1)[0]),
+        'internal_nodes': internal_nodes,
+        'leaves': int(parents.size) - internal_nodes,
+        'height': int(depth.max()),
+        'max_children': int(counts.max())
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Validate a parent-array tree and report its statistics.')
+    parser.add_argument('path', help='parent array file (.npy, .bin/.i32 int32, or text)')
+    parser.add_argument('--format', choices=['npy', 'bin', 'text'], help='override the detected file format')
+    parser.add_argument('--depths', metavar='OUT.npy', help='also save the depth per node')
+    parser.add_argument('--subtree-sizes', metavar='OUT.npy', help='also save the subtree size per node')
+    args = parser.parse_args()
+
+    tree = load_parents(args.path, args.format)
+    try:
+        node_depths = validate(tree)
+    except InvalidTreeError as e:
+        parser.exit(1, f"Invalid tree: {e}\n")
+    stats = analyze(tree, node_depths)
+    if args.depths:
+        np.save(args.depths, node_depths)
+    if args.subtree_sizes:
+        np.save(args.subtree_sizes, subtree_sizes(tree))
+    print(json.dumps(stats, indent=2))
@@ -0,0 +1,63 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sportsapp import create_app
+from sportsapp.database import db
+
+OUTCOMES = ['Unsettled', 'Win', 'Lose', 'Void']
+
+
+def insert_catalog(conn, sports, events_per_sport, selections_per_event):
+    """
+        Insert a synthetic catalog on a connection with bulk executemany statements.
+
+        Args:
+            conn (Connection): The connection, committed by the caller.
+            sports (int): The number of sports.
+            events_per_sport (int): The number of events per sport.
+            selections_per_event (int): The number of selections per event.
+    """
+    start = datetime(2024, 1, 1)
+    conn.execute(text('INSERT INTO sports (id, name, slug, active) VALUES (:id, :name, :slug, 1)'),
+                 [{"id": s, "name": f"Sport {s}", "slug": f"sport-{s}"} for s in range(1, sports + 1)])
+    events = [{"id": e, "name": f"Event {e}", "slug": f"event-{e}", "type": "preplay",
+               "sport_id": (e - 1) // events_per_sport + 1, "status": "Pending",
+               "scheduled_start": start + timedelta(minutes=e)}
+              for e in range(1, sports * events_per_sport + 1)]
+    conn.execute(text('INSERT INTO events (id, name, slug, active, type, sport_id, status, scheduled_start) '
+                      'VALUES (:id, :name, :slug, 1, :type, :sport_id, :status, :scheduled_start)'), events)
+    conn.execute(text('INSERT INTO selections (name, event_id, price, active, outcome) '
+                      'VALUES (:name, :event_id, :price, 1, :outcome)'),
+                 [{"name": f"Line {i}", "event_id": event["id"], "price": round(1.01 + (i * 37 % 2000) / 100, 2),
+                   "outcome": OUTCOMES[i % len(OUTCOMES)]}
+                  for event in events for i in range(selections_per_event)])
+
+
+def populate(sports, events_per_sport, selections_per_event):
+    """
+        Insert a synthetic catalog in the database of the current application.
+
+        Args:
+            sports (int): The number of sports.
+            events_per_sport (int): The number of events per sport.
+            selections_per_event (int): The number of selections per event.
+    """
+    with db.engine.begin() as conn:
+        insert_catalog(conn, sports, events_per_sport, selections_per_event)
+
+
+def benchmark_app(config=None):
+    """
+        Create an application on a fresh database file in a temporary directory.
+
+        Args:
+            config (dict, optional): Configuration values overriding the defaults.
+
+        Returns:
+            tuple: The application and the temporary directory, to be cleaned up by the caller.
+    """
+    tmp = tempfile.TemporaryDirectory()
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp.name, 'bench.db')}",
+                      **(config or {})})
+    return app, tmp
@@ -0,0 +1,73 @@
+import argparse
+import gc
+import time
+import tracemalloc
+from flask import Response, current_app
+from sqlalchemy import text
+from sportsapp import crud, planner, schemas, serializers
+from sportsapp.database import read_engine
+from benchmarks.catalog import populate, benchmark_app
+
+
+def legacy_search(filters):
+    """
+        Search selections the way crud did before Rows: one dict per Row.
+    """
+    with read_engine().connect() as conn:
+        plan = planner.plan_search(conn, 'selections', filters, None)
+        return [dict(row._mapping) for row in conn.execute(text(plan.query), plan.params)]
+
+
+def legacy_encode(rows):
+    """
+        Encode search results the way the routes did before Rows: a second dict per row, then jsonify.
+    """
+    return current_app.json.response([dict(row) for row in rows]).get_data()
+
+
+def lean_encode(rows):
+    """
+        Encode search results from their tuples.
+    """
+    return Response(serializers.encode_json('selections', rows), mimetype=serializers.JSON).get_data()
+
+
+def measure(search, encode, filters):
+    """
+        Measure a search and its JSON encoding.
+
+        Returns:
+            tuple: The seconds taken untraced, the memory blocks held by the search results,
+            the peak traced MiB, and the size of the body.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    body = encode(search(filters))
+    seconds = time.perf_counter() - start
+    del body
+    gc.collect()
+    tracemalloc.start()
+    rows = search(filters)
+    blocks = len(tracemalloc.take_snapshot().traces)
+    body = encode(rows)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, blocks, peak / 2 ** 20, len(body)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the memory of materializing a search as dicts and as tuples.')
+    parser.add_argument('--events', type=int, default=20000, help='number of events')
+    parser.add_argument('--selections', type=int, default=50, help='selections per event')
+    args = parser.parse_args()
+
+    app, tmp = benchmark_app({"SEARCH_COST_BUDGET": None})
+    with tmp, app.app_context():
+        populate(10, args.events // 10, args.selections)
+        filters = schemas.Filter(name_regex=None, min_active_events=None, min_active_selections=None,
+                                 scheduled_start=None)
+        print(f"{'pipeline':<10}{'rows':>10}{'seconds':>10}{'blocks':>12}{'peak MiB':>10}{'bytes':>12}")
+        for name, search, encode in (('dicts', legacy_search, legacy_encode),
+                                     ('tuples', crud.search_selections, lean_encode)):
+            seconds, blocks, peak, size = measure(search, encode, filters)
+            print(f"{name:<10}{args.events * args.selections:>10}{seconds:>10.2f}{blocks:>12}{peak:>10.0f}{size:>12}")
@@ -0,0 +1,76 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Seconds allowed for a fresh interpreter to import crud, enforced by the test suite
+IMPORT_TIME_BUDGET = 1.5
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CREATE_APP = 'create_app({"SQLALCHEMY_DATABASE_URI": URI})'
+# Each scenario runs in a fresh interpreter, as an untimed setup and a timed statement
+SCENARIOS = {
+    'import sportsapp': ('', 'import sportsapp'),
+    'import sportsapp.crud': ('', 'import sportsapp.crud'),
+    'create_app, new database': ('from sportsapp import create_app', CREATE_APP),
+    'create_app, bootstrapped database': ('from sportsapp import create_app', CREATE_APP),
+}
+
+
+def run_timed(statement, uri='sqlite://', setup=''):
+    """
+        Time a statement in a fresh Python interpreter.
+
+        Args:
+            statement (str): The statement; URI is bound to the database URI.
+            uri (str): The database URI.
+            setup (str): A statement run before the timed one.
+
+        Returns:
+            tuple: The seconds the statement took and the modules it left imported.
+    """
+    script = (f'import sys, time\nURI = {uri!r}\n{setup}\nstart = time.perf_counter()\n{statement}\n'
+              f'print(time.perf_counter() - start)\nprint(" ".join(sorted(sys.modules)))')
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout.splitlines()
+    return float(output[0]), set(output[1].split())
+
+
+def measure(repeat=5):
+    """
+        Measure the median duration of every startup scenario.
+
+        Args:
+            repeat (int): The number of fresh interpreters per scenario.
+
+        Returns:
+            dict: The median seconds per scenario.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bootstrapped = f'sqlite:///{os.path.join(tmp, "bootstrapped.db")}'
+        run_timed(CREATE_APP, bootstrapped, 'from sportsapp import create_app')
+        for name, (setup, statement) in SCENARIOS.items():
+            timings = []
+            for i in range(repeat):
+                if name.endswith('new database'):
+                    uri = f'sqlite:///{os.path.join(tmp, f"new-{i}.db")}'
+                else:
+                    uri = bootstrapped
+                timings.append(run_timed(statement, uri, setup)[0])
+            results[name] = statistics.median(timings)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure import and application startup times.')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per scenario')
+    args = parser.parse_args()
+
+    print(f"{'scenario':<36}{'median s':>10}")
+    for name, seconds in measure(args.repeat).items():
+        print(f"{name:<36}{seconds:>10.3f}")
+    print(f"import budget: {IMPORT_TIME_BUDGET:.3f} s")
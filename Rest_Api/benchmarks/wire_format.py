@@ -0,0 +1,61 @@
+import argparse
+import json
+import time
+import msgpack
+from sportsapp import serializers
+from benchmarks.catalog import populate, benchmark_app
+
+
+STRUCT_CODES = {'int8': 'b', 'int16': 'h', 'int32': 'i', 'int64': 'q', 'timestamp[ms]': 'q', 'float64': 'd',
+                'bool': 'B'}
+
+
+def decode_msgpack(data):
+    """
+        Decode a columnar MessagePack document into typed columns.
+    """
+    columns = {}
+    for column in msgpack.unpackb(data)["columns"]:
+        kind = column.get("index_type", column["type"])
+        if kind in STRUCT_CODES:
+            columns[column["name"]] = memoryview(column["data"]).cast(STRUCT_CODES[kind])
+        else:
+            columns[column["name"]] = column["data"]
+    return columns
+
+
+def decode_arrow(data):
+    """
+        Decode an Arrow IPC stream into a table.
+    """
+    import pyarrow
+    return pyarrow.ipc.open_stream(data).read_all()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the JSON and binary formats of GET /selections.')
+    parser.add_argument('--events', type=int, default=2000, help='number of events')
+    parser.add_argument('--selections', type=int, default=50, help='selections per event')
+    parser.add_argument('--repeat', type=int, default=5, help='decode repetitions')
+    args = parser.parse_args()
+
+    app, tmp = benchmark_app()
+    with tmp, app.app_context():
+        populate(10, args.events // 10, args.selections)
+        client = app.test_client()
+        formats = [(serializers.JSON, json.loads), (serializers.MSGPACK, decode_msgpack)]
+        if serializers.ARROW_AVAILABLE:
+            formats.append((serializers.ARROW_STREAM, decode_arrow))
+
+        print(f"{'format':<38}{'bytes':>12}{'ratio':>8}{'encode s':>10}{'decode s':>10}")
+        json_size = None
+        for mimetype, decode in formats:
+            start = time.perf_counter()
+            data = client.get('/selections', headers={"Accept": mimetype}).data
+            encode_time = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                decode(data)
+            decode_time = (time.perf_counter() - start) / args.repeat
+            json_size = json_size or len(data)
+            print(f"{mimetype:<38}{len(data):>12}{json_size / len(data):>8.1f}{encode_time:>10.3f}{decode_time:>10.4f}")
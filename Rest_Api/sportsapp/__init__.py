@@ -1,29 +1,123 @@
 from flask import Flask
-from sportsapp.database import db
+from sportsapp.database import init_db
 
 
-def create_app():
+def create_app(config=None):
     """
         Create and configure the Flask application.
 
         This function sets up the Flask application with the necessary configurations,
         initializes the database, and registers the main blueprint for the routes.
 
+        Args:
+            config (dict, optional): Configuration values overriding the defaults.
+
         Returns:
             Flask: The configured Flask application instance.
     """
     app = Flask(__name__)
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///test.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    db.init_app(app)
+    # Defer event/sport status propagation to the background status queue
+    app.config['STATUS_QUEUE_ENABLED'] = False
+    app.config['STATUS_QUEUE_WORKERS'] = 2
+    app.config['STATUS_QUEUE_BATCH_SIZE'] = 100
+    app.config['STATUS_QUEUE_POLL_INTERVAL'] = 0.5
+    # Database URIs of read replicas serving the GET and search routes
+    app.config['SQLALCHEMY_READ_REPLICAS'] = []
+    app.config['READ_REPLICA_STICKY_SECONDS'] = 5.0
+    # Compress responses negotiated through Accept-Encoding, except tiny ones
+    app.config['COMPRESSION_ENABLED'] = True
+    app.config['COMPRESSION_MIN_SIZE'] = 1024
+    # Cache the serialized list responses, with their compressed variants
+    app.config['RESPONSE_CACHE_ENABLED'] = True
+    app.config['RESPONSE_CACHE_SIZE'] = 256
+    # Directory, on tmpfs such as /dev/shm, sharing the cached responses between the worker
+    # processes of a host, up to SHARED_SIZE files; in memory of each process if None
+    app.config['RESPONSE_CACHE_SHARED_DIR'] = None
+    app.config['RESPONSE_CACHE_SHARED_SIZE'] = 1024
+    # Number of reverse proxies in front of the app whose X-Forwarded-For gives the client address
+    app.config['TRUSTED_PROXIES'] = 0
+    # Per-client token buckets as (tokens per second, burst), and in-flight caps, per request category;
+    # behind a reverse proxy, set TRUSTED_PROXIES so that clients do not all share its buckets
+    app.config['RATE_LIMIT_ENABLED'] = False
+    app.config['RATE_LIMITS'] = {'read': (20.0, 100), 'search': (2.0, 20), 'write': (10.0, 50)}
+    app.config['RATE_LIMIT_MAX_CONCURRENT'] = {'read': 64, 'search': 4, 'write': 16}
+    # SQLite file sharing the token buckets between worker processes; in memory if None
+    app.config['RATE_LIMIT_STORAGE'] = None
+    # Coalesce concurrent selection updates into group commits of up to MAX_ITEMS, within WINDOW seconds
+    app.config['GROUP_COMMIT_ENABLED'] = False
+    app.config['GROUP_COMMIT_WINDOW'] = 0.005
+    app.config['GROUP_COMMIT_MAX_ITEMS'] = 256
+    # Seconds the change log keeps the tombstones of deleted rows, pruned by the archive job
+    # (ARCHIVE_ENABLED or flask archive); None keeps them forever
+    app.config['CHANGE_LOG_RETENTION'] = 7 * 24 * 3600
+    # Move finished events and their selections to the archive tables in the background
+    app.config['ARCHIVE_ENABLED'] = False
+    app.config['ARCHIVE_INTERVAL'] = 60.0
+    app.config['ARCHIVE_BATCH_SIZE'] = 500
+    # Seconds an event must go unwritten after it finished before it is archived
+    app.config['ARCHIVE_MIN_AGE'] = 3600.0
+    # POST webhook deliveries to the subscribed endpoints from a pool of WORKERS threads, in
+    # batches of up to BATCH_SIZE per endpoint; failing endpoints back off exponentially from
+    # BACKOFF to MAX_BACKOFF seconds, and deliveries failing MAX_ATTEMPTS times are dead-lettered
+    app.config['WEBHOOKS_ENABLED'] = False
+    app.config['WEBHOOK_WORKERS'] = 4
+    app.config['WEBHOOK_BATCH_SIZE'] = 100
+    app.config['WEBHOOK_TIMEOUT'] = 5.0
+    app.config['WEBHOOK_MAX_ATTEMPTS'] = 8
+    app.config['WEBHOOK_BACKOFF'] = 1.0
+    app.config['WEBHOOK_MAX_BACKOFF'] = 300.0
+    app.config['WEBHOOK_POLL_INTERVAL'] = 1.0
+    # Let webhook URLs resolve to loopback, link-local and private addresses, for trusted setups only
+    app.config['WEBHOOK_ALLOW_PRIVATE_URLS'] = False
+    # Searches estimated to read more rows than this are rejected; None disables the check
+    app.config['SEARCH_COST_BUDGET'] = 5e7
+    # Report the plan of every search in an X-Query-Plan response header
+    app.config['SEARCH_PLAN_HEADER'] = False
+    if config:
+        app.config.update(config)
+    init_db(app)
 
-    with app.app_context():
-        db.create_all()
+    if app.config['TRUSTED_PROXIES']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
 
+    # Imported here so that importing sportsapp, e.g. for crud in a CLI tool, stays cheap
+    from sportsapp import compression, cache, ratelimit, snapshot, archive
+    from sportsapp.database import ReplicaRouter
     from sportsapp.routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
+    app.cli.add_command(snapshot.cli)
+    app.cli.add_command(archive.archive_command)
 
-    return app
+    # Registered first so that rejected requests do no other work
+    if app.config['RATE_LIMIT_ENABLED']:
+        ratelimit.init_app(app)
+
+    if app.config['SQLALCHEMY_READ_REPLICAS']:
+        app.extensions['replica_router'] = ReplicaRouter(
+            app, app.config['SQLALCHEMY_READ_REPLICAS'], app.config['READ_REPLICA_STICKY_SECONDS'])
+
+    if app.config['COMPRESSION_ENABLED']:
+        compression.init_app(app)
+
+    if app.config['RESPONSE_CACHE_ENABLED']:
+        cache.init_app(app)
 
+    if app.config['STATUS_QUEUE_ENABLED']:
+        from sportsapp import jobs
+        jobs.init_app(app)
 
-app = create_app()
+    if app.config['GROUP_COMMIT_ENABLED']:
+        from sportsapp import group_commit
+        group_commit.init_app(app)
+
+    if app.config['ARCHIVE_ENABLED']:
+        archive.init_app(app)
+
+    if app.config['WEBHOOKS_ENABLED']:
+        from sportsapp import webhooks
+        webhooks.init_app(app)
+
+    return app
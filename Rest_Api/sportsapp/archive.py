@@ -0,0 +1,137 @@
+import threading
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sportsapp import crud
+
+
+def archive_all(batch_size, min_age):
+    """
+        Archive finished events batch by batch until none is left.
+
+        Args:
+            batch_size (int): The maximum number of events per transaction.
+            min_age (float): Seconds since the last write of an event before it is archived.
+
+        Returns:
+            dict: The number of events and selections archived.
+    """
+    totals = {"events": 0, "selections": 0}
+    while True:
+        archived = crud.archive_finished_events(batch_size, min_age)
+        if not archived["events"]:
+            return totals
+        for table, count in archived.items():
+            totals[table] += count
+
+
+def prune_change_log():
+    """
+        Drop the change log tombstones older than CHANGE_LOG_RETENTION, unless it is None.
+
+        Returns:
+            int: The number of tombstones dropped.
+    """
+    retention = current_app.config['CHANGE_LOG_RETENTION']
+    return crud.prune_change_log(retention) if retention is not None else 0
+
+
+class Archiver:
+    """
+        Background thread moving finished events to the archive tables, and pruning
+        the change log tombstones its deletes leave.
+
+        Attributes:
+            app (Flask): The application whose database is archived.
+            interval (float): Seconds between archiving runs.
+            batch_size (int): The maximum number of events archived per transaction.
+            min_age (float): Seconds since the last write of an event before it is archived.
+            archived (dict): The number of events and selections archived so far.
+    """
+
+    def __init__(self, app, interval=60.0, batch_size=500, min_age=3600.0):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.min_age = min_age
+        self.archived = {"events": 0, "selections": 0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+            Start the archiving thread.
+        """
+        self._thread = threading.Thread(target=self._run, name='archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+            Stop the archiving thread after its current batch.
+
+            Args:
+                timeout (float, optional): Seconds to wait for the thread.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        """
+            Report the number of events and selections archived so far.
+        """
+        with self._lock:
+            return dict(self.archived)
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    archived = archive_all(self.batch_size, self.min_age)
+                    prune_change_log()
+                except Exception as e:
+                    print(f"Error archiving events: {e}")
+                    archived = {}
+                with self._lock:
+                    for table, count in archived.items():
+                        self.archived[table] += count
+                self._stop.wait(self.interval)
+
+
+@click.command('archive')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None,
+              help='Events per transaction [default: ARCHIVE_BATCH_SIZE].')
+@click.option('--min-age', type=click.FloatRange(min=0), default=None,
+              help='Seconds since the last write of an event [default: ARCHIVE_MIN_AGE].')
+@with_appcontext
+def archive_command(batch_size, min_age):
+    """
+        Move finished events and their selections to the archive tables, and prune the change log.
+
+        Meant for cron: the deletes are numbered in the change log, so running servers
+        stop serving the archived rows from their response caches.
+    """
+    config = current_app.config
+    archived = archive_all(batch_size or config['ARCHIVE_BATCH_SIZE'],
+                           config['ARCHIVE_MIN_AGE'] if min_age is None else min_age)
+    click.echo(f"Archived {archived['events']} events and {archived['selections']} selections", err=True)
+    click.echo(f"Pruned {prune_change_log()} change log tombstones", err=True)
+
+
+def init_app(app):
+    """
+        Attach a started archiver to the application.
+
+        Args:
+            app (Flask): The Flask application instance.
+
+        Returns:
+            Archiver: The started archiver.
+    """
+    archiver = Archiver(app, interval=app.config['ARCHIVE_INTERVAL'], batch_size=app.config['ARCHIVE_BATCH_SIZE'],
+                        min_age=app.config['ARCHIVE_MIN_AGE'])
+    app.extensions['archiver'] = archiver
+    archiver.start()
+    return archiver
@@ -0,0 +1,394 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from functools import wraps
+from flask import current_app, request, g, make_response, Response
+from sqlalchemy import text
+from sportsapp import compression, serializers
+from sportsapp.database import read_engine
+
+
+class CacheEntry:
+    """
+        A cached response body with its precompressed variants.
+
+        Attributes:
+            generation (int): The cache generation the body was computed in, or None for
+                an entry kept across writes until it expires.
+            mimetype (str): The media type of the body.
+            variants (dict): The body per content coding, identity included.
+            expires (float): The monotonic time the entry expires at, or None.
+    """
+
+    def __init__(self, generation, mimetype, body, max_age=None):
+        self.generation = generation
+        self.mimetype = mimetype
+        self.variants = {'identity': body}
+        self.expires = time.monotonic() + max_age if max_age is not None else None
+
+    def variant(self, encoding, min_size):
+        """
+            Return the body for a content coding, compressing it on first use.
+
+            Bodies under min_size are always served uncompressed.
+
+            Returns:
+                tuple: The content coding actually used and the body.
+        """
+        body = self.variants['identity']
+        if encoding == 'identity' or len(body) < min_size:
+            return 'identity', body
+        if encoding not in self.variants:
+            # Racing requests may both compress; either result is valid
+            self.variants[encoding] = compression.compress(body, encoding)
+        return encoding, self.variants[encoding]
+
+
+class ResponseCache:
+    """
+        In-process LRU cache of serialized GET responses.
+
+        Every crud write bumps the generation, which invalidates all entries at once;
+        stale entries are dropped when they are next looked up or evicted. Writes of
+        other processes are caught by the change log position in the keys of cached.
+        Entries of generation None only expire with time.
+
+        Attributes:
+            max_entries (int): The number of responses kept.
+            generation (int): The current cache generation.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, timed=False):
+        """
+            Return the entry for a key if it belongs to the current generation and has not expired.
+
+            Entries of generation None are returned whatever the generation; timed tells
+            subclasses looking entries up elsewhere that the key is one of them.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if (entry.generation is not None and entry.generation != self.generation) or \
+                    (entry.expires is not None and entry.expires < time.monotonic()):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        """
+            Store an entry unless the cache was invalidated while it was computed.
+        """
+        with self._lock:
+            if entry.generation is not None and entry.generation != self.generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """
+            Invalidate every entry.
+        """
+        with self._lock:
+            self.generation += 1
+
+
+# Layout of a shared entry file: this header of the wall-clock expiry time (0.0 for none), the
+# length of the media type and the number of variants, the media type, then per variant its
+# content coding and length, then the variant bodies in the same order
+_ENTRY_HEADER = struct.Struct('<dHB')
+_VARIANT = struct.Struct('<8sQ')
+_GENERATION = struct.Struct('<Q')
+
+
+def _store(path, expires_at, mimetype, variants):
+    """
+        Write a shared cache entry file atomically, so that readers map either the old file or the whole new one.
+    """
+    mimetype = mimetype.encode()
+    tmp = f'{path}.{os.getpid()}-{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_ENTRY_HEADER.pack(expires_at, len(mimetype), len(variants)))
+        f.write(mimetype)
+        for encoding, body in variants.items():
+            f.write(_VARIANT.pack(encoding.encode(), len(body)))
+        for body in variants.values():
+            f.write(body)
+    os.replace(tmp, path)
+
+
+def _load(path):
+    """
+        Map a shared cache entry file.
+
+        Returns:
+            tuple: The wall-clock expiry time, the media type and the variants as views of the
+            mapping, or None if there is no such file.
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except FileNotFoundError:
+        return None
+    expires_at, length, count = _ENTRY_HEADER.unpack_from(data)
+    offset = _ENTRY_HEADER.size + length
+    mimetype = bytes(data[_ENTRY_HEADER.size:offset]).decode()
+    sizes = []
+    for _ in range(count):
+        encoding, size = _VARIANT.unpack_from(data, offset)
+        sizes.append((encoding.rstrip(b'\0').decode(), size))
+        offset += _VARIANT.size
+    variants = {}
+    for encoding, size in sizes:
+        variants[encoding] = data[offset:offset + size]
+        offset += size
+    return expires_at, mimetype, variants
+
+
+class SharedCacheEntry(CacheEntry):
+    """
+        A cached response mapped from a file of a shared response cache.
+
+        The bodies stay in the page cache, shared by every process mapping the file, and
+        are only copied out of it for each response. A variant compressed by one process
+        is added to the file for the others.
+
+        Attributes:
+            path (str): The file of the entry.
+            expires_at (float): The wall-clock time the entry expires at, or 0.0.
+    """
+
+    def __init__(self, generation, path, expires_at, mimetype, variants):
+        self.generation = generation
+        self.path = path
+        self.expires_at = expires_at
+        self.mimetype = mimetype
+        self.variants = variants
+        # Monotonic clocks are not shared between processes, so the file holds wall-clock times
+        self.expires = time.monotonic() + expires_at - time.time() if expires_at else None
+
+    def variant(self, encoding, min_size):
+        """
+            Return the body for a content coding, compressing it on first use by any process.
+
+            Returns:
+                tuple: The content coding actually used and the body.
+        """
+        body = self.variants['identity']
+        if encoding == 'identity' or len(body) < min_size:
+            return 'identity', bytes(body)
+        if encoding not in self.variants:
+            # Another process may have added the variant since the file was mapped
+            loaded = _load(self.path)
+            variants = loaded[2] if loaded is not None else {}
+            if encoding not in variants:
+                variants = dict(self.variants)
+                variants[encoding] = compression.compress(bytes(body), encoding)
+                _store(self.path, self.expires_at, self.mimetype, variants)
+            self.variants = variants
+        return encoding, bytes(self.variants[encoding])
+
+
+class SharedResponseCache(ResponseCache):
+    """
+        Response cache shared by the worker processes of a host through memory-mapped files.
+
+        Every response is a file in directory named after its generation and key, and
+        mapped by the processes serving it, so the workers share one copy of each body;
+        the directory belongs on tmpfs, such as /dev/shm, and to one database. The
+        generation is an 8-byte file mapped by every process: a crud write in any worker
+        stores a new random value in it, which invalidates the entries of all workers at
+        once without a lock between them. The in-process LRU of ResponseCache indexes the
+        mapped entries, and the files of past generations are removed as new ones are stored.
+        Entries kept across writes are files of their own, only removed beyond max_files.
+
+        Attributes:
+            directory (str): The directory of the entry files.
+            max_files (int): The number of entry files kept in the directory.
+    """
+
+    def __init__(self, max_entries, directory, max_files=1024):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_files = max_files
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, 'generation'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < _GENERATION.size:
+                os.ftruncate(fd, _GENERATION.size)
+            self._generation = mmap.mmap(fd, _GENERATION.size)
+        finally:
+            os.close(fd)
+        # The database may have changed while no worker was running, e.g. by a snapshot import
+        self.invalidate()
+
+    @property
+    def generation(self):
+        """
+            The current cache generation, shared by every process using the directory.
+        """
+        return _GENERATION.unpack_from(self._generation)[0]
+
+    def _path(self, key, generation):
+        prefix = 'timed' if generation is None else f'{generation:016x}'
+        return os.path.join(self.directory, f'{prefix}-{hashlib.sha1(repr(key).encode()).hexdigest()}')
+
+    def get(self, key, timed=False):
+        """
+            Return the entry for a key from the local index, or else map it from the directory.
+        """
+        entry = super().get(key)
+        if entry is None:
+            generation = None if timed else self.generation
+            path = self._path(key, generation)
+            loaded = _load(path)
+            if loaded is None:
+                return None
+            entry = SharedCacheEntry(generation, path, *loaded)
+            if entry.expires is not None and entry.expires < time.monotonic():
+                return None
+            super().put(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        """
+            Store an entry for every process unless the cache was invalidated while it was computed.
+        """
+        generation = entry.generation
+        if generation is not None and generation != self.generation:
+            return
+        path = self._path(key, generation)
+        expires_at = time.time() + entry.expires - time.monotonic() if entry.expires is not None else 0.0
+        _store(path, expires_at, entry.mimetype, entry.variants)
+        self._prune()
+        # Index the mapping rather than the body, so that this process holds no copy of its own
+        loaded = _load(path)
+        if loaded is not None:
+            super().put(key, SharedCacheEntry(generation, path, *loaded))
+
+    def invalidate(self):
+        """
+            Invalidate every entry, in every process.
+        """
+        # Any new value invalidates, so concurrent writers need no lock
+        _GENERATION.pack_into(self._generation, 0, int.from_bytes(os.urandom(_GENERATION.size), 'little'))
+
+    def _prune(self):
+        """
+            Remove the entry files of past generations, then the oldest ones beyond max_files.
+        """
+        prefix = f'{self.generation:016x}-'
+        current = []
+        with os.scandir(self.directory) as files:
+            for file in files:
+                if file.name == 'generation' or file.name.endswith('.tmp'):
+                    continue
+                # Other processes prune concurrently
+                with suppress(FileNotFoundError):
+                    if file.name.startswith((prefix, 'timed-')):
+                        current.append((file.stat().st_mtime, file.path))
+                    else:
+                        os.remove(file.path)
+        current.sort()
+        for _, path in current[:max(len(current) - self.max_files, 0)]:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+
+def invalidate():
+    """
+        Invalidate the response cache of the current application after a write.
+    """
+    cache = current_app.extensions.get('response_cache')
+    if cache is not None:
+        cache.invalidate()
+
+
+def change_log_position():
+    """
+        Return the sequence number of the last write to the catalog tables, as read by the current request.
+
+        The change log triggers number every write, whichever process made it: other
+        workers, the archive job or a snapshot import. Reading it costs one lookup in
+        sqlite_sequence.
+
+        Returns:
+            int: The sequence number, or None for databases without the change log triggers.
+    """
+    engine = read_engine()
+    if engine.dialect.name != 'sqlite':
+        return None
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'changes'")).scalar() or 0
+
+
+def cached(view=None, max_age=None, timed=False):
+    """
+        Serve a GET view from the response cache, with precompressed variants.
+
+        Responses are keyed by path, query string, negotiated media type and read
+        source, so a client pinned to the primary never gets a body read from a replica,
+        and by the change log position, so that the writes of other processes are never
+        served stale. Use as @cached, or as @cached(max_age=seconds) for views that also
+        depend on time. With @cached(max_age=seconds, timed=True), writes do not
+        invalidate the response, which is served up to max_age seconds stale, for
+        expensive views read far more often than the catalog changes.
+    """
+    if view is None:
+        return lambda view: cached(view, max_age, timed)
+    if timed and max_age is None:
+        raise ValueError("Responses kept across writes need a max_age")
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        cache = current_app.extensions.get('response_cache')
+        if cache is None:
+            return view(*args, **kwargs)
+        key = (request.full_path, serializers.negotiate(), g.get('read_replica') is not None,
+               None if timed else change_log_position())
+        entry = cache.get(key, timed)
+        if entry is None:
+            generation = None if timed else cache.generation
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            entry = CacheEntry(generation, response.mimetype, response.get_data(), max_age)
+            cache.put(key, entry)
+        encoding, body = entry.variant(compression.negotiate_encoding(), current_app.config['COMPRESSION_MIN_SIZE'])
+        response = Response(body, mimetype=entry.mimetype)
+        response.vary.update(['Accept', 'Accept-Encoding'])
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        return response
+    return wrapper
+
+
+def init_app(app):
+    """
+        Attach a response cache to the application.
+
+        Args:
+            app (Flask): The Flask application instance.
+    """
+    directory = app.config['RESPONSE_CACHE_SHARED_DIR']
+    if directory is None:
+        app.extensions['response_cache'] = ResponseCache(app.config['RESPONSE_CACHE_SIZE'])
+    else:
+        app.extensions['response_cache'] = SharedResponseCache(
+            app.config['RESPONSE_CACHE_SIZE'], directory, app.config['RESPONSE_CACHE_SHARED_SIZE'])
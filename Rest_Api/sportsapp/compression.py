@@ -0,0 +1,153 @@
+import zlib
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compression level per encoding, favouring speed over the last few percent of size
+LEVELS = {'zstd': 3, 'br': 5, 'gzip': 6}
+# Media types that are already compressed and are sent as is
+INCOMPRESSIBLE_PREFIXES = ('image/', 'audio/', 'video/', 'application/zip', 'application/gzip')
+
+
+def available_encodings():
+    """
+        List the content codings this process can produce, in order of preference.
+
+        Returns:
+            list[str]: zstd and br when their optional packages are installed, then gzip.
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def negotiate_encoding():
+    """
+        Pick the content coding of the current response from its Accept-Encoding header.
+
+        Returns:
+            str: zstd, br, gzip or identity.
+    """
+    return request.accept_encodings.best_match(available_encodings() + ['identity'], default='identity')
+
+
+class Compressor:
+    """
+        Incremental compressor for one content coding.
+
+        compress returns the compressed form of the data fed so far, flushed so that the
+        client can decode it right away, which keeps streamed responses streaming.
+    """
+
+    def __init__(self, encoding):
+        level = LEVELS[encoding]
+        if encoding == 'gzip':
+            # wbits=31 selects the gzip container
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            self._process = compressor.compress
+            self._flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = compressor.flush
+        elif encoding == 'br':
+            compressor = brotli.Compressor(quality=level)
+            self._process, self._flush, self._finish = compressor.process, compressor.flush, compressor.finish
+        elif encoding == 'zstd':
+            compressor = zstandard.ZstdCompressor(level=level).compressobj()
+            self._process = compressor.compress
+            self._flush = lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = compressor.flush
+        else:
+            raise ValueError(f"Unsupported content coding: {encoding}")
+
+    def compress(self, data):
+        """
+            Compress a chunk and flush it.
+        """
+        return self._process(data) + self._flush()
+
+    def finish(self):
+        """
+            Return the end of the compressed stream.
+        """
+        return self._finish()
+
+
+def compress(data, encoding):
+    """
+        Compress a whole payload.
+
+        Args:
+            data (bytes): The payload.
+            encoding (str): zstd, br or gzip.
+
+        Returns:
+            bytes: The compressed payload.
+    """
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+def _compress_stream(chunks, encoding):
+    compressor = Compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.finish()
+
+
+def compress_response(response):
+    """
+        Compress a response with the coding negotiated from Accept-Encoding.
+
+        Streamed responses are compressed chunk by chunk. Buffered responses smaller
+        than COMPRESSION_MIN_SIZE, already encoded responses and incompressible media
+        types are left untouched.
+
+        Args:
+            response (Response): The response to compress.
+
+        Returns:
+            Response: The same response, compressed in place when applicable.
+    """
+    if (response.status_code != 200 or request.method == 'HEAD' or response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or (response.mimetype or '').startswith(INCOMPRESSIBLE_PREFIXES)):
+        return response
+    if not response.is_streamed and response.content_length is not None \
+            and response.content_length < current_app.config['COMPRESSION_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if encoding == 'identity':
+        return response
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """
+        Compress the responses of the application.
+
+        Args:
+            app (Flask): The Flask application instance.
+    """
+    app.after_request(compress_response)
@@ -1,6 +1,64 @@
-from sqlalchemy import text
-from sportsapp.database import db
-from sportsapp.models import Sport, Event, Selection
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import text, bindparam
+from sportsapp.database import db, read_engine
+from sportsapp.models import ARCHIVE_TABLES
+from sportsapp import jobs, cache, planner, webhooks
+
+# Prices are stored in the history as integer ticks of 0.01
+PRICE_TICKS_PER_UNIT = 100
+# The output of SQLite's datetime(), which normalizes the ISO 8601 variants the API stores
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class Rows:
+    """
+        Rows read as the plain tuples of the DBAPI cursor, with the column names of their query.
+
+        The serializers encode them column by column, so reads build no dict, Row or
+        ORM object per row.
+
+        Attributes:
+            columns (tuple[str]): The column names, in the order of the tuple values.
+            data (list[tuple]): The rows.
+    """
+    __slots__ = ('columns', 'data')
+
+    def __init__(self, columns, data):
+        self.columns = columns
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+
+def _fetch_rows(conn, query, params=None):
+    """
+        Run a read query directly on the DBAPI cursor of a connection.
+
+        Args:
+            conn (Connection): The connection.
+            query (str): The SQL query, with :name parameters.
+            params (dict, optional): The bound parameters.
+
+        Returns:
+            Rows: The rows of the query.
+    """
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(query, params or {})
+        return Rows(tuple(column[0] for column in cursor.description), cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def _commit(conn):
+    # Every write goes through here, so cached GET responses never outlive the data, and
+    # the webhook deliveries its triggers enqueued go out right away
+    conn.commit()
+    cache.invalidate()
+    webhooks.notify()
 
 
 def create_sport(sport):
@@ -16,7 +74,7 @@ def create_sport(sport):
             text('INSERT INTO sports (name, slug, active) VALUES (:name, :slug, :active)'),
             {"name": sport.name, "slug": sport.slug, "active": sport.active}
         )
-        conn.commit()
+        _commit(conn)
 
 
 def create_event(event):
@@ -38,7 +96,7 @@ def create_event(event):
              "actual_start": event.actual_start}
         )
         event_id = result.lastrowid
-        conn.commit()
+        _commit(conn)
     return event_id
 
 
@@ -60,12 +118,119 @@ def create_selection(selection):
              "active": selection.active, "outcome": selection.outcome}
         )
         selection_id = result.lastrowid
-        conn.commit()
+        record_price(conn, selection_id, selection.price)
+        deferred = _defer_event_status(conn, selection.event_id)
+        _commit(conn)
     # Check and update event status if necessary
-    check_event_status(selection.event_id)
+    _propagate_event_status(selection.event_id, deferred)
     return selection_id
 
 
+# Columns a feed upsert sets from the payload, besides the slug it is keyed by
+UPSERT_COLUMNS = {
+    'sports': ('name', 'active'),
+    'events': ('name', 'active', 'type', 'sport_id', 'status', 'scheduled_start', 'actual_start'),
+}
+# Compared through datetime(), so that ISO 8601 variants of the same time are no change
+DATETIME_COLUMNS = ('scheduled_start', 'actual_start')
+
+
+def _upsert_by_slug(conn, table, rows):
+    """
+        Insert or update rows keyed by their unique slug, skipping rows that are unchanged.
+
+        Each row is a single INSERT ... ON CONFLICT(slug) DO UPDATE whose update only
+        applies, and bumps the version, when a column differs from the stored row.
+
+        Args:
+            conn (Connection): The connection to execute the upserts on, committed by the caller.
+            table (str): sports or events.
+            rows (list[dict]): The rows, each with a slug and every column of UPSERT_COLUMNS.
+
+        Returns:
+            list[dict]: Per row, its id, slug, version, and whether it was created, updated or unchanged.
+    """
+    columns = UPSERT_COLUMNS[table]
+    existing = {row.slug: (row.id, row.version) for row in conn.execute(
+        text(f'SELECT id, slug, version FROM {table} WHERE slug IN :slugs').bindparams(
+            bindparam('slugs', expanding=True)),
+        {"slugs": sorted({row['slug'] for row in rows})})}
+    changed = ' OR '.join(
+        f'COALESCE(datetime({table}.{c}), {table}.{c}) IS NOT COALESCE(datetime(excluded.{c}), excluded.{c})'
+        if c in DATETIME_COLUMNS else f'{table}.{c} IS NOT excluded.{c}'
+        for c in columns)
+    query = text(
+        f"INSERT INTO {table} (slug, {', '.join(columns)}) VALUES (:slug, {', '.join(':' + c for c in columns)}) "
+        f"ON CONFLICT(slug) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns)}, "
+        f"version = version + 1 WHERE {changed} RETURNING id, version")
+    results = []
+    for row in rows:
+        slug = row['slug']
+        written = conn.execute(query, {c: row[c] for c in ('slug',) + columns}).first()
+        if written is None:
+            row_id, version = existing[slug]
+            result = 'unchanged'
+        else:
+            row_id, version = written
+            result = 'updated' if slug in existing else 'created'
+            existing[slug] = (row_id, version)
+        results.append({"id": row_id, "slug": slug, "version": version, "result": result})
+    return results
+
+
+def upsert_sports(sports):
+    """
+        Create or update sports by slug, as resent by the upstream feed.
+
+        Nothing is committed, and the response cache is kept, when every sport is unchanged.
+
+        Args:
+            sports (list[SportCreate]): The sports, in their full state.
+
+        Returns:
+            list[dict]: Per sport, its id, slug, version, and whether it was created, updated or unchanged.
+    """
+    with db.engine.connect() as conn:
+        results = _upsert_by_slug(conn, 'sports', [sport.dict() for sport in sports])
+        if any(result['result'] != 'unchanged' for result in results):
+            _commit(conn)
+    return results
+
+
+def upsert_events(events):
+    """
+        Create or update events by slug, as resent by the upstream feed.
+
+        Nothing is committed, and the response cache is kept, when every event is unchanged.
+        The sports of written events get their status check, as after update_event.
+
+        Args:
+            events (list[EventCreate]): The events, in their full state.
+
+        Returns:
+            list[dict]: Per event, its id, slug, version, and whether it was created, updated or unchanged.
+
+        Raises:
+            ValueError: If an event refers to a sport that does not exist.
+    """
+    sport_ids = sorted({event.sport_id for event in events})
+    with db.engine.connect() as conn:
+        found = set(conn.execute(
+            text('SELECT id FROM sports WHERE id IN :ids').bindparams(bindparam('ids', expanding=True)),
+            {"ids": sport_ids}).scalars())
+        missing = [sport_id for sport_id in sport_ids if sport_id not in found]
+        if missing:
+            raise ValueError(f"Sports with ids {missing} do not exist")
+        results = _upsert_by_slug(conn, 'events', [event.dict() for event in events])
+        written = {event.sport_id for event, result in zip(events, results) if result['result'] != 'unchanged'}
+        if written:
+            _commit(conn)
+    # Check and update sport status if necessary
+    for sport_id in sorted(written):
+        check_sport_status(sport_id)
+    return results
+
+
 def get_sport(sport_id):
     """
         Retrieve a sport from the database by its ID.
@@ -76,7 +241,7 @@ def get_sport(sport_id):
         Returns:
             dict: The sport data as a dictionary.
     """
-    with db.engine.connect() as conn:
+    with read_engine().connect() as conn:
         result = conn.execute(text('SELECT * FROM sports WHERE id = :id'), {"id": sport_id})
         sport = result.fetchone()
         if sport:
@@ -94,7 +259,7 @@ def get_event(event_id):
         Returns:
             dict: The event data as a dictionary.
     """
-    with db.engine.connect() as conn:
+    with read_engine().connect() as conn:
         result = conn.execute(text('SELECT * FROM events WHERE id = :id'), {"id": event_id})
         event = result.fetchone()
     if event:
@@ -112,168 +277,461 @@ def get_selection(selection_id):
         Returns:
             dict: The selection data as a dictionary.
     """
-    with db.engine.connect() as conn:
+    with read_engine().connect() as conn:
         result = conn.execute(text('SELECT * FROM selections WHERE id = :id'), {"id": selection_id})
         selection = result.fetchone()
     return selection
 
 
-def search_sports(filters):
+def _search(table, filters):
     """
-        Search for sports based on the provided filters.
+        Run a search with the plan picked by the planner.
 
         Args:
+            table (str): sports, events or selections.
             filters (Filter): The search filters.
 
         Returns:
-            list: A list of sports matching the filters.
+            Rows: The matching rows.
     """
-    query = 'SELECT * FROM sports WHERE 1=1'
-    params = {}
+    with read_engine().connect() as conn:
+        plan = planner.plan_search(conn, table, filters, current_app.config['SEARCH_COST_BUDGET'])
+        return _fetch_rows(conn, plan.query, plan.params)
 
-    if filters.name_regex:
-        query += ' AND name REGEXP :name_regex'
-        params['name_regex'] = filters.name_regex
-    if filters.min_active_events is not None:
-        query += ' AND (SELECT COUNT(*) FROM events WHERE sport_id = sports.id AND active = 1) >= :min_active_events'
-        params['min_active_events'] = filters.min_active_events
-
-    with db.engine.connect() as conn:
-        result = conn.execute(text(query), params)
-        sports = [dict(row._mapping) for row in result]
-        # sports = result.fetchall()
-    return sports
 
-
-def search_events(filters):
+def search_sports(filters):
     """
-        Search for events based on the provided filters.
+        Search for sports based on the provided filters.
 
         Args:
             filters (Filter): The search filters.
 
         Returns:
-            list: A list of events matching the filters.
+            Rows: The sports matching the filters.
     """
-    query = 'SELECT * FROM events WHERE 1=1'
-    params = {}
+    return _search('sports', filters)
 
-    if filters.name_regex:
-        query += " AND name REGEXP :name_regex"
-        params['name_regex'] = filters.name_regex
 
-    if filters.min_active_events:
-        query += """ AND (SELECT COUNT(*) FROM events e WHERE e.sport_id = events.sport_id AND e.active = TRUE) >= :min_active_events"""
-        params['min_active_events'] = filters.min_active_events
-
-    if filters.min_active_selections:
-        query += """ AND (SELECT COUNT(*) FROM selections s WHERE s.event_id = events.id AND s.active = TRUE) >= :min_active_selections"""
-        params['min_active_selections'] = filters.min_active_selections
+def search_events(filters):
+    """
+        Search for events based on the provided filters.
 
-    if filters.scheduled_start:
-        start, end = filters.scheduled_start
-        query += " AND scheduled_start BETWEEN :start AND :end"
-        params['start'] = start
-        params['end'] = end
+        Args:
+            filters (Filter): The search filters.
 
-    with db.engine.connect() as conn:
-        result = conn.execute(text(query), params)
-        events = [dict(row._mapping) for row in result]
-    return events
+        Returns:
+            Rows: The events matching the filters.
+    """
+    return _search('events', filters)
 
 
 def search_selections(filters):
     """
         Search for selections based on the provided filters.
 
+        The minimum active events and start time filters apply to the event of the selection.
+
         Args:
             filters (Filter): The search filters.
 
         Returns:
-            list: A list of selections matching the filters.
+            Rows: The selections matching the filters.
     """
-    query = 'SELECT * FROM selections WHERE 1=1'
-    params = {}
+    return _search('selections', filters)
 
-    if filters.name_regex:
-        query += " AND name REGEXP :name_regex"
-        params['name_regex'] = filters.name_regex
 
-    if filters.min_active_events:
-        query += """ AND (SELECT COUNT(*) FROM events e WHERE e.sport_id = selections.event_id AND e.active = TRUE) >= :min_active_events"""
-        params['min_active_events'] = filters.min_active_events
+# The expected version of an update conditional only on the row existing, as for If-Match: *
+ANY_VERSION = '*'
 
-    if filters.min_active_selections:
-        query += """ AND (SELECT COUNT(*) FROM selections s WHERE s.event_id = selections.event_id AND s.active = TRUE) >= :min_active_selections"""
-        params['min_active_selections'] = filters.min_active_selections
 
-    if filters.scheduled_start:
-        start, end = filters.scheduled_start
-        query += """ AND (SELECT scheduled_start FROM events e WHERE e.id = selections.event_id) BETWEEN :start AND :end"""
-        params['start'] = start
-        params['end'] = end
+class RowNotFound(Exception):
+    """
+        Raised when a conditional update finds no row to update.
 
-    with db.engine.connect() as conn:
-        result = conn.execute(text(query), params)
-        selections = [dict(row._mapping) for row in result]
-    return selections
+        Attributes:
+            table (str): The table of the missing row.
+            row_id (int): The ID of the missing row.
+    """
+
+    def __init__(self, table, row_id):
+        super().__init__(f"No row {row_id} in {table}")
+        self.table = table
+        self.row_id = row_id
 
 
-def update_sport(sport_id, sport_data):
+class VersionConflict(Exception):
+    """
+        Raised when a compare-and-swap update finds a different row version than expected.
+
+        Attributes:
+            table (str): The table of the conflicting row.
+            row_id (int): The ID of the conflicting row.
+            expected_version (int): The version the caller based its update on.
+            current_version (int): The version currently stored.
+    """
+
+    def __init__(self, table, row_id, expected_version, current_version):
+        super().__init__(f"Version conflict on {table} {row_id}: expected {expected_version}, "
+                         f"current {current_version}")
+        self.table = table
+        self.row_id = row_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def _update_row(conn, table, row_id, data, expected_version=None):
+    """
+        Update a row and bump its version, optionally as a compare-and-swap.
+
+        Args:
+            conn (Connection): The connection to execute the update on.
+            table (str): The table of the row.
+            row_id (int): The ID of the row.
+            data (dict): The updated column values.
+            expected_version (int, optional): Only update if the row is at this version, or
+                exists for ANY_VERSION.
+
+        Returns:
+            int: The new version of the row, or None if the row does not exist and the
+            update is unconditional.
+
+        Raises:
+            RowNotFound: If the update is conditional and the row does not exist.
+            VersionConflict: If the row exists at a different version than expected.
+    """
+    set_clause = ', '.join([f"{k} = :{k}" for k in data.keys()] + ['version = version + 1'])
+    params = {**data, 'id': row_id}
+    query = f'UPDATE {table} SET {set_clause} WHERE id = :id'
+    if expected_version not in (None, ANY_VERSION):
+        query += ' AND version = :expected_version'
+        params['expected_version'] = expected_version
+    updated = conn.execute(text(query), params).rowcount
+    version = conn.execute(text(f'SELECT version FROM {table} WHERE id = :id'), {"id": row_id}).scalar()
+    if version is None and expected_version is not None:
+        raise RowNotFound(table, row_id)
+    if not updated and version is not None:
+        raise VersionConflict(table, row_id, expected_version, version)
+    return version
+
+
+def update_sport(sport_id, sport_data, expected_version=None):
     """
         Update a sport in the database.
 
         Args:
             sport_id (int): The ID of the sport to update.
             sport_data (dict): The updated sport data.
+            expected_version (int, optional): Only update if the sport is at this version,
+                or exists for ANY_VERSION.
+
+        Returns:
+            int: The new version of the sport.
+
+        Raises:
+            RowNotFound: If the update is conditional and the sport does not exist.
+            VersionConflict: If the sport was modified concurrently.
     """
-    set_clause = ', '.join([f"{k} = :{k}" for k in sport_data.keys()])
-    sport_data['id'] = sport_id
     with db.engine.connect() as conn:
-        conn.execute(
-            text(f'UPDATE sports SET {set_clause} WHERE id = :id'),
-            sport_data
-        )
-        conn.commit()
+        version = _update_row(conn, 'sports', sport_id, sport_data, expected_version)
+        _commit(conn)
+    sport_data['id'] = sport_id
+    return version
 
 
-def update_event(event_id, event_data):
+def update_event(event_id, event_data, expected_version=None):
     """
         Update an event in the database.
 
         Args:
             event_id (int): The ID of the event to update.
             event_data (dict): The updated event data.
+            expected_version (int, optional): Only update if the event is at this version,
+                or exists for ANY_VERSION.
+
+        Returns:
+            int: The new version of the event.
+
+        Raises:
+            RowNotFound: If the update is conditional and the event does not exist.
+            VersionConflict: If the event was modified concurrently.
     """
-    set_clause = ', '.join([f"{k} = :{k}" for k in event_data.keys()])
-    event_data['id'] = event_id
     with db.engine.connect() as conn:
-        conn.execute(
-            text(f'UPDATE events SET {set_clause} WHERE id = :id'),
-            event_data
-        )
-        conn.commit()
+        version = _update_row(conn, 'events', event_id, event_data, expected_version)
+        sport_id = conn.execute(text('SELECT sport_id FROM events WHERE id = :id'), {"id": event_id}).scalar()
+        _commit(conn)
+    event_data['id'] = event_id
     # Check and update sport status if necessary
-    check_sport_status(event_data['id'])
+    if sport_id is not None:
+        check_sport_status(sport_id)
+    return version
 
 
-def update_selection(selection_id, selection_data):
+def update_selection(selection_id, selection_data, expected_version=None):
     """
         Update a selection in the database.
 
         Args:
             selection_id (int): The ID of the selection to update.
             selection_data (dict): The updated selection data.
+            expected_version (int, optional): Only update if the selection is at this version,
+                or exists for ANY_VERSION.
+
+        Returns:
+            int: The new version of the selection.
+
+        Raises:
+            RowNotFound: If the update is conditional and the selection does not exist.
+            VersionConflict: If the selection was modified concurrently.
     """
-    set_clause = ', '.join([f"{k} = :{k}" for k in selection_data.keys()])
+    with db.engine.connect() as conn:
+        version = _update_row(conn, 'selections', selection_id, selection_data, expected_version)
+        if selection_data.get('price') is not None and version is not None:
+            record_price(conn, selection_id, selection_data['price'])
+        event_id = conn.execute(text('SELECT event_id FROM selections WHERE id = :id'),
+                                {"id": selection_id}).scalar()
+        deferred = event_id is not None and _defer_event_status(conn, event_id)
+        _commit(conn)
     selection_data['id'] = selection_id
+    if event_id is not None:
+        _propagate_event_status(event_id, deferred)
+    return version
+
+
+def record_price(conn, selection_id, price):
+    """
+        Append a price to the history of a selection.
+
+        Args:
+            conn (Connection): The connection of the write that set the price.
+            selection_id (int): The ID of the selection.
+            price (float): The new price.
+    """
+    record_prices(conn, {selection_id: price})
+
+
+def record_prices(conn, prices):
+    """
+        Append prices to the history of several selections in one statement.
+
+        Args:
+            conn (Connection): The connection of the write that set the prices.
+            prices (dict): The new price per selection ID.
+    """
+    ts = int(time.time() * 1000)
+    record_price_ticks(conn, [(selection_id, ts, price) for selection_id, price in prices.items()])
+
+
+def record_price_ticks(conn, ticks):
+    """
+        Append timestamped prices to the history of selections in one statement.
+
+        Ticks of a selection at the same millisecond are all kept, numbered in the
+        order they are recorded.
+
+        Args:
+            conn (Connection): The connection of the write that set the prices.
+            ticks (list[tuple]): The selection ID, epoch milliseconds and price of every tick.
+    """
+    # The aggregate yields one row even for the first tick at ts, and reads only the primary key
+    conn.execute(
+        text('INSERT INTO price_history (selection_id, ts, seq, price) '
+             'SELECT :selection_id, :ts, COALESCE(MAX(seq) + 1, 0), :price FROM price_history '
+             'WHERE selection_id = :selection_id AND ts = :ts'),
+        [{"selection_id": selection_id, "ts": ts, "price": round(float(price) * PRICE_TICKS_PER_UNIT)}
+         for selection_id, ts, price in ticks]
+    )
+
+
+def apply_selection_batch(conn, updates, ticks=None):
+    """
+        Apply the updates of several selections in one transaction, without committing.
+
+        Updates setting the same columns share one executemany statement. Prices are
+        recorded in the history, and the events of the selections get their status
+        check, deferred to the status queue when it is enabled.
+
+        Args:
+            conn (Connection): The connection of the batch transaction.
+            updates (dict): The updated selection data per selection ID.
+            ticks (list[tuple], optional): The selection ID, epoch milliseconds and price of
+                every price submitted, including those overwritten by a later update of the
+                batch; the prices of updates, at the time of the batch, if None.
+
+        Returns:
+            tuple: The new version per selection ID, selections that do not exist being
+            left out, and whether status checks were deferred to the status queue.
+    """
+    by_columns = {}
+    for selection_id, data in updates.items():
+        by_columns.setdefault(tuple(sorted(data)), []).append({**data, "id": selection_id})
+    for columns, rows in by_columns.items():
+        set_clause = ', '.join([f"{column} = :{column}" for column in columns] + ['version = version + 1'])
+        conn.execute(text(f'UPDATE selections SET {set_clause} WHERE id = :id'), rows)
+    rows = conn.execute(
+        text('SELECT id, version, event_id FROM selections WHERE id IN :ids').bindparams(
+            bindparam('ids', expanding=True)),
+        {"ids": list(updates)}
+    ).all()
+    versions = {selection_id: version for selection_id, version, _ in rows}
+    if ticks is None:
+        prices = {selection_id: updates[selection_id]['price'] for selection_id in versions
+                  if updates[selection_id].get('price') is not None}
+        if prices:
+            record_prices(conn, prices)
+    else:
+        ticks = [tick for tick in ticks if tick[0] in versions and tick[2] is not None]
+        if ticks:
+            record_price_ticks(conn, ticks)
+    event_ids = sorted({event_id for _, _, event_id in rows if event_id is not None})
+    deferred = bool(current_app.config.get('STATUS_QUEUE_ENABLED'))
+    if deferred:
+        for event_id in event_ids:
+            jobs.enqueue_status_check(conn, event_id)
+    elif event_ids:
+        apply_status_checks(conn, event_ids)
+    return versions, deferred
+
+
+def get_price_history(selection_id, start, end, resolution=None):
+    """
+        Retrieve the price history of a selection, optionally downsampled to OHLC buckets.
+
+        The buckets are aggregated by the database with window functions, so only one
+        row per bucket is materialized in Python.
+
+        Args:
+            selection_id (int): The ID of the selection.
+            start (int): The start of the range as epoch milliseconds (inclusive).
+            end (int): The end of the range as epoch milliseconds (exclusive).
+            resolution (int, optional): The bucket width in milliseconds; raw ticks if None.
+
+        Returns:
+            list: The ticks as (ts, price) or the buckets as (ts, open, high, low, close, ticks),
+            with prices in ticks of 0.01.
+    """
+    params = {"selection_id": selection_id, "start": start, "end": end, "resolution": resolution}
+    if resolution is None:
+        query = ('SELECT ts, price FROM price_history '
+                 'WHERE selection_id = :selection_id AND ts >= :start AND ts < :end ORDER BY ts, seq')
+    else:
+        query = """
+            SELECT bucket, MAX(open), MAX(price), MIN(price), MAX(close), COUNT(*)
+            FROM (
+                SELECT ts - ts % :resolution AS bucket, price,
+                       FIRST_VALUE(price) OVER w AS open,
+                       LAST_VALUE(price) OVER w AS close
+                FROM price_history
+                WHERE selection_id = :selection_id AND ts >= :start AND ts < :end
+                WINDOW w AS (PARTITION BY ts - ts % :resolution ORDER BY ts, seq
+                             ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+            ) AS ticks
+            GROUP BY bucket ORDER BY bucket
+        """
+    with read_engine().connect() as conn:
+        return [tuple(row) for row in conn.execute(text(query), params)]
+
+
+def _defer_event_status(conn, event_id):
+    """
+        Enqueue a status recomputation for an event when the status queue is enabled.
+
+        Args:
+            conn (Connection): The connection of the triggering write.
+            event_id (int): The ID of the event to check.
+
+        Returns:
+            bool: True if the check was deferred to the status queue.
+    """
+    if not current_app.config.get('STATUS_QUEUE_ENABLED'):
+        return False
+    jobs.enqueue_status_check(conn, event_id)
+    return True
+
+
+def _propagate_event_status(event_id, deferred):
+    """
+        Run the event status check inline, or wake the status queue if it was deferred.
+
+        Args:
+            event_id (int): The ID of the event to check.
+            deferred (bool): Whether the check was enqueued by the triggering write.
+    """
+    if not deferred:
+        check_event_status(event_id)
+        return
+    queue = current_app.extensions.get('status_queue')
+    if queue is not None:
+        queue.notify()
+
+
+def settle_event(event_id, settlement):
+    """
+        Settle the selections of an event in one transaction.
+
+        Listed selections get their outcome and are deactivated with a single UPDATE,
+        the event transitions to the requested status, and the event/sport status
+        cascade runs once for the whole settlement.
+
+        Args:
+            event_id (int): The ID of the event to settle.
+            settlement (EventSettle): The winner/loser/void mapping.
+
+        Returns:
+            dict: The settlement statistics.
+
+        Raises:
+            ValueError: If a selection is listed twice or does not belong to the event.
+    """
+    listed = settlement.winners + settlement.losers + settlement.void
+    if len(set(listed)) != len(listed):
+        raise ValueError("A selection can only be settled with one outcome")
+    params = {
+        "event_id": event_id,
+        "winners": settlement.winners,
+        "losers": settlement.losers,
+        "void": settlement.void,
+        "listed": listed,
+        "remaining": settlement.remaining,
+        "status": settlement.status
+    }
+    expanding = [bindparam(name, expanding=True) for name in ('winners', 'losers', 'void', 'listed')]
     with db.engine.connect() as conn:
-        conn.execute(
-            text(f'UPDATE selections SET {set_clause} WHERE id = :id'),
-            selection_data
-        )
-        conn.commit()
-    check_event_status(selection_data['event_id'])
+        known = conn.execute(
+            text('SELECT COUNT(*) FROM selections WHERE event_id = :event_id AND id IN :listed'
+                 ).bindparams(bindparam('listed', expanding=True)),
+            params
+        ).scalar()
+        if known != len(listed):
+            raise ValueError(f"Some selections do not belong to event {event_id}")
+        settled = conn.execute(
+            text("UPDATE selections SET active = 0, version = version + 1, outcome = CASE "
+                 "WHEN id IN :winners THEN 'Win' WHEN id IN :losers THEN 'Lose' "
+                 "WHEN id IN :void THEN 'Void' ELSE :remaining END "
+                 "WHERE event_id = :event_id "
+                 "AND (id IN :listed OR (:remaining IS NOT NULL AND outcome = 'Unsettled'))"
+                 ).bindparams(*expanding),
+            params
+        ).rowcount
+        conn.execute(text('UPDATE events SET status = :status, version = version + 1 WHERE id = :event_id'), params)
+        apply_status_checks(conn, [event_id])
+        outcomes = dict(conn.execute(
+            text('SELECT outcome, COUNT(*) FROM selections WHERE event_id = :event_id GROUP BY outcome'),
+            params
+        ).all())
+        event_active, sport_active = conn.execute(
+            text('SELECT events.active, sports.active FROM events JOIN sports ON sports.id = events.sport_id '
+                 'WHERE events.id = :event_id'),
+            params
+        ).one()
+        _commit(conn)
+    return {
+        "event_id": event_id,
+        "settled": settled,
+        "outcomes": outcomes,
+        "status": settlement.status,
+        "event_active": bool(event_active),
+        "sport_active": bool(sport_active)
+    }
 
 
 def check_event_status(event_id):
@@ -308,31 +766,325 @@ def check_sport_status(sport_id):
         update_sport(sport_id, {"active": False})
 
 
+def apply_status_checks(conn, event_ids):
+    """
+        Deactivate events without active selections, and sports left without active events.
+
+        This is the set-based equivalent of calling check_event_status for every event,
+        executed on the given connection so that the caller controls the transaction.
+
+        Args:
+            conn (Connection): The connection to execute the updates on.
+            event_ids (list[int]): The IDs of the events to check.
+
+        Returns:
+            tuple: The number of events and sports deactivated.
+    """
+    params = {"event_ids": list(event_ids)}
+    events_updated = conn.execute(
+        text('UPDATE events SET active = 0, version = version + 1 WHERE id IN :event_ids AND active = 1 '
+             'AND NOT EXISTS (SELECT 1 FROM selections s WHERE s.event_id = events.id AND s.active = 1)'
+             ).bindparams(bindparam('event_ids', expanding=True)),
+        params
+    ).rowcount
+    sports_updated = conn.execute(
+        text('UPDATE sports SET active = 0, version = version + 1 WHERE active = 1 '
+             'AND id IN (SELECT sport_id FROM events WHERE id IN :event_ids) '
+             'AND NOT EXISTS (SELECT 1 FROM events e WHERE e.sport_id = sports.id AND e.active = 1)'
+             ).bindparams(bindparam('event_ids', expanding=True)),
+        params
+    ).rowcount
+    return events_updated, sports_updated
+
+
+# Event statuses after which an event no longer changes, and can be archived
+FINAL_STATUSES = ('Ended', 'Cancelled')
+
+
+def archive_finished_events(batch_size, min_age):
+    """
+        Move one batch of finished events and their selections to the archive tables.
+
+        Events are archived once they have a final status, no active selection left, and
+        have not been written for min_age seconds. The move is one transaction; the
+        deletes leave tombstones in the change log, so mirrors drop the rows too.
+
+        Args:
+            batch_size (int): The maximum number of events to archive.
+            min_age (float): Seconds since the last write of an event before it is archived.
+
+        Returns:
+            dict: The number of events and selections archived.
+    """
+    now = time.time()
+    with db.engine.connect() as conn:
+        event_ids = conn.execute(text(
+            "SELECT events.id FROM events "
+            "JOIN changes ON changes.table_name = 'events' AND changes.row_id = events.id "
+            "WHERE events.status IN :statuses AND events.active = 0 AND changes.ts < :cutoff "
+            "AND events.id NOT IN (SELECT event_id FROM selections WHERE active = 1) "
+            # Rows holding the largest id stay, as SQLite would hand their ids out again
+            "AND events.id < (SELECT MAX(id) FROM events) "
+            "AND events.id IS NOT (SELECT event_id FROM selections ORDER BY id DESC LIMIT 1) "
+            "ORDER BY events.id LIMIT :limit"
+        ).bindparams(bindparam('statuses', expanding=True)),
+            {"statuses": list(FINAL_STATUSES), "cutoff": now - min_age, "limit": batch_size}).scalars().all()
+        if not event_ids:
+            return {"events": 0, "selections": 0}
+        params = {"ids": event_ids, "now": now}
+        archived = {}
+        for table, key in (('events', 'id'), ('selections', 'event_id')):
+            columns = ', '.join(column.name for column in db.metadata.tables[table].columns)
+            archived[table] = conn.execute(text(
+                f'INSERT INTO {ARCHIVE_TABLES[table]} ({columns}, archived_at) '
+                f'SELECT {columns}, :now FROM {table} WHERE {key} IN :ids'
+            ).bindparams(bindparam('ids', expanding=True)), params).rowcount
+        for table, key in (('selections', 'event_id'), ('events', 'id')):
+            conn.execute(text(f'DELETE FROM {table} WHERE {key} IN :ids').bindparams(
+                bindparam('ids', expanding=True)), params)
+        _commit(conn)
+    return archived
+
+
+def iter_catalog_tree():
+    """
+        Stream the sport/event/selection hierarchy as a parent-index tree.
+
+        The nodes are produced in preorder from a single ordered query, under a catalog
+        root at index 0, so a node's parent always comes before it and only the indices
+        of the current sport and event need to be kept.
+
+        Yields:
+            tuple: The node index, its parent index (-1 for the root), its kind
+            (catalog, sport, event or selection) and its database ID.
+    """
+    query = ('SELECT sports.id, events.id, selections.id FROM sports '
+             'LEFT JOIN events ON events.sport_id = sports.id '
+             'LEFT JOIN selections ON selections.event_id = events.id '
+             'ORDER BY sports.id, events.id, selections.id')
+    yield 0, -1, 'catalog', None
+    index = 0
+    sport_id = event_id = None
+    with read_engine().connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=1000).execute(text(query))
+        for row_sport_id, row_event_id, selection_id in result:
+            if row_sport_id != sport_id:
+                sport_id, event_id = row_sport_id, None
+                index += 1
+                sport_index = index
+                yield index, 0, 'sport', sport_id
+            if row_event_id is not None and row_event_id != event_id:
+                event_id = row_event_id
+                index += 1
+                event_index = index
+                yield index, sport_index, 'event', event_id
+            if selection_id is not None:
+                index += 1
+                yield index, event_index, 'selection', selection_id
+
+
+def get_catalog_tree_stats():
+    """
+        Count the nodes, internal nodes and leaves of the catalog tree.
+
+        As in Find_internal_nodes, the internal nodes are the distinct parents: the
+        catalog root if there is a sport, the sports with events and the events with
+        selections.
+
+        Returns:
+            dict: The node, internal node and leaf counts.
+    """
+    with read_engine().connect() as conn:
+        sports, events, selections, sports_with_events, events_with_selections = conn.execute(text(
+            'SELECT (SELECT COUNT(*) FROM sports), (SELECT COUNT(*) FROM events), '
+            '(SELECT COUNT(*) FROM selections), '
+            '(SELECT COUNT(DISTINCT sport_id) FROM events), '
+            '(SELECT COUNT(DISTINCT event_id) FROM selections)'
+        )).one()
+    nodes = 1 + sports + events + selections
+    internal_nodes = (1 if sports else 0) + sports_with_events + events_with_selections
+    return {"nodes": nodes, "internal_nodes": internal_nodes, "leaves": nodes - internal_nodes}
+
+
+def get_sports_summary(now=None, horizon_hours=24):
+    """
+        Aggregate the dashboard figures of every sport in one grouped query.
+
+        Events and active selections are each grouped by sport in one scan, and the
+        two groupings are joined to the sports, whatever the number of sports.
+
+        Args:
+            now (datetime, optional): The start of the upcoming window; the current UTC time if None.
+            horizon_hours (int): The length of the upcoming window.
+
+        Returns:
+            list[dict]: Per sport, its id, name, slug and active flag, the number of
+            active events, of events scheduled in the window and of active selections,
+            and the average price of its active selections.
+    """
+    now = now or datetime.utcnow()
+    window = {"now": now.strftime(SQLITE_DATETIME_FORMAT),
+              "horizon": (now + timedelta(hours=horizon_hours)).strftime(SQLITE_DATETIME_FORMAT)}
+    with read_engine().connect() as conn:
+        result = conn.execute(text(
+            'WITH event_counts AS ('
+            '  SELECT sport_id, SUM(active) AS active_events, '
+            '  SUM(datetime(scheduled_start) >= :now AND datetime(scheduled_start) < :horizon) AS upcoming_events '
+            '  FROM events GROUP BY sport_id), '
+            'selection_counts AS ('
+            '  SELECT e.sport_id, COUNT(*) AS active_selections, SUM(x.price) AS price_total '
+            '  FROM selections x JOIN events e ON e.id = x.event_id WHERE x.active = 1 GROUP BY e.sport_id) '
+            'SELECT s.id, s.name, s.slug, s.active, '
+            'COALESCE(ec.active_events, 0) AS active_events, COALESCE(ec.upcoming_events, 0) AS upcoming_events, '
+            'COALESCE(sc.active_selections, 0) AS active_selections, '
+            'sc.price_total / sc.active_selections AS average_price '
+            'FROM sports s '
+            'LEFT JOIN event_counts ec ON ec.sport_id = s.id '
+            'LEFT JOIN selection_counts sc ON sc.sport_id = s.id '
+            'ORDER BY s.id'
+        ), window)
+        return [dict(row._mapping) for row in result]
+
+
+class ChangeLogExpired(Exception):
+    """
+        Raised when a client syncs from a sequence number older than the change log retains.
+
+        Attributes:
+            since (int): The sequence number the client synced up to.
+            horizon (int): The highest sequence number pruned from the change log.
+    """
+
+    def __init__(self, since, horizon):
+        super().__init__(f"Changes up to {horizon} were pruned; resync from the full catalog, "
+                         f"not from {since}")
+        self.since = since
+        self.horizon = horizon
+
+
+def get_changes(since, limit):
+    """
+        Retrieve the writes logged after a sequence number, with the current state of their rows.
+
+        Args:
+            since (int): The sequence number of the last change the client has applied.
+            limit (int): The maximum number of changes to return.
+
+        Returns:
+            tuple: The changes in sequence order, each with its seq, table, id, op and
+            row (None for a delete, or a row deleted since), and whether more follow.
+
+        Raises:
+            ChangeLogExpired: If tombstones newer than a nonzero since were pruned.
+    """
+    with read_engine().connect() as conn:
+        horizon = conn.execute(text('SELECT seq FROM change_horizon WHERE id = 1')).scalar() or 0
+        # A sync from 0 rebuilds the whole mirror from the live rows, so it needs no tombstones
+        if 0 < since < horizon:
+            raise ChangeLogExpired(since, horizon)
+        entries = conn.execute(
+            text('SELECT seq, table_name, row_id, op FROM changes WHERE seq > :since ORDER BY seq LIMIT :limit'),
+            {"since": since, "limit": limit + 1}
+        ).all()
+        more = len(entries) > limit
+        entries = entries[:limit]
+        rows = {}
+        for table in sorted({entry.table_name for entry in entries}):
+            ids = [entry.row_id for entry in entries if entry.table_name == table and entry.op == 'upsert']
+            if ids:
+                result = conn.execute(text(f'SELECT * FROM {table} WHERE id IN :ids').bindparams(
+                    bindparam('ids', expanding=True)), {"ids": ids})
+                rows.update({(table, row.id): dict(row._mapping) for row in result})
+    changes = [{"seq": entry.seq, "table": entry.table_name, "id": entry.row_id, "op": entry.op,
+                "row": rows.get((entry.table_name, entry.row_id))} for entry in entries]
+    return changes, more
+
+
+def prune_change_log(retention):
+    """
+        Drop the tombstones older than the retention period, advancing the change log horizon.
+
+        Args:
+            retention (float): Seconds tombstones are kept for.
+
+        Returns:
+            int: The number of tombstones dropped.
+    """
+    params = {"cutoff": time.time() - retention}
+    with db.engine.connect() as conn:
+        # Served by ix_changes_op_ts, so the common case of nothing to prune reads no rows
+        seq = conn.execute(text("SELECT MAX(seq) FROM changes WHERE op = 'delete' AND ts < :cutoff"),
+                           params).scalar()
+        if seq is None:
+            return 0
+        pruned = conn.execute(text("DELETE FROM changes WHERE op = 'delete' AND ts < :cutoff"), params).rowcount
+        conn.execute(text('INSERT INTO change_horizon (id, seq) VALUES (1, :seq) '
+                          'ON CONFLICT(id) DO UPDATE SET seq = MAX(seq, excluded.seq)'), {"seq": seq})
+        # Tombstones are not part of any cached response, so the cache is kept
+        conn.commit()
+    return pruned
+
+
+def get_all_rows(table):
+    """
+        Retrieve all rows of a catalog table without building ORM objects.
+
+        Args:
+            table (str): sports, events or selections.
+
+        Returns:
+            Rows: The rows of the table.
+    """
+    if table not in ('sports', 'events', 'selections'):
+        raise ValueError(f"Unknown table: {table}")
+    with read_engine().connect() as conn:
+        return _fetch_rows(conn, f'SELECT * FROM {table}')
+
+
+def _get_levels(tables):
+    """
+        Retrieve all rows of catalog tables, in one read transaction so that they are consistent.
+
+        Args:
+            tables (tuple[str]): The tables, parents before children.
+
+        Returns:
+            list[tuple]: The table and Rows of every table, for serializers.encode_json_tree.
+    """
+    with read_engine().connect() as conn:
+        # pysqlite only begins transactions for writes; an explicit one pins the reads to one snapshot
+        conn.exec_driver_sql('BEGIN')
+        try:
+            return [(table, _fetch_rows(conn, f'SELECT * FROM {table}')) for table in tables]
+        finally:
+            conn.rollback()
+
+
 def get_all_sports():
     """
-        Retrieve all sports from the database.
+        Retrieve all sports with their events and selections.
 
         Returns:
-            list: A list of all sports.
+            list[tuple]: The table and Rows of the sports, events and selections.
     """
-    return Sport.query.all()
+    return _get_levels(('sports', 'events', 'selections'))
 
 
 def get_all_events():
     """
-        Retrieve all events from the database.
+        Retrieve all events with their selections.
 
         Returns:
-            list: A list of all events.
+            list[tuple]: The table and Rows of the events and selections.
     """
-    return Event.query.all()
+    return _get_levels(('events', 'selections'))
 
 
 def get_all_selections():
     """
-        Retrieve all selections from the database.
+        Retrieve all selections.
 
         Returns:
-            list: A list of all selections.
+            list[tuple]: The table and Rows of the selections.
     """
-    return Selection.query.all()
+    return _get_levels(('selections',))
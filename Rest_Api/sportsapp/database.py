@@ -1,6 +1,138 @@
+import hashlib
+import itertools
+import threading
+import time
+from flask import g, request, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, text, bindparam
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
 
-db = SQLAlchemy()
+# Search endpoints are POSTs but only read, so they are routed like GETs
+READ_ENDPOINTS = {'main.search_sports', 'main.search_events', 'main.search_selections'}
+
+
+class RoutingSession(Session):
+    """
+    Session sending the reads of a replica-routed request to its read replica.
+
+    Flushes always go to the primary engine.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        """
+        Select the read replica of the current request, or the bind of the model.
+        """
+        if bind is None and not self._flushing and has_request_context() and g.get('read_replica') is not None:
+            return g.read_replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+# Schema fingerprints per dialect name; the models do not change within a process
+_schema_versions = {}
+
+
+def schema_version(dialect):
+    """
+    Fingerprint the schema the models would create.
+
+    Args:
+        dialect (Dialect): The SQL dialect to compile the DDL for.
+
+    Returns:
+        int: A positive 31-bit hash of the CREATE TABLE and CREATE INDEX statements,
+        and of the extra SQLite DDL, which changes whenever a model does.
+    """
+    if dialect.name in _schema_versions:
+        return _schema_versions[dialect.name]
+    from sportsapp.models import SQLITE_EXTRA_DDL
+    ddl = []
+    for table in db.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes)
+    if dialect.name == 'sqlite':
+        ddl.extend(SQLITE_EXTRA_DDL)
+    digest = hashlib.sha256('\n'.join(ddl).encode()).digest()
+    _schema_versions[dialect.name] = int.from_bytes(digest[:4], 'big') & 0x7FFFFFFF
+    return _schema_versions[dialect.name]
+
+
+def add_missing_columns(conn):
+    """
+    Add the columns of the models missing from the existing tables of a SQLite database.
+
+    Added columns must be nullable or have a server default, as the rows already in the
+    table get it; the row versions of existing rows start at 1. A table missing a column
+    of its primary key, which ALTER TABLE cannot extend, is rebuilt with the model's
+    schema and its rows copied over.
+
+    Args:
+        conn (Connection): The connection, committed by the caller.
+
+    Returns:
+        list[str]: The added columns, as table.column.
+    """
+    added = []
+    for table in db.metadata.sorted_tables:
+        present = {row[1] for row in conn.execute(text(f'PRAGMA table_info("{table.name}")'))}
+        missing = [column for column in table.columns if present and column.name not in present]
+        if any(column.primary_key for column in missing):
+            kept = ', '.join(f'"{column.name}"' for column in table.columns if column.name in present)
+            conn.execute(text(f'ALTER TABLE "{table.name}" RENAME TO "{table.name}_old"'))
+            conn.execute(CreateTable(table))
+            conn.execute(text(f'INSERT INTO "{table.name}" ({kept}) SELECT {kept} FROM "{table.name}_old"'))
+            conn.execute(text(f'DROP TABLE "{table.name}_old"'))
+            for index in table.indexes:
+                conn.execute(CreateIndex(index))
+        else:
+            for column in missing:
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {ddl}'))
+        added.extend(f'{table.name}.{column.name}' for column in missing)
+    return added
+
+
+def bootstrap_schema(engine):
+    """
+    Create the tables of the models unless the database already has this schema.
+
+    SQLite databases record the schema version in PRAGMA user_version, so startup
+    costs a single query when the schema is up to date, instead of the per-table
+    introspection of create_all. When it is not, the columns added to the models since
+    the tables were created, such as the row versions, are added with ALTER TABLE, as
+    create_all never alters an existing table. SQLite databases also get the change log and
+    webhook triggers of models.SQLITE_EXTRA_DDL. Other databases always go through create_all.
+
+    Args:
+        engine (Engine): The engine of the database.
+
+    Returns:
+        bool: True if create_all ran.
+    """
+    # The tables are only known to the metadata once the models are imported
+    from sportsapp import models  # noqa: F401
+    if engine.dialect.name != 'sqlite':
+        db.metadata.create_all(engine)
+        return True
+    version = schema_version(engine.dialect)
+    tables = list(db.metadata.tables)
+    with engine.connect() as conn:
+        # A dropped table leaves user_version behind, so the tables are counted too
+        current, present = conn.execute(text(
+            "SELECT (SELECT user_version FROM pragma_user_version), "
+            "(SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN :tables)"
+        ).bindparams(bindparam('tables', expanding=True)), {"tables": tables}).one()
+    if current == version and present == len(tables):
+        return False
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        add_missing_columns(conn)
+        for statement in models.SQLITE_EXTRA_DDL:
+            conn.execute(text(statement))
+        conn.execute(text(f'PRAGMA user_version = {version}'))
+    return True
 
 
 def init_db(app):
@@ -8,11 +140,86 @@ def init_db(app):
     Initialize the database with the given Flask application.
 
     This function sets up the SQLAlchemy extension to work with the Flask app,
-    and creates all the necessary database tables.
+    and creates the necessary database tables unless the schema is up to date.
 
     Args:
         app (Flask): The Flask application instance to initialize the database with.
     """
     db.init_app(app)
     with app.app_context():
-        db.create_all()
+        bootstrap_schema(db.engine)
+
+
+def read_engine():
+    """
+    Return the engine the current request should read from.
+
+    Returns:
+        Engine: The read replica chosen for the request, or the primary engine.
+    """
+    if has_request_context() and g.get('read_replica') is not None:
+        return g.read_replica
+    return db.engine
+
+
+class ReplicaRouter:
+    """
+    Route read-only requests to read replicas, with read-your-writes stickiness.
+
+    A client that has just written is pinned to the primary for a few seconds so
+    that it never reads a replica that has not caught up with its own write.
+    Clients are identified by their X-Api-Key header, or else their address.
+
+    Attributes:
+        engines (list[Engine]): The engines of the read replicas.
+        sticky_seconds (float): How long a client reads from the primary after a write.
+    """
+
+    def __init__(self, app, replica_uris, sticky_seconds):
+        self.engines = [create_engine(uri) for uri in replica_uris]
+        self.sticky_seconds = sticky_seconds
+        self._next_engine = itertools.cycle(self.engines)
+        self._pinned = {}
+        self._lock = threading.Lock()
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+
+    @staticmethod
+    def client_id():
+        """
+        Identify the client of the current request.
+        """
+        return request.headers.get('X-Api-Key') or request.remote_addr
+
+    def is_read(self):
+        """
+        Tell whether the current request only reads.
+        """
+        return request.method in ('GET', 'HEAD') or request.endpoint in READ_ENDPOINTS
+
+    def before_request(self):
+        """
+        Pick a read replica for read requests of clients not pinned to the primary.
+        """
+        g.read_replica = None
+        if not self.is_read():
+            return
+        with self._lock:
+            pinned_until = self._pinned.get(self.client_id())
+            if pinned_until is not None and pinned_until > time.monotonic():
+                return
+            g.read_replica = next(self._next_engine)
+
+    def after_request(self, response):
+        """
+        Report the read source, or pin the client to the primary after a successful write.
+        """
+        if self.is_read():
+            response.headers['X-Read-Source'] = 'replica' if g.get('read_replica') is not None else 'primary'
+        elif response.status_code < 400:
+            now = time.monotonic()
+            with self._lock:
+                if len(self._pinned) > 10000:
+                    self._pinned = {k: v for k, v in self._pinned.items() if v > now}
+                self._pinned[self.client_id()] = now + self.sticky_seconds
+        return response
@@ -0,0 +1,228 @@
+import collections
+import threading
+import time
+from sportsapp.database import db
+from sportsapp import crud, cache, webhooks
+
+# Seconds of recent commits the commit rate is computed over
+RATE_WINDOW = 10.0
+
+
+class UpdateRejected(Exception):
+    """
+        Error of a selection update the database rejected while committing its batch.
+
+        The message does not quote the database error, which may show the SQL and the
+        parameters of the other updates of the batch; it is kept as the cause.
+    """
+
+    def __init__(self, selection_id):
+        super().__init__(f"Update of selection {selection_id} was rejected by the database")
+
+
+class _PendingUpdate:
+    """
+        A selection update waiting for its batch to be committed.
+    """
+
+    def __init__(self, selection_id, data):
+        self.selection_id = selection_id
+        self.data = data
+        # The price tick is recorded at the time it was submitted, not of its batch
+        self.submitted_at = int(time.time() * 1000)
+        self.version = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class SelectionBatcher:
+    """
+        Group commit for selection updates, such as the price updates of live matches.
+
+        Updates submitted concurrently are collected by a committer thread for up to
+        window seconds, or until max_items are pending, and applied in one transaction,
+        so SQLite syncs once per batch instead of once per update. Within a batch the
+        last update submitted for a selection wins, but the price of every update is
+        recorded in the history, at the time it was submitted. Every submitter blocks
+        until the batch is committed, and then gets the version of its selection after
+        the batch. When the database rejects a batch, its updates are committed one by
+        one, so that only the rejected ones fail, with UpdateRejected.
+
+        Attributes:
+            app (Flask): The application whose database receives the updates.
+            window (float): Seconds the committer waits for more updates after the first.
+            max_items (int): The number of pending updates that triggers a commit right away.
+            commits (int): The number of batches committed.
+            updates (int): The number of updates committed.
+            max_batch_size (int): The largest number of updates committed at once.
+    """
+
+    def __init__(self, app, window=0.005, max_items=256):
+        self.app = app
+        self.window = window
+        self.max_items = max_items
+        self.commits = 0
+        self.updates = 0
+        self.max_batch_size = 0
+        self.last_batch_size = 0
+        self._pending = []
+        self._commit_times = collections.deque()
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        """
+            Start the committer thread.
+        """
+        self._thread = threading.Thread(target=self._run, name='selection-group-commit', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+            Commit the pending updates and stop the committer thread.
+
+            Args:
+                timeout (float, optional): Seconds to wait for the committer.
+        """
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, selection_id, data, timeout=5.0):
+        """
+            Queue a selection update and wait until its batch is committed.
+
+            Args:
+                selection_id (int): The ID of the selection.
+                data (dict): The updated selection data.
+                timeout (float): The maximum number of seconds to wait for the commit.
+
+            Returns:
+                int: The version of the selection after the batch, or None if it does not exist.
+
+            Raises:
+                TimeoutError: If the batch was not committed in time.
+                UpdateRejected: If the database rejected the update.
+        """
+        update = _PendingUpdate(selection_id, data)
+        with self._condition:
+            if self._stop:
+                raise RuntimeError("The selection batcher is stopped")
+            self._pending.append(update)
+            self._condition.notify()
+        if not update.done.wait(timeout):
+            raise TimeoutError(f"Update of selection {selection_id} was not committed in time")
+        if update.error is not None:
+            raise update.error
+        return update.version
+
+    def stats(self):
+        """
+            Report the commit rate and batch sizes.
+
+            Returns:
+                dict: Commits, updates, commits per second over the last RATE_WINDOW
+                seconds, and the mean, last and largest batch size.
+        """
+        with self._condition:
+            now = time.monotonic()
+            while self._commit_times and self._commit_times[0] < now - RATE_WINDOW:
+                self._commit_times.popleft()
+            return {
+                'commits': self.commits,
+                'updates': self.updates,
+                'commits_per_second': round(len(self._commit_times) / RATE_WINDOW, 3),
+                'mean_batch_size': round(self.updates / self.commits, 3) if self.commits else 0.0,
+                'last_batch_size': self.last_batch_size,
+                'max_batch_size': self.max_batch_size,
+                'pending': len(self._pending)
+            }
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending and not self._stop:
+                self._condition.wait()
+            if not self._pending:
+                return None
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_items and not self._stop:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch, self._pending = self._pending[:self.max_items], self._pending[self.max_items:]
+            return batch
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._commit(batch)
+
+    def _apply(self, batch):
+        # Later updates of a selection overwrite earlier ones in the dict, while every tick is kept
+        updates = {update.selection_id: update.data for update in batch}
+        ticks = [(update.selection_id, update.submitted_at, update.data['price'])
+                 for update in batch if 'price' in update.data]
+        with db.engine.connect() as conn:
+            versions, deferred = crud.apply_selection_batch(conn, updates, ticks)
+            conn.commit()
+        return versions, deferred
+
+    def _commit(self, batch):
+        committed, commits = batch, 1
+        try:
+            versions, deferred = self._apply(batch)
+        except Exception:
+            # A single invalid update, such as a null name, fails the statements of the
+            # whole batch, so the updates are retried on their own
+            committed, versions, deferred = [], {}, False
+            for update in batch:
+                try:
+                    update_versions, update_deferred = self._apply([update])
+                except Exception as e:
+                    update.error = UpdateRejected(update.selection_id)
+                    update.error.__cause__ = e
+                    continue
+                committed.append(update)
+                versions.update(update_versions)
+                deferred = deferred or update_deferred
+            commits = len(committed)
+        if committed:
+            cache.invalidate()
+            webhooks.notify()
+            queue = self.app.extensions.get('status_queue')
+            if deferred and queue is not None:
+                queue.notify()
+        with self._condition:
+            self.commits += commits
+            self.updates += len(committed)
+            self.last_batch_size = len(committed)
+            self.max_batch_size = max(self.max_batch_size, len(committed))
+            self._commit_times.extend([time.monotonic()] * commits)
+        for update in batch:
+            update.version = versions.get(update.selection_id)
+            update.done.set()
+
+
+def init_app(app):
+    """
+        Attach a started selection batcher to the application.
+
+        Args:
+            app (Flask): The Flask application instance.
+
+        Returns:
+            SelectionBatcher: The started batcher.
+    """
+    batcher = SelectionBatcher(app, window=app.config['GROUP_COMMIT_WINDOW'],
+                               max_items=app.config['GROUP_COMMIT_MAX_ITEMS'])
+    app.extensions['selection_batcher'] = batcher
+    batcher.start()
+    return batcher
@@ -0,0 +1,179 @@
+import threading
+import time
+from sqlalchemy import text, bindparam
+from sportsapp.database import db
+from sportsapp import crud, cache, webhooks
+
+
+def enqueue_status_check(conn, event_id):
+    """
+        Enqueue a status recomputation for an event.
+
+        The job is written on the caller's connection so that it commits atomically
+        with the write that triggered it. Pending jobs are coalesced per event, keeping
+        the oldest enqueue time so that the reported lag stays accurate.
+
+        Args:
+            conn (Connection): The connection of the triggering write.
+            event_id (int): The ID of the event to recompute.
+    """
+    conn.execute(
+        text('INSERT INTO status_jobs (event_id, enqueued_at) VALUES (:event_id, :enqueued_at) '
+             'ON CONFLICT(event_id) DO NOTHING'),
+        {"event_id": event_id, "enqueued_at": time.time()}
+    )
+
+
+def process_pending(batch_size=100):
+    """
+        Apply one batch of pending status jobs.
+
+        Jobs are read, applied and deleted in a single transaction, so a crash leaves
+        them in the queue to be retried.
+
+        Args:
+            batch_size (int): The maximum number of events to recompute.
+
+        Returns:
+            int: The number of events processed.
+    """
+    with db.engine.connect() as conn:
+        event_ids = [row[0] for row in conn.execute(
+            text('SELECT event_id FROM status_jobs ORDER BY enqueued_at LIMIT :limit'),
+            {"limit": batch_size}
+        )]
+        if not event_ids:
+            return 0
+        crud.apply_status_checks(conn, event_ids)
+        conn.execute(
+            text('DELETE FROM status_jobs WHERE event_id IN :event_ids').bindparams(
+                bindparam('event_ids', expanding=True)),
+            {"event_ids": event_ids}
+        )
+        conn.commit()
+    cache.invalidate()
+    webhooks.notify()
+    return len(event_ids)
+
+
+def get_queue_status():
+    """
+        Retrieve the depth and lag of the status queue.
+
+        Returns:
+            dict: The number of pending jobs and the age in seconds of the oldest one.
+    """
+    with db.engine.connect() as conn:
+        depth, oldest = conn.execute(text('SELECT COUNT(*), MIN(enqueued_at) FROM status_jobs')).one()
+    return {
+        'depth': depth,
+        'lag_seconds': round(time.time() - oldest, 3) if oldest is not None else 0.0
+    }
+
+
+class StatusQueue:
+    """
+        In-process worker pool draining the status queue.
+
+        Attributes:
+            app (Flask): The application whose database holds the queue.
+            workers (int): The number of worker threads.
+            batch_size (int): The maximum number of events applied per transaction.
+            poll_interval (float): Seconds an idle worker waits before polling again.
+    """
+
+    def __init__(self, app, workers=2, batch_size=100, poll_interval=0.5):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """
+            Start the worker threads.
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'status-queue-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+            Stop the worker threads, leaving pending jobs in the queue.
+
+            Args:
+                timeout (float, optional): Seconds to wait for each worker.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """
+            Wake idle workers after a job has been enqueued.
+        """
+        self._wakeup.set()
+
+    def drain(self, timeout=5.0):
+        """
+            Block until the queue is empty.
+
+            Args:
+                timeout (float): The maximum number of seconds to wait.
+
+            Returns:
+                bool: True if the queue was drained within the timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self.app.app_context():
+            while get_queue_status()['depth']:
+                if time.monotonic() > deadline:
+                    return False
+                self.notify()
+                time.sleep(0.01)
+        return True
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    processed = process_pending(self.batch_size)
+                except Exception as e:
+                    print(f"Error processing status jobs: {e}")
+                    processed = 0
+                if processed:
+                    with self._lock:
+                        self.processed += processed
+                    continue
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+def init_app(app):
+    """
+        Attach a started status queue to the application.
+
+        Jobs left over from a previous process are picked up on start.
+
+        Args:
+            app (Flask): The Flask application instance.
+
+        Returns:
+            StatusQueue: The started queue.
+    """
+    queue = StatusQueue(
+        app,
+        workers=app.config['STATUS_QUEUE_WORKERS'],
+        batch_size=app.config['STATUS_QUEUE_BATCH_SIZE'],
+        poll_interval=app.config['STATUS_QUEUE_POLL_INTERVAL']
+    )
+    app.extensions['status_queue'] = queue
+    queue.start()
+    return queue
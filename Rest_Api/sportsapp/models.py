@@ -10,6 +10,7 @@ class Sport(db.Model):
             name (str): The name of the sport.
             slug (str): A unique slug for the sport.
             active (bool): Indicates whether the sport is active.
+            version (int): The row version, incremented on every update.
             events (list[Event]): A list of events associated with the sport.
         """
     __tablename__ = 'sports'
@@ -17,6 +18,7 @@ class Sport(db.Model):
     name = db.Column(db.String, nullable=False)
     slug = db.Column(db.String, nullable=False, unique=True)
     active = db.Column(db.Boolean, default=True)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     events = db.relationship('Event', backref='sport', lazy=True)
 
     def to_dict(self):
@@ -31,6 +33,7 @@ class Sport(db.Model):
             'name': self.name,
             'slug': self.slug,
             'active': self.active,
+            'version': self.version,
             'events': [event.to_dict() for event in self.events]
         }
 
@@ -49,6 +52,7 @@ class Event(db.Model):
             status (str): The status of the event.
             scheduled_start (datetime): The scheduled start time of the event.
             actual_start (datetime): The actual start time of the event.
+            version (int): The row version, incremented on every update.
             selections (list[Selection]): A list of selections associated with the event.
     """
     __tablename__ = 'events'
@@ -61,6 +65,7 @@ class Event(db.Model):
     status = db.Column(db.String, nullable=False)
     scheduled_start = db.Column(db.DateTime, nullable=False)
     actual_start = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     selections = db.relationship('Selection', backref='event', lazy=True)
 
     def to_dict(self):
@@ -80,6 +85,7 @@ class Event(db.Model):
             'status': self.status,
             'scheduled_start': self.scheduled_start,
             'actual_start': self.actual_start,
+            'version': self.version,
             'selections': [selection.to_dict() for selection in self.selections]
         }
 
@@ -95,6 +101,7 @@ class Selection(db.Model):
             price (Decimal): The price of the selection.
             active (bool): Indicates whether the selection is active.
             outcome (str): The outcome status of the selection.
+            version (int): The row version, incremented on every update.
     """
     __tablename__ = 'selections'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -103,6 +110,7 @@ class Selection(db.Model):
     price = db.Column(db.Numeric(10, 2), nullable=False)
     active = db.Column(db.Boolean, default=True)
     outcome = db.Column(db.String, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
     def to_dict(self):
         """
@@ -117,5 +125,242 @@ class Selection(db.Model):
             'event_id': self.event_id,
             'price': str(self.price),
             'active': self.active,
-            'outcome': self.outcome
+            'outcome': self.outcome,
+            'version': self.version
         }
+
+
+class EventArchive(db.Model):
+    """
+        EventArchive model representing a finished event moved out of the events table.
+
+        Holds the columns of Event, without its constraints, and the archiving time.
+
+        Attributes:
+            archived_at (float): Epoch timestamp of the archiving.
+    """
+    __tablename__ = 'events_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String, nullable=False)
+    slug = db.Column(db.String, nullable=False)
+    active = db.Column(db.Boolean)
+    type = db.Column(db.String, nullable=False)
+    sport_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String, nullable=False)
+    scheduled_start = db.Column(db.DateTime, nullable=False)
+    actual_start = db.Column(db.DateTime)
+    version = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.Float, nullable=False)
+
+
+class SelectionArchive(db.Model):
+    """
+        SelectionArchive model representing a selection archived with its finished event.
+
+        Holds the columns of Selection, without its constraints, and the archiving time.
+
+        Attributes:
+            archived_at (float): Epoch timestamp of the archiving.
+    """
+    __tablename__ = 'selections_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String, nullable=False)
+    event_id = db.Column(db.Integer, nullable=False)
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    active = db.Column(db.Boolean)
+    outcome = db.Column(db.String, nullable=False)
+    version = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.Float, nullable=False)
+
+
+# Archive table of each hot table with finished rows moved out of it
+ARCHIVE_TABLES = {'events': 'events_archive', 'selections': 'selections_archive'}
+
+
+class StatusJob(db.Model):
+    """
+        StatusJob model representing a pending status recomputation in the background queue.
+
+        Attributes:
+            event_id (int): The ID of the event whose status must be recomputed.
+            enqueued_at (float): Epoch timestamp of the oldest pending request for the event.
+    """
+    __tablename__ = 'status_jobs'
+    event_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    enqueued_at = db.Column(db.Float, nullable=False)
+
+
+class PriceTick(db.Model):
+    """
+        PriceTick model representing one entry of the append-only selection price history.
+
+        Rows are keyed by (selection_id, ts, seq) without a rowid so that the history of a
+        selection is stored contiguously and each tick costs four integers. The sequence
+        number tells apart the ticks of a selection recorded in the same millisecond.
+
+        Attributes:
+            selection_id (int): The ID of the selection whose price changed.
+            ts (int): Epoch timestamp of the change in milliseconds.
+            seq (int): The order of the tick among those of the selection at ts, from 0.
+            price (int): The new price in ticks of 0.01.
+    """
+    __tablename__ = 'price_history'
+    __table_args__ = {'sqlite_with_rowid': False}
+    selection_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    ts = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=False, server_default='0')
+    price = db.Column(db.Integer, nullable=False)
+
+
+class Change(db.Model):
+    """
+        Change model representing the latest write of a catalog row in the change log.
+
+        The log is compacted on write: a row keeps only its latest entry, which takes a
+        new sequence number, so the log holds one entry per catalog row plus the
+        tombstones of deleted rows. Entries are written by SQLite triggers, in the
+        transaction of the write.
+
+        Attributes:
+            seq (int): The sequence number, increasing with every write and never reused.
+            table_name (str): The table of the row: sports, events or selections.
+            row_id (int): The ID of the row.
+            op (str): upsert, or delete for a tombstone.
+            ts (float): Epoch timestamp of the write.
+    """
+    __tablename__ = 'changes'
+    __table_args__ = (
+        db.UniqueConstraint('table_name', 'row_id'),
+        db.Index('ix_changes_op_ts', 'op', 'ts'),
+        {'sqlite_autoincrement': True},
+    )
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    table_name = db.Column(db.String, nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String, nullable=False)
+    ts = db.Column(db.Float, nullable=False)
+
+
+class ChangeHorizon(db.Model):
+    """
+        ChangeHorizon model holding the highest sequence number pruned from the change log.
+
+        Clients that synced up to an older sequence number may have missed a tombstone.
+
+        Attributes:
+            id (int): Always 1.
+            seq (int): The highest pruned sequence number.
+    """
+    __tablename__ = 'change_horizon'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    seq = db.Column(db.Integer, nullable=False)
+
+
+# Tables whose writes are logged to the change log
+CHANGE_LOGGED_TABLES = ('sports', 'events', 'selections')
+
+
+def _change_log_ddl():
+    now = "(julianday('now') - 2440587.5) * 86400.0"
+    ddl = []
+    for table in CHANGE_LOGGED_TABLES:
+        for event, op, ref in (('INSERT', 'upsert', 'NEW'), ('UPDATE', 'upsert', 'NEW'), ('DELETE', 'delete', 'OLD')):
+            ddl.append(
+                f"CREATE TRIGGER IF NOT EXISTS log_{table}_{event.lower()} AFTER {event} ON {table} BEGIN "
+                f"DELETE FROM changes WHERE table_name = '{table}' AND row_id = {ref}.id; "
+                f"INSERT INTO changes (table_name, row_id, op, ts) VALUES ('{table}', {ref}.id, '{op}', {now}); END")
+        # Rows written before the change log existed are logged once, when it is created
+        ddl.append(f"INSERT OR IGNORE INTO changes (table_name, row_id, op, ts) "
+                   f"SELECT '{table}', id, 'upsert', {now} FROM {table} ORDER BY id")
+    return ddl
+
+
+class WebhookSubscription(db.Model):
+    """
+        WebhookSubscription model representing a partner endpoint notified of catalog events.
+
+        Attributes:
+            id (int): The ID of the subscription.
+            url (str): The URL the notifications are POSTed to.
+            topics (str): The comma-separated topics of webhooks.TOPICS subscribed to.
+            secret (str): The key of the HMAC-SHA256 signature of every request, if any.
+            created_at (float): Epoch timestamp of the subscription.
+            available_at (float): Epoch timestamp before which the endpoint is not called:
+                while a batch is in flight, or backing off after a failure.
+            failures (int): The number of batches failed in a row.
+    """
+    __tablename__ = 'webhook_subscriptions'
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String, nullable=False)
+    topics = db.Column(db.String, nullable=False)
+    secret = db.Column(db.String)
+    created_at = db.Column(db.Float, nullable=False)
+    available_at = db.Column(db.Float, nullable=False, default=0.0)
+    failures = db.Column(db.Integer, nullable=False, default=0)
+
+
+class WebhookDelivery(db.Model):
+    """
+        WebhookDelivery model representing a notification waiting for its endpoint.
+
+        Deliveries are written by SQLite triggers in the transaction of the write they
+        report, and deleted once their endpoint accepted them.
+
+        Attributes:
+            id (int): The ID of the delivery, sent along for deduplication.
+            subscription_id (int): The ID of the subscription notified.
+            topic (str): The topic of the notification.
+            payload (str): The JSON data of the notification.
+            created_at (float): Epoch timestamp of the write reported.
+            attempts (int): The number of failed attempts to deliver it.
+            status (str): pending, or dead once it failed too many times.
+            last_error (str): The error of the last failed attempt.
+    """
+    __tablename__ = 'webhook_deliveries'
+    __table_args__ = (db.Index('ix_webhook_deliveries_status_subscription', 'status', 'subscription_id', 'id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    subscription_id = db.Column(db.Integer, db.ForeignKey('webhook_subscriptions.id'), nullable=False)
+    topic = db.Column(db.String, nullable=False)
+    payload = db.Column(db.String, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String, nullable=False, default='pending')
+    last_error = db.Column(db.String)
+
+
+def _json_bool(value):
+    return f"json(CASE WHEN {value} THEN 'true' ELSE 'false' END)"
+
+
+# Per webhook topic: the table and columns whose update may report it, the condition and the payload
+WEBHOOK_TRIGGERS = {
+    'selection.settled': (
+        'selections', 'outcome', "OLD.outcome IS NOT NEW.outcome AND NEW.outcome != 'Unsettled'",
+        "'id', NEW.id, 'event_id', NEW.event_id, 'name', NEW.name, 'outcome', NEW.outcome, "
+        "'previous_outcome', OLD.outcome, 'version', NEW.version"),
+    'event.status': (
+        'events', 'status', 'OLD.status IS NOT NEW.status',
+        "'id', NEW.id, 'sport_id', NEW.sport_id, 'slug', NEW.slug, 'status', NEW.status, "
+        "'previous_status', OLD.status, 'version', NEW.version"),
+    'event.active': (
+        'events', 'active', 'OLD.active IS NOT NEW.active',
+        f"'id', NEW.id, 'sport_id', NEW.sport_id, 'slug', NEW.slug, 'active', {_json_bool('NEW.active')}, "
+        "'version', NEW.version"),
+}
+
+
+def _webhook_ddl():
+    now = "(julianday('now') - 2440587.5) * 86400.0"
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS webhook_{topic.replace('.', '_')} AFTER UPDATE OF {column} ON {table} "
+        f"WHEN {condition} BEGIN "
+        f"INSERT INTO webhook_deliveries (subscription_id, topic, payload, created_at, attempts, status) "
+        f"SELECT id, '{topic}', json_object({payload}), {now}, 0, 'pending' FROM webhook_subscriptions "
+        f"WHERE instr(',' || topics || ',', ',{topic},'); END"
+        for topic, (table, column, condition, payload) in WEBHOOK_TRIGGERS.items()
+    ]
+
+
+# Idempotent SQLite statements run after create_all: the change log triggers and backfill,
+# and the webhook triggers
+SQLITE_EXTRA_DDL = _change_log_ddl() + _webhook_ddl()
@@ -0,0 +1,215 @@
+import math
+from flask import g, has_request_context
+from sqlalchemy import text
+from sportsapp.database import db
+from sportsapp.models import ARCHIVE_TABLES
+
+# Guessed fraction of rows kept by a filter that table statistics cannot estimate
+REGEX_SELECTIVITY = 0.1
+RANGE_SELECTIVITY = 0.25
+COUNT_SELECTIVITY = 0.5
+# Relative cost of evaluating the REGEXP callback on a row, compared to reading it
+REGEX_ROW_COST = 5.0
+
+# Count filters: the table counted and the column its active rows are grouped by
+AGGREGATES = {
+    'min_active_events': ('events', 'sport_id', 'sports'),
+    'min_active_selections': ('selections', 'event_id', 'events'),
+}
+# Per searched table, the expression each count filter and the start time filter apply to.
+# Selections reach their sport and start time through their event, joined as parent.
+TARGETS = {
+    'sports': {'min_active_events': 'sports.id'},
+    'events': {'min_active_events': 'events.sport_id', 'min_active_selections': 'events.id',
+               'scheduled_start': 'events.scheduled_start'},
+    'selections': {'min_active_events': 'parent.sport_id', 'min_active_selections': 'selections.event_id',
+                   'scheduled_start': 'parent.scheduled_start'},
+}
+
+
+class QueryTooExpensive(ValueError):
+    """
+        Raised when the estimated cost of a search exceeds the configured budget.
+
+        Attributes:
+            cost (float): The estimated cost of the cheapest plan, in rows read.
+            budget (float): The configured budget.
+    """
+
+    def __init__(self, cost, budget, paginated):
+        hint = "narrow the filters" if paginated else "narrow the filters or paginate with limit"
+        super().__init__(f"Estimated search cost {cost:.0f} exceeds the budget of {budget:.0f}; {hint}")
+        self.cost = cost
+        self.budget = budget
+
+
+class SearchPlan:
+    """
+        The SQL chosen for a search, with its estimated cost.
+
+        Attributes:
+            table (str): The searched table.
+            query (str): The SQL statement.
+            params (dict): The bound parameters.
+            strategies (dict): correlated or grouped, per count filter.
+            cost (float): The estimated cost, in rows read.
+    """
+
+    def __init__(self, table, query, params, strategies, cost):
+        self.table = table
+        self.query = query
+        self.params = params
+        self.strategies = strategies
+        self.cost = cost
+
+    def describe(self):
+        """
+            Summarize the plan on one line, for the X-Query-Plan debug header.
+        """
+        parts = [f'{self.table}'] + [f'{name}={strategy}' for name, strategy in self.strategies.items()]
+        return '; '.join(parts + [f'cost={self.cost:.0f}'])
+
+
+def table_rows(conn, table):
+    """
+        Estimate the number of rows of a table.
+
+        Uses the statistics of ANALYZE when present, otherwise the largest id, which
+        SQLite finds in the primary key b-tree without scanning the table.
+    """
+    has_stats = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")).scalar()
+    if has_stats:
+        stat = conn.execute(text('SELECT stat FROM sqlite_stat1 WHERE tbl = :table AND idx IS NULL'),
+                            {"table": table}).scalar()
+        if stat:
+            return max(1, int(stat.split()[0]))
+    return max(1, conn.execute(text(f'SELECT COALESCE(MAX(id), 0) FROM {table}')).scalar())
+
+
+def indexed_columns(conn, table):
+    """
+        List the columns that lead an index of a table.
+    """
+    return {row[0] for row in conn.execute(text(
+        'SELECT ii.name FROM pragma_index_list(:table) il, pragma_index_info(il.name) ii WHERE ii.seqno = 0'),
+        {"table": table})}
+
+
+def _source(table, include_archived):
+    """
+        Return what a search reads a table from: the table, or its union with its archive.
+    """
+    if not include_archived or table not in ARCHIVE_TABLES:
+        return table
+    columns = ', '.join(column.name for column in db.metadata.tables[table].columns)
+    return f'(SELECT {columns} FROM {table} UNION ALL SELECT {columns} FROM {ARCHIVE_TABLES[table]})'
+
+
+def _aggregate_costs(rows, inner, key, keys_table, indexes, outer_rows, fraction):
+    """
+        Estimate the cost of a count filter as a correlated subquery and as a grouped join.
+
+        A correlated subquery counts the rows of one key for every outer row: an index
+        seek when the key is indexed, a full scan of the counted table otherwise. The
+        grouped join scans the counted table once, sorting it unless the key is indexed,
+        and probes the grouped result once per outer row. Only the correlated subquery
+        stops early under a LIMIT, so only its cost shrinks with the fraction of outer
+        rows a page needs.
+
+        Returns:
+            tuple: The correlated and grouped costs.
+    """
+    n = rows[inner]
+    if key in indexes[inner]:
+        per_row = math.log2(n + 1) + n / rows[keys_table]
+        scan = n
+    else:
+        per_row = n
+        scan = n * math.log2(n + 1)
+    correlated = outer_rows * per_row * fraction
+    grouped = scan + outer_rows * math.log2(rows[keys_table] + 1) * fraction
+    return correlated, grouped
+
+
+def plan_search(conn, table, filters, budget=None):
+    """
+        Build the cheapest SQL for a search from the table statistics.
+
+        The name and start time filters are plain predicates. Each count filter is
+        written either as a correlated COUNT subquery or as a join with a GROUP BY ...
+        HAVING over the counted table, whichever is estimated cheaper; filters that
+        every row passes are dropped. With filters.limit the results are paginated
+        in id order. With filters.include_archived, the searched table and the parent
+        events of selections are read together with their archive tables; count
+        filters only count the hot tables, as archived rows are all inactive.
+
+        Args:
+            conn (Connection): The connection the search runs on.
+            table (str): sports, events or selections.
+            filters (Filter): The search filters.
+            budget (float, optional): The maximum estimated cost, in rows read.
+
+        Returns:
+            SearchPlan: The chosen plan; also stored in g.search_plan during a request.
+
+        Raises:
+            QueryTooExpensive: If the cheapest plan exceeds the budget.
+    """
+    targets = TARGETS[table]
+    rows = {name: table_rows(conn, name) for name in ('sports', 'events', 'selections')}
+    indexes = {name: indexed_columns(conn, name) for name in ('events', 'selections')}
+    archived = filters.include_archived and table in ARCHIVE_TABLES
+    scanned = rows[table] + (table_rows(conn, ARCHIVE_TABLES[table]) if archived else 0)
+    joins, where, params = [], [], {}
+    selectivity, cost = 1.0, float(scanned)
+
+    if filters.name_regex:
+        where.append(f'{table}.name REGEXP :name_regex')
+        params['name_regex'] = filters.name_regex
+        selectivity *= REGEX_SELECTIVITY
+        cost += scanned * REGEX_ROW_COST
+    by_start = bool(filters.scheduled_start) and 'scheduled_start' in targets
+    if by_start:
+        where.append(f"{targets['scheduled_start']} BETWEEN :start AND :end")
+        params['start'], params['end'] = filters.scheduled_start
+        selectivity *= RANGE_SELECTIVITY
+    counts = {name: getattr(filters, name) for name in AGGREGATES
+              if name in targets and getattr(filters, name) is not None and getattr(filters, name) > 0}
+    if table == 'selections' and (by_start or 'min_active_events' in counts):
+        joins.append(f"JOIN {_source('events', archived)} parent ON parent.id = selections.event_id")
+        cost += scanned * math.log2(rows['events'] + 1)
+
+    outer_rows = scanned * selectivity
+    fraction = 1.0
+    if filters.limit is not None:
+        # A page needs enough outer rows to find offset + limit matches
+        matches = max(outer_rows * COUNT_SELECTIVITY ** len(counts), 1.0)
+        fraction = min(1.0, (filters.offset + filters.limit) / matches)
+    cost *= fraction
+
+    strategies = {}
+    for name, minimum in counts.items():
+        inner, key, keys_table = AGGREGATES[name]
+        correlated, grouped = _aggregate_costs(rows, inner, key, keys_table, indexes, outer_rows, fraction)
+        params[name] = minimum
+        if grouped < correlated:
+            alias = f'agg_{inner}'
+            joins.append(f'JOIN (SELECT {key} AS k FROM {inner} WHERE active = 1 GROUP BY {key} '
+                         f'HAVING COUNT(*) >= :{name}) {alias} ON {alias}.k = {targets[name]}')
+            strategies[name] = 'grouped'
+        else:
+            where.append(f'(SELECT COUNT(*) FROM {inner} c WHERE c.{key} = {targets[name]} AND c.active = 1) >= :{name}')
+            strategies[name] = 'correlated'
+        cost += min(correlated, grouped)
+
+    source = _source(table, archived)
+    query = ' '.join([f'SELECT {table}.* FROM {source}' + (f' {table}' if archived else '')] + joins + ['WHERE 1=1'] + [f'AND {w}' for w in where])
+    if filters.limit is not None:
+        query += f' ORDER BY {table}.id LIMIT :limit OFFSET :offset'
+        params['limit'], params['offset'] = filters.limit, filters.offset
+    plan = SearchPlan(table, query, params, strategies, cost)
+    if has_request_context():
+        g.search_plan = plan
+    if budget is not None and cost > budget:
+        raise QueryTooExpensive(cost, budget, filters.limit is not None)
+    return plan
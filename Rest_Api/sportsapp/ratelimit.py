@@ -0,0 +1,189 @@
+import math
+import sqlite3
+import threading
+import time
+from flask import g, request, jsonify
+from sportsapp.database import READ_ENDPOINTS, ReplicaRouter
+
+SEARCH_ENDPOINTS = READ_ENDPOINTS
+CATEGORIES = ('read', 'search', 'write')
+
+
+def request_category():
+    """
+        Classify the current request for rate limiting.
+
+        Returns:
+            str: search for the search endpoints, read for other GETs, write otherwise.
+    """
+    if request.endpoint in SEARCH_ENDPOINTS:
+        return 'search'
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return 'read'
+    return 'write'
+
+
+class MemoryBuckets:
+    """
+        Token buckets held in process memory.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """
+            Take one token from a bucket, refilled at rate tokens per second up to burst.
+
+            Returns:
+                float: 0 if a token was taken, else the seconds until one is available.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if len(self._buckets) > 10000:
+                # Buckets that have refilled completely carry no state; each refills at the rate of its category
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+            tokens, updated, _ = self._buckets.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return wait
+
+
+class SQLiteBuckets:
+    """
+        Token buckets held in a SQLite file, shared by every worker process using it.
+
+        Each take is a single IMMEDIATE transaction, so concurrent workers serialize
+        on the file lock instead of overdrawing a bucket. Every PRUNE_INTERVAL seconds,
+        a process deletes the buckets not taken from for max_idle seconds, which have
+        refilled completely and carry no state.
+
+        Attributes:
+            path (str): The SQLite file.
+            max_idle (float): Seconds after which any bucket has refilled completely.
+    """
+
+    PRUNE_INTERVAL = 60.0
+
+    def __init__(self, path, max_idle):
+        self.path = path
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._next_prune = 0.0
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS rate_buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_buckets_updated ON rate_buckets (updated)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst):
+        """
+            Take one token from a bucket, refilled at rate tokens per second up to burst.
+
+            Returns:
+                float: 0 if a token was taken, else the seconds until one is available.
+        """
+        conn = self._connect()
+        # Wall-clock time, as the buckets outlive and are shared between processes
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute('INSERT INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                         'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                         (key, tokens, now))
+            if now >= self._next_prune:
+                self._next_prune = now + self.PRUNE_INTERVAL
+                conn.execute('DELETE FROM rate_buckets WHERE updated < ?', (now - self.max_idle,))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+class AdmissionController:
+    """
+        Rate limit clients and shed load before requests reach the blueprint.
+
+        Every client has one token bucket per request category (read, search, write);
+        a request finding its bucket empty gets a 429. Independently, a request arriving
+        while its category already has its maximum number of requests in flight in this
+        process gets a 503. Both carry a Retry-After header. Clients are identified like
+        for read replica routing, by their X-Api-Key header or else their address, which
+        is taken from X-Forwarded-For behind TRUSTED_PROXIES reverse proxies.
+
+        Attributes:
+            limits (dict): The (tokens per second, burst) budget per category.
+            max_concurrent (dict): The maximum number of in-flight requests per category.
+            buckets (MemoryBuckets | SQLiteBuckets): The token bucket storage.
+    """
+
+    def __init__(self, app, limits, max_concurrent, storage=None):
+        self.limits = limits
+        self.max_concurrent = max_concurrent
+        # Idle for longer than the slowest refill, a bucket of any category is full
+        max_idle = max(burst / rate for rate, burst in limits.values())
+        self.buckets = SQLiteBuckets(storage, max_idle) if storage else MemoryBuckets()
+        self._in_flight = dict.fromkeys(CATEGORIES, 0)
+        self._lock = threading.Lock()
+        app.before_request(self.before_request)
+        app.teardown_request(self.teardown_request)
+
+    def before_request(self):
+        """
+            Reject the current request if its client is over budget or its category is saturated.
+        """
+        category = request_category()
+        rate, burst = self.limits[category]
+        wait = self.buckets.take(f'{category}:{ReplicaRouter.client_id()}', rate, burst)
+        if wait:
+            return self._reject(429, f"Rate limit exceeded for {category} requests", wait)
+        with self._lock:
+            if self._in_flight[category] >= self.max_concurrent[category]:
+                return self._reject(503, f"Too many concurrent {category} requests", 1)
+            self._in_flight[category] += 1
+        g.admission_category = category
+
+    def teardown_request(self, exc=None):
+        """
+            Release the concurrency slot of the current request.
+        """
+        category = g.pop('admission_category', None)
+        if category is not None:
+            with self._lock:
+                self._in_flight[category] -= 1
+
+    @staticmethod
+    def _reject(status, message, retry_after):
+        response = jsonify({"error": message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+
+def init_app(app):
+    """
+        Put admission control in front of the application.
+
+        Args:
+            app (Flask): The Flask application instance.
+    """
+    app.extensions['admission'] = AdmissionController(
+        app, app.config['RATE_LIMITS'], app.config['RATE_LIMIT_MAX_CONCURRENT'], app.config['RATE_LIMIT_STORAGE'])
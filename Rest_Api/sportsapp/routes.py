@@ -1,10 +1,146 @@
-from flask import Blueprint, request, jsonify
+import json
+import struct
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, g, Response, stream_with_context
 from pydantic import ValidationError
-from sportsapp import crud, schemas, models
+from sportsapp import crud, schemas, models, jobs, serializers, webhooks
+from sportsapp.cache import cached
 from sportsapp.database import db
 
 main = Blueprint('main', __name__)
 
+# Seconds a cached sport summary is served for, however many writes happen meanwhile
+SUMMARY_MAX_AGE = 60
+
+
+@main.after_request
+def _report_search_plan(response):
+    # Debug aid: the rewrite and estimated cost the planner picked for a search
+    plan = g.get('search_plan')
+    if plan is not None and current_app.config['SEARCH_PLAN_HEADER']:
+        response.headers['X-Query-Plan'] = plan.describe()
+    return response
+
+
+def _expected_version(data):
+    """
+        Extract the version a PUT request is conditional on.
+
+        The version is taken from the expected_version body field, or else from the
+        If-Match header, where * only requires the row to exist.
+
+        Args:
+            data (dict): The validated update data; expected_version is removed from it.
+
+        Returns:
+            int: The expected version, crud.ANY_VERSION for If-Match: *, or None for an
+            unconditional update.
+
+        Raises:
+            ValueError: If the If-Match header is not a version number.
+    """
+    expected_version = data.pop('expected_version', None)
+    if expected_version is None and request.if_match.star_tag:
+        return crud.ANY_VERSION
+    if expected_version is None and request.if_match:
+        etags = request.if_match.as_set()
+        if len(etags) != 1:
+            raise ValueError("If-Match must contain a single version")
+        expected_version = int(etags.pop())
+    return expected_version
+
+
+def _validation_error(e):
+    """
+        Build the 400 response for an invalid request.
+
+        Args:
+            e (Exception): The validation error.
+
+        Returns:
+            tuple: The JSON response and status code.
+    """
+    if isinstance(e, ValidationError):
+        return jsonify(e.errors()), 400
+    return jsonify({"error": str(e)}), 400
+
+
+def _version_conflict(e):
+    """
+        Build the 409 response for a failed compare-and-swap update.
+
+        Args:
+            e (VersionConflict): The conflict raised by crud.
+
+        Returns:
+            tuple: The JSON response and status code.
+    """
+    response = jsonify({"error": str(e), "current_version": e.current_version})
+    response.set_etag(str(e.current_version))
+    return response, 409
+
+
+def _parse_upserts(model, slug=None):
+    """
+        Validate the body of an upsert by slug.
+
+        Args:
+            model (type): SportCreate or EventCreate.
+            slug (str, optional): The slug in the URL of a single upsert; the body is
+                then one object whose slug, if given, must match it. Otherwise the body
+                is a list of objects, each with its slug.
+
+        Returns:
+            list: The validated rows.
+
+        Raises:
+            ValidationError: If a row is invalid.
+            ValueError: If the body does not have the expected shape.
+    """
+    data = request.get_json()
+    if slug is None:
+        if not isinstance(data, list):
+            raise ValueError("Request body must be a list")
+        return [model(**item) for item in data]
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be an object")
+    if data.get('slug', slug) != slug:
+        raise ValueError("Slug in the body does not match the URL")
+    return [model(**{**data, 'slug': slug})]
+
+
+def _upsert_response(row, result):
+    """
+        Build the response of a single upsert by slug.
+
+        Args:
+            row (BaseModel): The validated row.
+            result (dict): Its result, as returned by crud.
+
+        Returns:
+            tuple: The JSON response, with the version as ETag, and 201 if the row was created, else 200.
+    """
+    response = jsonify({**row.dict(), **result})
+    response.set_etag(str(result['version']))
+    return response, 201 if result['result'] == 'created' else 200
+
+
+def _rows_response(mimetype, table, rows):
+    """
+        Build the response for rows in the negotiated format.
+
+        Args:
+            mimetype (str): The negotiated media type.
+            table (str): The table the rows were selected from.
+            rows (Rows): The rows, as returned by crud.
+
+        Returns:
+            Response: The encoded rows.
+    """
+    response = Response(serializers.encode(mimetype, table, rows), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
 
 @main.route('/sports/', methods=['POST'])
 def create_sport():
@@ -46,22 +182,86 @@ def update_sport(sport_id):
         - name: The name of the sport (str, optional)
         - slug: A unique slug for the sport (str, optional)
         - active: The active status of the sport (bool, optional)
+        - expected_version: Only update if the sport is at this version (int, optional)
+
+        Headers:
+        - If-Match: Alternative to expected_version, * only requiring the row to exist (optional)
 
         Returns:
         - 200: Sport updated successfully
         - 400: Validation or update error
+        - 404: Sport not found, for a conditional update
+        - 409: The sport was modified concurrently
     """
     data = request.get_json()
     try:
         sport_data = schemas.SportUpdate(**data).dict(exclude_unset=True)
-    except ValidationError as e:
-        return jsonify(e.errors()), 400
+        expected_version = _expected_version(sport_data)
+    except (ValidationError, ValueError) as e:
+        return _validation_error(e)
     try:
-        crud.update_sport(sport_id, sport_data)
+        version = crud.update_sport(sport_id, sport_data, expected_version)
         db.session.commit()
+    except crud.RowNotFound:
+        return jsonify({"error": "Sport not found"}), 404
+    except crud.VersionConflict as e:
+        return _version_conflict(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify({"id": sport_id, **sport_data, "version": version})
+    if version is not None:
+        response.set_etag(str(version))
+    return response, 200
+
+
+@main.route('/sports/by-slug/<slug>', methods=['PUT'])
+def upsert_sport(slug):
+    """
+        Create or update a sport by slug, without writing if it is unchanged.
+
+        Parameters:
+        - slug: The slug of the sport (str)
+
+        Request Body:
+        - name: The name of the sport (str)
+        - active: The active status of the sport (bool)
+
+        Returns:
+        - 201: Sport created
+        - 200: Sport updated or unchanged, as told by its result field
+        - 400: Validation or upsert error
+    """
+    try:
+        sports = _parse_upserts(schemas.SportCreate, slug)
+    except (ValidationError, ValueError) as e:
+        return _validation_error(e)
+    try:
+        results = crud.upsert_sports(sports)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    return _upsert_response(sports[0], results[0])
+
+
+@main.route('/sports/by-slug', methods=['PUT'])
+def upsert_sports():
+    """
+        Create or update sports by slug in one transaction, writing only the changed ones.
+
+        Request Body:
+        - A list of sports, each with name, slug and active
+
+        Returns:
+        - 200: Per sport, in order, its id, slug, version and result (created, updated or unchanged)
+        - 400: Validation or upsert error
+    """
+    try:
+        sports = _parse_upserts(schemas.SportCreate)
+    except (ValidationError, ValueError) as e:
+        return _validation_error(e)
+    try:
+        return jsonify(crud.upsert_sports(sports)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-    return jsonify({"id": sport_id, **sport_data}), 200
 
 
 @main.route('/sports/search', methods=['POST'])
@@ -72,10 +272,12 @@ def search_sports():
         Request Body:
         - name_regex: Regex pattern to match sport names (str, optional)
         - min_active_events: Minimum number of active events (int, optional)
+        - limit: Page size (int, optional)
+        - offset: Number of results to skip (int, optional)
 
         Returns:
         - 200: List of sports matching the filters
-        - 400: Validation or search error
+        - 400: Validation or search error, or a search over the cost budget
     """
     data = request.get_json()
     try:
@@ -84,7 +286,7 @@ def search_sports():
         return jsonify(e.errors()), 400
     try:
         sports = crud.search_sports(filters)
-        return jsonify([dict(row) for row in sports]), 200
+        return _rows_response(serializers.negotiate(), 'sports', sports), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -145,7 +347,9 @@ def get_event(event_id):
     try:
         event = crud.get_event(event_id)
         if event:
-            return jsonify(dict(event)), 200
+            response = jsonify(dict(event))
+            response.set_etag(str(event['version']))
+            return response, 200
         return jsonify({"error": "Event not found"}), 404
     except Exception as e:
         return jsonify({"error": str(e)}), 400
@@ -168,22 +372,127 @@ def update_event(event_id):
         - status: The status of the event (str, optional)
         - scheduled_start: The scheduled start time of the event (str, datetime format, optional)
         - actual_start: The actual start time of the event (str, datetime format, optional)
+        - expected_version: Only update if the event is at this version (int, optional)
+
+        Headers:
+        - If-Match: Alternative to expected_version, * only requiring the row to exist (optional)
 
         Returns:
         - 200: Event updated successfully
         - 400: Validation or update error
+        - 404: Event not found, for a conditional update
+        - 409: The event was modified concurrently
     """
     data = request.get_json()
     try:
         event_data = schemas.EventUpdate(**data).dict(exclude_unset=True)
+        expected_version = _expected_version(event_data)
+    except (ValidationError, ValueError) as e:
+        return _validation_error(e)
+    try:
+        version = crud.update_event(event_id, event_data, expected_version)
+        db.session.commit()
+    except crud.RowNotFound:
+        return jsonify({"error": "Event not found"}), 404
+    except crud.VersionConflict as e:
+        return _version_conflict(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify({"id": event_id, **event_data, "version": version})
+    if version is not None:
+        response.set_etag(str(version))
+    return response, 200
+
+
+@main.route('/events/by-slug/<slug>', methods=['PUT'])
+def upsert_event(slug):
+    """
+        Create or update an event by slug, without writing if it is unchanged.
+
+        Parameters:
+        - slug: The slug of the event (str)
+
+        Request Body:
+        - name: The name of the event (str)
+        - active: The active status of the event (bool)
+        - type: The type of the event (str)
+        - sport_id: The ID of the sport associated with the event (int)
+        - status: The status of the event (str)
+        - scheduled_start: The scheduled start time of the event (str, datetime format)
+        - actual_start: The actual start time of the event (str, datetime format, optional)
+
+        Returns:
+        - 201: Event created
+        - 200: Event updated or unchanged, as told by its result field
+        - 400: Validation or upsert error, or an unknown sport
+    """
+    try:
+        events = _parse_upserts(schemas.EventCreate, slug)
+    except (ValidationError, ValueError) as e:
+        return _validation_error(e)
+    try:
+        results = crud.upsert_events(events)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    return _upsert_response(events[0], results[0])
+
+
+@main.route('/events/by-slug', methods=['PUT'])
+def upsert_events():
+    """
+        Create or update events by slug in one transaction, writing only the changed ones.
+
+        Request Body:
+        - A list of events, each with the fields of PUT /events/by-slug/<slug> and its slug
+
+        Returns:
+        - 200: Per event, in order, its id, slug, version and result (created, updated or unchanged)
+        - 400: Validation or upsert error, or an unknown sport
+    """
+    try:
+        events = _parse_upserts(schemas.EventCreate)
+    except (ValidationError, ValueError) as e:
+        return _validation_error(e)
+    try:
+        return jsonify(crud.upsert_events(events)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@main.route('/events/<int:event_id>/settle', methods=['POST'])
+def settle_event(event_id):
+    """
+        Settle all selections of an event at once.
+
+        Parameters:
+        - event_id: The ID of the event to settle (int)
+
+        Request Body:
+        - winners: IDs of the selections settled as Win (list of int, optional)
+        - losers: IDs of the selections settled as Lose (list of int, optional)
+        - void: IDs of the selections settled as Void (list of int, optional)
+        - remaining: Outcome for the unsettled selections not listed (str, optional)
+        - status: The status the event transitions to (str, optional, default Ended)
+
+        Returns:
+        - 200: Settlement statistics
+        - 404: Event not found
+        - 400: Validation or settlement error
+    """
+    data = request.get_json()
+    try:
+        settlement = schemas.EventSettle(**data)
     except ValidationError as e:
         return jsonify(e.errors()), 400
+
+    if crud.get_event(event_id) is None:
+        return jsonify({"error": "Event not found"}), 404
+
     try:
-        crud.update_event(event_id, event_data)
-        db.session.commit()
+        stats = crud.settle_event(event_id, settlement)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-    return jsonify({"id": event_id, **event_data}), 200
+    return jsonify(stats), 200
 
 
 @main.route('/events/search', methods=['POST'])
@@ -196,10 +505,13 @@ def search_events():
         - min_active_events: Minimum number of active events (int, optional)
         - min_active_selections: Minimum number of active selections (int, optional)
         - scheduled_start: Time range for scheduled start (list of two str, datetime format, optional)
+        - include_archived: Also search the archived finished events (bool, optional, default false)
+        - limit: Page size (int, optional)
+        - offset: Number of results to skip (int, optional)
 
         Returns:
         - 200: List of events matching the filters
-        - 400: Validation or search error
+        - 400: Validation or search error, or a search over the cost budget
     """
     data = request.get_json()
     try:
@@ -208,7 +520,7 @@ def search_events():
         return jsonify(e.errors()), 400
     try:
         events = crud.search_events(filters)
-        return jsonify([dict(row) for row in events]), 200
+        return _rows_response(serializers.negotiate(), 'events', events), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
@@ -264,22 +576,144 @@ def update_selection(selection_id):
         - price: The price of the selection (decimal, optional)
         - active: The active status of the selection (bool, optional)
         - outcome: The outcome status of the selection (str, optional)
+        - expected_version: Only update if the selection is at this version (int, optional)
+
+        Headers:
+        - If-Match: Alternative to expected_version, * only requiring the row to exist (optional)
+
+        With GROUP_COMMIT_ENABLED, updates without an expected version are committed in
+        batches with concurrent ones, the last update of a selection winning.
 
         Returns:
         - 200: Selection updated successfully
         - 400: Validation or update error
+        - 404: Selection not found, for a conditional update
+        - 409: The selection was modified concurrently
     """
     data = request.get_json()
     try:
         selection_data = schemas.SelectionUpdate(**data).dict(exclude_unset=True)
-    except ValidationError as e:
-        return jsonify(e.errors()), 400
+        expected_version = _expected_version(selection_data)
+    except (ValidationError, ValueError) as e:
+        return _validation_error(e)
+    batcher = current_app.extensions.get('selection_batcher')
     try:
-        crud.update_selection(selection_id, selection_data)
-        db.session.commit()
+        if batcher is not None and expected_version is None:
+            version = batcher.submit(selection_id, selection_data)
+        else:
+            version = crud.update_selection(selection_id, selection_data, expected_version)
+            db.session.commit()
+    except crud.RowNotFound:
+        return jsonify({"error": "Selection not found"}), 404
+    except crud.VersionConflict as e:
+        return _version_conflict(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
-    return jsonify({"id": selection_id, **selection_data}), 200
+    response = jsonify({"id": selection_id, **selection_data, "version": version})
+    if version is not None:
+        response.set_etag(str(version))
+    return response, 200
+
+
+RESOLUTION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Bound of the epoch milliseconds accepted in queries, well within a SQLite INTEGER
+TIMESTAMP_LIMIT_MS = 2 ** 62
+
+
+def _parse_timestamp(value, default):
+    """
+        Parse a query string timestamp given as epoch seconds or an ISO 8601 datetime.
+
+        Args:
+            value (str): The raw query string value, or None.
+            default (int): The epoch milliseconds to use when the value is missing.
+
+        Returns:
+            int: The timestamp as epoch milliseconds.
+
+        Raises:
+            ValueError: If the value is not a valid timestamp, is not finite or is out of range.
+    """
+    if value is None:
+        return default
+    try:
+        try:
+            ms = float(value) * 1000
+        except ValueError:
+            ms = datetime.fromisoformat(value).timestamp() * 1000
+    except (OverflowError, OSError):
+        raise ValueError(f"Timestamp out of range: {value}")
+    if not -TIMESTAMP_LIMIT_MS <= ms <= TIMESTAMP_LIMIT_MS:
+        # Also rejects inf and nan, which compare false with any bound
+        raise ValueError(f"Timestamp out of range: {value}")
+    return int(ms)
+
+
+def _parse_resolution(value):
+    """
+        Parse a bucket width given in seconds or with a s/m/h/d unit suffix (e.g. 5m).
+
+        Args:
+            value (str): The raw query string value, or None for raw ticks.
+
+        Returns:
+            int: The bucket width in milliseconds, or None.
+
+        Raises:
+            ValueError: If the value is not a positive duration within range.
+    """
+    if value is None:
+        return None
+    unit = RESOLUTION_UNITS.get(value[-1:])
+    seconds = int(value[:-1]) * unit if unit else int(value)
+    if seconds <= 0:
+        raise ValueError("resolution must be positive")
+    if seconds * 1000 > TIMESTAMP_LIMIT_MS:
+        raise ValueError(f"resolution out of range: {value}")
+    return seconds * 1000
+
+
+def _format_price(ticks):
+    """
+        Format a price stored in ticks of 0.01 like Selection.to_dict formats prices.
+    """
+    return f"{ticks / crud.PRICE_TICKS_PER_UNIT:.2f}"
+
+
+@main.route('/selections/<int:selection_id>/prices', methods=['GET'])
+def get_selection_prices(selection_id):
+    """
+        Retrieve the price history of a selection.
+
+        Parameters:
+        - selection_id: The ID of the selection (int)
+
+        Query Parameters:
+        - from: Start of the range, epoch seconds or ISO 8601 (optional)
+        - to: End of the range (exclusive), epoch seconds or ISO 8601 (optional)
+        - resolution: OHLC bucket width in seconds or with a s/m/h/d suffix (optional, raw ticks if omitted)
+
+        Returns:
+        - 200: The raw price ticks or OHLC buckets
+        - 400: Invalid query parameters
+    """
+    try:
+        start = _parse_timestamp(request.args.get('from'), 0)
+        end = _parse_timestamp(request.args.get('to'), TIMESTAMP_LIMIT_MS)
+        resolution = _parse_resolution(request.args.get('resolution'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = crud.get_price_history(selection_id, start, end, resolution)
+    if resolution is None:
+        prices = [{"ts": ts / 1000, "price": _format_price(price)} for ts, price in rows]
+    else:
+        prices = [{"ts": ts / 1000, "open": _format_price(open_), "high": _format_price(high),
+                   "low": _format_price(low), "close": _format_price(close), "ticks": ticks}
+                  for ts, open_, high, low, close, ticks in rows]
+    return jsonify({"selection_id": selection_id,
+                    "resolution": resolution // 1000 if resolution else None,
+                    "prices": prices}), 200
 
 
 @main.route('/selections/search', methods=['POST'])
@@ -292,6 +726,9 @@ def search_selections():
             - min_active_events: int (optional)
             - min_active_selections: int (optional)
             - scheduled_start: list[str] (optional)
+            - include_archived: bool (optional, also search the selections of archived events)
+            - limit: int (optional)
+            - offset: int (optional)
 
         Returns:
             JSON response containing a list of selections matching the filters or error message.
@@ -303,42 +740,310 @@ def search_selections():
         return jsonify(e.errors()), 400
     try:
         selections = crud.search_selections(filters)
-        return jsonify([dict(row) for row in selections]), 200
+        return _rows_response(serializers.negotiate(), 'selections', selections), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+@main.route('/sports/summary', methods=['GET'])
+@cached(max_age=SUMMARY_MAX_AGE, timed=True)
+def get_sports_summary():
+    """
+        Retrieve the dashboard figures of every sport.
+
+        Served from the response cache for SUMMARY_MAX_AGE seconds, writes included:
+        under live price updates, invalidating on every write would recompute the
+        aggregates over the whole catalog on nearly every request. The figures may thus
+        lag the catalog by up to SUMMARY_MAX_AGE seconds.
+
+        Returns:
+        - 200: Per sport, its id, name, slug and active flag, active_events,
+          upcoming_events (scheduled in the next 24 hours), active_selections and
+          average_price (of the active selections, null if none)
+    """
+    summary = crud.get_sports_summary()
+    for sport in summary:
+        sport["active"] = bool(sport["active"])
+        if sport["average_price"] is not None:
+            sport["average_price"] = f"{sport['average_price']:.2f}"
+    return jsonify(summary), 200
+
+
 @main.route('/sports', methods=['GET'])
+@cached
 def get_sports():
     """
         Retrieve all sports.
 
         Returns:
-            JSON response containing a list of all sports.
+            JSON response containing a list of all sports, or with Accept set to
+            application/x-msgpack or application/vnd.apache.arrow.stream, the flat
+            sport rows in that columnar format.
     """
-    sports = crud.get_all_sports()
-    return jsonify([sport.to_dict() for sport in sports])
+    mimetype = serializers.negotiate()
+    if mimetype != serializers.JSON:
+        return _rows_response(mimetype, 'sports', crud.get_all_rows('sports'))
+    return Response(serializers.encode_json_tree(crud.get_all_sports()), mimetype=mimetype)
 
 
 @main.route('/events', methods=['GET'])
+@cached
 def get_events():
     """
         Retrieve all events.
 
         Returns:
-            JSON response containing a list of all events.
+            JSON response containing a list of all events, or with Accept set to
+            application/x-msgpack or application/vnd.apache.arrow.stream, the flat
+            event rows in that columnar format.
     """
-    events = crud.get_all_events()
-    return jsonify([event.to_dict() for event in events])
+    mimetype = serializers.negotiate()
+    if mimetype != serializers.JSON:
+        return _rows_response(mimetype, 'events', crud.get_all_rows('events'))
+    return Response(serializers.encode_json_tree(crud.get_all_events()), mimetype=mimetype)
 
 
 @main.route('/selections', methods=['GET'])
+@cached
 def get_selections():
     """
         Retrieve all selections.
 
         Returns:
-            JSON response containing a list of all selections.
+            JSON response containing a list of all selections, or with Accept set to
+            application/x-msgpack or application/vnd.apache.arrow.stream, the flat
+            selection rows in that columnar format.
+    """
+    mimetype = serializers.negotiate()
+    if mimetype != serializers.JSON:
+        return _rows_response(mimetype, 'selections', crud.get_all_rows('selections'))
+    return Response(serializers.encode_json_tree(crud.get_all_selections()), mimetype=mimetype)
+
+
+# Default and maximum number of changes per GET /changes page
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 5000
+
+
+@main.route('/changes', methods=['GET'])
+def get_changes():
+    """
+        Retrieve the catalog writes since a sequence number, to mirror the catalog incrementally.
+
+        The log keeps only the latest write of each row, so a client starting from 0
+        receives every row once, and then only what changed since its last page.
+        Tombstones of deleted rows are pruned after CHANGE_LOG_RETENTION seconds by
+        the archive job, so this endpoint only reads.
+
+        Query Parameters:
+        - since: The seq of the last change applied by the client (int, optional, default 0)
+        - limit: The maximum number of changes (int, optional, default CHANGES_PAGE_SIZE)
+
+        Returns:
+        - 200: changes, each with its seq, table, id, op (upsert or delete) and row
+          (null for a delete), next (the seq to sync from next), and more (whether
+          next can be requested right away)
+        - 400: Invalid parameters
+        - 410: Tombstones after since were pruned; the client must resync from 0
+    """
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', CHANGES_PAGE_SIZE, type=int)
+    if since < 0 or not 1 <= limit <= CHANGES_MAX_PAGE_SIZE:
+        return jsonify({"error": f"since must be >= 0 and limit between 1 and {CHANGES_MAX_PAGE_SIZE}"}), 400
+    try:
+        changes, more = crud.get_changes(since, limit)
+    except crud.ChangeLogExpired as e:
+        return jsonify({"error": str(e), "horizon": e.horizon}), 410
+    for change in changes:
+        row = change["row"]
+        if row is not None:
+            row["active"] = bool(row["active"])
+            if change["table"] == 'selections':
+                row["price"] = f"{row['price']:.2f}"
+    next_seq = changes[-1]["seq"] if changes else since
+    return jsonify({"changes": changes, "next": next_seq, "more": more}), 200
+
+
+@main.route('/webhooks', methods=['POST'])
+def create_webhook():
+    """
+        Subscribe an endpoint to catalog notifications.
+
+        Every notification is POSTed as {"deliveries": [{"id", "topic", "created_at", "data"}]},
+        batched per endpoint, at least once: receivers deduplicate on the delivery id.
+
+        Request Body:
+        - url: The http(s) URL notified (str)
+        - topics: selection.settled, event.status and/or event.active (list of str)
+        - secret: Key of the X-Webhook-Signature HMAC-SHA256 header (str, optional)
+
+        Returns:
+        - 201: The subscription
+        - 400: Validation error
+    """
+    data = request.get_json()
+    try:
+        subscription = webhooks.create_subscription(schemas.WebhookSubscriptionCreate(**data))
+    except ValidationError as e:
+        return jsonify(e.errors()), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(subscription), 201
+
+
+@main.route('/webhooks', methods=['GET'])
+def get_webhooks():
+    """
+        Retrieve the webhook subscriptions with their pending and dead delivery counts.
+    """
+    return jsonify(webhooks.get_subscriptions())
+
+
+@main.route('/webhooks/<int:subscription_id>', methods=['DELETE'])
+def delete_webhook(subscription_id):
+    """
+        Unsubscribe an endpoint, dropping its undelivered notifications.
+
+        Returns:
+        - 204: Subscription deleted
+        - 404: Subscription not found
+    """
+    if not webhooks.delete_subscription(subscription_id):
+        return jsonify({"error": "Webhook subscription not found"}), 404
+    return '', 204
+
+
+@main.route('/webhooks/<int:subscription_id>/dead-letters', methods=['GET'])
+def get_webhook_dead_letters(subscription_id):
+    """
+        Retrieve the deliveries of a subscription that failed too many times.
+
+        Query Parameters:
+        - limit: The maximum number of deliveries returned (int, default 100)
+
+        Returns:
+        - 200: The oldest dead deliveries with their attempts and last error
+        - 404: Subscription not found
+    """
+    if webhooks.get_subscription(subscription_id) is None:
+        return jsonify({"error": "Webhook subscription not found"}), 404
+    return jsonify(webhooks.get_dead_letters(subscription_id, request.args.get('limit', 100, type=int)))
+
+
+@main.route('/webhooks/<int:subscription_id>/dead-letters/replay', methods=['POST'])
+def replay_webhook_dead_letters(subscription_id):
+    """
+        Queue the dead deliveries of a subscription again.
+
+        Returns:
+        - 200: The number of deliveries queued again
+        - 404: Subscription not found
+    """
+    if webhooks.get_subscription(subscription_id) is None:
+        return jsonify({"error": "Webhook subscription not found"}), 404
+    return jsonify({"replayed": webhooks.replay_dead_letters(subscription_id)})
+
+
+@main.route('/jobs/status', methods=['GET'])
+def get_jobs_status():
+    """
+        Retrieve the state of the background status queue.
+
+        Returns:
+            JSON response containing the queue depth, the lag in seconds of the oldest
+            pending job, and the worker pool size and processed count when it is running,
+            with the statistics of selection group commit, the archived row counts and
+            the webhook deliveries when they are enabled.
+    """
+    status = jobs.get_queue_status()
+    queue = current_app.extensions.get('status_queue')
+    status['enabled'] = queue is not None
+    status['workers'] = queue.workers if queue else 0
+    status['processed'] = queue.processed if queue else 0
+    batcher = current_app.extensions.get('selection_batcher')
+    if batcher is not None:
+        status['group_commit'] = batcher.stats()
+    archiver = current_app.extensions.get('archiver')
+    if archiver is not None:
+        status['archived'] = archiver.stats()
+    dispatcher = current_app.extensions.get('webhook_dispatcher')
+    if dispatcher is not None:
+        status['webhooks'] = {**webhooks.get_delivery_status(), **dispatcher.stats()}
+    return jsonify(status)
+
+
+# Number of nodes encoded per chunk of a streamed catalog tree
+TREE_CHUNK_NODES = 8192
+
+
+def _tree_binary(nodes):
+    """
+        Encode a node stream as a little-endian int32 parent array, chunk by chunk.
+    """
+    parents = []
+    for _, parent, _, _ in nodes:
+        parents.append(parent)
+        if len(parents) == TREE_CHUNK_NODES:
+            yield struct.pack(f'<{len(parents)}i', *parents)
+            parents = []
+    if parents:
+        yield struct.pack(f'<{len(parents)}i', *parents)
+
+
+def _tree_ndjson(nodes):
+    """
+        Encode a node stream as NDJSON, followed by a line with the node counts.
+
+        In preorder a node has children exactly when the next node is its first child,
+        so the internal nodes are counted on the fly without remembering the parents.
+    """
+    count = internal_nodes = 0
+    lines = []
+    for index, parent, kind, row_id in nodes:
+        count += 1
+        if parent >= 0 and parent == index - 1:
+            internal_nodes += 1
+        lines.append(json.dumps({"node": index, "parent": parent, "kind": kind, "id": row_id}))
+        if len(lines) == TREE_CHUNK_NODES:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    lines.append(json.dumps({"nodes": count, "internal_nodes": internal_nodes, "leaves": count - internal_nodes}))
+    yield '\n'.join(lines) + '\n'
+
+
+@main.route('/catalog/tree', methods=['GET'])
+def get_catalog_tree():
+    """
+        Stream the sport/event/selection hierarchy as a parent-index array.
+
+        Node 0 is the catalog root, followed by the sports, events and selections in
+        preorder. The response is streamed, so memory use does not depend on the catalog size.
+
+        Query Parameters:
+        - format: ndjson (default) or binary; binary is also chosen by Accept: application/octet-stream
+
+        Returns:
+            NDJSON lines with node, parent, kind and id, closed by a line with the node,
+            internal node and leaf counts; or the parent array as little-endian int32,
+            readable by Find_internal_nodes as a .bin file.
+    """
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'binary' if request.accept_mimetypes.best == 'application/octet-stream' else 'ndjson'
+    if fmt not in ('ndjson', 'binary'):
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    nodes = crud.iter_catalog_tree()
+    if fmt == 'binary':
+        return Response(stream_with_context(_tree_binary(nodes)), mimetype='application/octet-stream')
+    return Response(stream_with_context(_tree_ndjson(nodes)), mimetype='application/x-ndjson')
+
+
+@main.route('/catalog/tree/stats', methods=['GET'])
+def get_catalog_tree_stats():
+    """
+        Retrieve the node, internal node and leaf counts of the catalog tree.
+
+        Returns:
+            JSON response containing the counts, computed by the database.
     """
-    selections = crud.get_all_selections()
-    return jsonify([selection.to_dict() for selection in selections])
+    return jsonify(crud.get_catalog_tree_stats())
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 
@@ -24,10 +24,12 @@ class SportUpdate(BaseModel):
             name (Optional[str]): The updated name of the sport.
             slug (Optional[str]): The updated slug for the sport.
             active (Optional[bool]): The updated active status of the sport.
+            expected_version (Optional[int]): Only update if the sport is at this version (default is None).
     """
     name: Optional[str]
     slug: Optional[str]
     active: Optional[bool]
+    expected_version: Optional[int] = None
 
 
 class EventCreate(BaseModel):
@@ -67,6 +69,7 @@ class EventUpdate(BaseModel):
             status (Optional[str]): The updated status of the event.
             scheduled_start (Optional[str]): The updated scheduled start time of the event.
             actual_start (Optional[str]): The updated actual start time of the event (default is None).
+            expected_version (Optional[int]): Only update if the event is at this version (default is None).
     """
     name: Optional[str]
     slug: Optional[str]
@@ -76,6 +79,7 @@ class EventUpdate(BaseModel):
     status: Optional[str]
     scheduled_start: Optional[str]
     actual_start: Optional[str] = None
+    expected_version: Optional[int] = None
 
 
 class SelectionCreate(BaseModel):
@@ -106,12 +110,46 @@ class SelectionUpdate(BaseModel):
             price (Optional[float]): The updated price of the selection.
             active (Optional[bool]): The updated active status of the selection.
             outcome (Optional[str]): The updated outcome status of the selection.
+            expected_version (Optional[int]): Only update if the selection is at this version (default is None).
     """
     name: Optional[str]
     event_id: Optional[int]
     price: Optional[float]
     active: Optional[bool]
     outcome: Optional[str]
+    expected_version: Optional[int] = None
+
+
+class EventSettle(BaseModel):
+    """
+        Pydantic model for settling the selections of an event.
+
+        Attributes:
+            winners (List[int]): The IDs of the selections settled as Win.
+            losers (List[int]): The IDs of the selections settled as Lose.
+            void (List[int]): The IDs of the selections settled as Void.
+            remaining (Optional[str]): The outcome for unsettled selections not listed (default is None, left as is).
+            status (str): The status the event transitions to (default is Ended).
+    """
+    winners: List[int] = []
+    losers: List[int] = []
+    void: List[int] = []
+    remaining: Optional[str] = None
+    status: str = 'Ended'
+
+
+class WebhookSubscriptionCreate(BaseModel):
+    """
+        Pydantic model for subscribing an endpoint to webhooks.
+
+        Attributes:
+            url (str): The http(s) URL the notifications are POSTed to.
+            topics (List[str]): The topics subscribed to: selection.settled, event.status and/or event.active.
+            secret (Optional[str]): The key of the X-Webhook-Signature HMAC-SHA256 header (default is None, unsigned).
+    """
+    url: str
+    topics: List[str]
+    secret: Optional[str] = None
 
 
 class Filter(BaseModel):
@@ -123,8 +161,14 @@ class Filter(BaseModel):
             min_active_events (Optional[int]): The minimum number of active events.
             min_active_selections (Optional[int]): The minimum number of active selections.
             scheduled_start (Optional[List[str]]): A list with the start and end time to filter events by scheduled start time.
+            include_archived (bool): Also search archived events and selections.
+            limit (Optional[int]): The page size; results are unpaginated if None.
+            offset (int): The number of results to skip before the page.
     """
     name_regex: Optional[str]
     min_active_events: Optional[int]
     min_active_selections: Optional[int]
     scheduled_start: Optional[List[str]]
+    include_archived: bool = False
+    limit: Optional[int] = Field(None, ge=1)
+    offset: int = Field(0, ge=0)
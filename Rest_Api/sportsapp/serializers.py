@@ -0,0 +1,441 @@
+import importlib.util
+import struct
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from json.encoder import encode_basestring_ascii
+from flask import request, current_app
+import msgpack
+from sqlalchemy import Boolean, DateTime, Integer, Numeric, String
+from werkzeug.http import http_date
+from sportsapp.database import db
+
+# pyarrow is optional and slow to import, so it is only imported to encode Arrow
+ARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+EPOCH = datetime(1970, 1, 1)
+# Strings are dictionary-encoded when at most this fraction of the values are distinct
+DICTIONARY_MAX_RATIO = 0.5
+# Rows per chunk of a JSON list; each chunk is transposed and encoded column by column
+JSON_CHUNK_ROWS = 10000
+# Child table and parent column of the tables whose JSON nests their children, as Model.to_dict does
+JSON_CHILDREN = {'sports': ('events', 'sport_id'), 'events': ('selections', 'event_id')}
+# Narrowest little-endian integer layouts, as (type, struct code, lower bound, upper bound)
+INT_LAYOUTS = [('int8', 'b', -2 ** 7, 2 ** 7), ('int16', 'h', -2 ** 15, 2 ** 15),
+               ('int32', 'i', -2 ** 31, 2 ** 31), ('int64', 'q', -2 ** 63, 2 ** 63)]
+
+
+def negotiate():
+    """
+        Pick the response format of a list or search request from its Accept header.
+
+        Returns:
+            str: The JSON, MessagePack or Arrow IPC stream media type; Arrow is only
+            offered when pyarrow is installed.
+    """
+    offered = [JSON, MSGPACK] + ([ARROW_STREAM] if ARROW_AVAILABLE else [])
+    return request.accept_mimetypes.best_match(offered, default=JSON)
+
+
+def _column_kind(column):
+    if isinstance(column.type, Boolean):
+        return 'bool'
+    if isinstance(column.type, Integer):
+        return 'int'
+    if isinstance(column.type, Numeric):
+        return 'float64'
+    if isinstance(column.type, DateTime):
+        return 'timestamp[ms]'
+    return 'str'
+
+
+def _to_epoch_ms(value):
+    """
+        Convert a timestamp to epoch milliseconds; naive ones are taken as UTC.
+
+        Raises:
+            ValueError: If the value is a string that is not an ISO 8601 timestamp.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # fromisoformat only accepts the Z suffix from Python 3.11
+        value = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(milliseconds=1)
+
+
+def table_columns(table, rows):
+    """
+        Split rows into typed columns following the model of their table.
+
+        Timestamps are stored as given by clients, so a timestamp column holding a value
+        that is not an ISO 8601 timestamp falls back to a column of the stored strings.
+
+        Args:
+            table (str): The table the rows were selected from.
+            rows (Rows): The rows, as returned by crud.
+
+        Returns:
+            list[tuple]: The name, kind and list of values of every column.
+    """
+    if not rows:
+        return []
+    model_columns = db.metadata.tables[table].columns
+    columns = []
+    for name, values in zip(rows.columns, zip(*rows.data)):
+        kind = _column_kind(model_columns[name]) if name in model_columns else 'str'
+        if kind == 'timestamp[ms]':
+            try:
+                values = [_to_epoch_ms(value) for value in values]
+            except ValueError:
+                kind, values = 'str', [None if value is None else str(value) for value in values]
+        elif kind == 'bool':
+            values = [None if value is None else bool(value) for value in values]
+        elif kind == 'float64':
+            values = [None if value is None else float(value) for value in values]
+        else:
+            values = list(values)
+        columns.append((name, kind, values))
+    return columns
+
+
+def _int_layout(values):
+    """
+        Pick the narrowest integer layout that holds all values.
+
+        Returns:
+            tuple: The integer type name and its struct code.
+    """
+    low, high = (min(values), max(values)) if values else (0, 0)
+    for int_type, code, lower, upper in INT_LAYOUTS:
+        if lower <= low and high < upper:
+            return int_type, code
+    raise OverflowError("Integer column does not fit in 64 bits")
+
+
+def _pack_ints(values):
+    """
+        Pack integers with the narrowest layout that holds them all.
+
+        Returns:
+            tuple: The integer type and the packed bytes.
+    """
+    int_type, code = _int_layout(values)
+    return int_type, struct.pack(f'<{len(values)}{code}', *values)
+
+
+def _pack_array(kind, values):
+    """
+        Pack a numeric, boolean or timestamp column as a little-endian typed array.
+
+        Returns:
+            tuple: The concrete type and the packed bytes; nulls are packed as zero.
+    """
+    if kind == 'bool':
+        return 'bool', bytes(1 if value else 0 for value in values)
+    if kind == 'float64':
+        return 'float64', struct.pack(f'<{len(values)}d', *(value or 0.0 for value in values))
+    if kind == 'timestamp[ms]':
+        return 'timestamp[ms]', struct.pack(f'<{len(values)}q', *(value or 0 for value in values))
+    return _pack_ints([value or 0 for value in values])
+
+
+def encode_msgpack(table, rows):
+    """
+        Encode rows as a columnar MessagePack document.
+
+        Numeric, boolean and timestamp columns are typed little-endian arrays stored as
+        binary, integers in the narrowest of int8/16/32/64 that fits; repetitive strings
+        are dictionary-encoded. A column with nulls carries a one-byte-per-row validity array.
+
+        Args:
+            table (str): The table the rows were selected from.
+            rows (Rows): The rows, as returned by crud.
+
+        Returns:
+            bytes: The encoded document: {"rows": n, "columns": [{"name", "type", "data", ...}]}.
+    """
+    columns = []
+    for name, kind, values in table_columns(table, rows):
+        column = {"name": name}
+        if kind == 'str':
+            distinct = list(dict.fromkeys(values))
+            if len(distinct) <= DICTIONARY_MAX_RATIO * len(values):
+                index = {value: i for i, value in enumerate(distinct)}
+                index_type, data = _pack_ints([index[value] for value in values])
+                column.update(type='dictionary', index_type=index_type, values=distinct, data=data)
+            else:
+                column.update(type='str', data=values)
+        else:
+            column['type'], column['data'] = _pack_array(kind, values)
+            if any(value is None for value in values):
+                column['valid'] = bytes(value is not None for value in values)
+        columns.append(column)
+    return msgpack.packb({"rows": len(rows), "columns": columns}, use_bin_type=True)
+
+
+def _unpack_array(kind, data, count):
+    """
+        Unpack a typed array packed by _pack_array or _pack_ints.
+
+        Returns:
+            list: The values; booleans as bool, timestamps as naive datetimes.
+    """
+    if kind == 'bool':
+        return [value == 1 for value in data]
+    if kind == 'float64':
+        return list(struct.unpack(f'<{count}d', data))
+    if kind == 'timestamp[ms]':
+        return [EPOCH + timedelta(milliseconds=value) for value in struct.unpack(f'<{count}q', data)]
+    code = next(code for int_type, code, _, _ in INT_LAYOUTS if int_type == kind)
+    return list(struct.unpack(f'<{count}{code}', data))
+
+
+def decode_msgpack(data):
+    """
+        Decode a columnar MessagePack document produced by encode_msgpack.
+
+        Args:
+            data (bytes): The encoded document.
+
+        Returns:
+            tuple: The number of rows, and the name and list of values of every column.
+    """
+    document = msgpack.unpackb(data, raw=False)
+    count = document["rows"]
+    columns = []
+    for column in document["columns"]:
+        if column["type"] == 'dictionary':
+            distinct = column["values"]
+            values = [distinct[i] for i in _unpack_array(column["index_type"], column["data"], count)]
+        elif column["type"] == 'str':
+            values = column["data"]
+        else:
+            values = _unpack_array(column["type"], column["data"], count)
+            if "valid" in column:
+                values = [value if valid else None for value, valid in zip(values, column["valid"])]
+        columns.append((column["name"], values))
+    return count, columns
+
+
+def encode_arrow(table, rows):
+    """
+        Encode rows as an Arrow IPC stream with one record batch.
+
+        Args:
+            table (str): The table the rows were selected from.
+            rows (Rows): The rows, as returned by crud.
+
+        Returns:
+            bytes: The encoded stream.
+    """
+    import pyarrow
+    arrow_types = {'bool': pyarrow.bool_(), 'float64': pyarrow.float64(),
+                   'timestamp[ms]': pyarrow.timestamp('ms'), 'str': pyarrow.string()}
+    arrays, names = [], []
+    for name, kind, values in table_columns(table, rows):
+        if kind == 'int':
+            int_type, _ = _int_layout([value for value in values if value is not None])
+            array = pyarrow.array(values, type=getattr(pyarrow, int_type)())
+        elif kind == 'str' and len(set(values)) <= DICTIONARY_MAX_RATIO * len(values):
+            distinct = list(dict.fromkeys(values))
+            index = {value: i for i, value in enumerate(distinct)}
+            int_type, _ = _int_layout([len(distinct)])
+            array = pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array([index[value] for value in values], type=getattr(pyarrow, int_type)()),
+                pyarrow.array(distinct, type=pyarrow.string()))
+        else:
+            array = pyarrow.array(values, type=arrow_types[kind])
+        arrays.append(array)
+        names.append(name)
+    batch = pyarrow.RecordBatch.from_arrays(arrays, names=names)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def _json_text(value):
+    return encode_basestring_ascii(str(value))
+
+
+# JSON text of the scalar types of query results, as Flask's JSON provider encodes them
+_JSON_SCALARS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    float: float.__repr__,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+    Decimal: _json_text,
+    datetime: lambda value: encode_basestring_ascii(http_date(value)),
+    date: lambda value: encode_basestring_ascii(http_date(value)),
+}
+
+
+def _json_scalar(value):
+    encode = _JSON_SCALARS.get(type(value))
+    return encode(value) if encode is not None else current_app.json.dumps(value)
+
+
+def _process_or_keep(processor, value):
+    try:
+        return processor(value)
+    except ValueError:
+        return value
+
+
+class _JSONLayout:
+    """
+        The rendering of the rows of a query as JSON objects, computed once per query.
+
+        Every row is rendered with one %-format of a template holding the keys in the
+        sorted order of jsonify. Values are encoded a column at a time: NOT NULL integer
+        and string columns by the C encoders of their type, the other columns value by
+        value. Typed layouts first convert the values with the result processors of the
+        model types, as the ORM does, so that booleans, decimals and datetimes are
+        rendered as Model.to_dict renders them.
+
+        Attributes:
+            child (str): The key of the nested list of children, if any.
+            id_index (int): The position of the id column in the rows.
+    """
+
+    def __init__(self, table, columns, typed=False, child=None):
+        model_columns = db.metadata.tables[table].columns
+        dialect = db.engine.dialect
+        self.child = child
+        self.id_index = columns.index('id') if 'id' in columns else None
+        self._encoders = []
+        for name in columns:
+            column = model_columns.get(name)
+            processor = None
+            if typed and column is not None:
+                processor = column.type.dialect_impl(dialect).result_processor(dialect, None)
+            fast = None
+            if column is not None and not column.nullable and processor is None:
+                if isinstance(column.type, Integer) and not isinstance(column.type, Boolean):
+                    fast = int.__repr__
+                elif isinstance(column.type, String):
+                    fast = encode_basestring_ascii
+            self._encoders.append((fast, processor))
+        keys = sorted(list(columns) + ([child] if child else []))
+        self._slots = [None if key == child else columns.index(key) for key in keys]
+        self._template = '{' + ','.join(f"{encode_basestring_ascii(key).replace('%', '%%')}:%s" for key in keys) + '}'
+
+    def _encode(self, index, values):
+        fast, processor = self._encoders[index]
+        if processor is not None:
+            try:
+                values = list(map(processor, values))
+            except ValueError:
+                # Timestamps are stored as given by clients; those the processor cannot parse are sent as stored
+                values = [_process_or_keep(processor, value) for value in values]
+        elif fast is not None:
+            try:
+                return list(map(fast, values))
+            except TypeError:
+                # SQLite columns accept values of any type, which the generic encoder handles
+                pass
+        return list(map(_json_scalar, values))
+
+    def render(self, data, children=None):
+        """
+            Render rows as the comma-separated JSON objects of a list.
+
+            Args:
+                data (list[tuple]): The rows.
+                children (list[str], optional): The JSON list of children of every row.
+
+            Returns:
+                str: The JSON text, without the brackets of the list.
+        """
+        if not data:
+            return ''
+        columns = list(zip(*data))
+        encoded = [children if index is None else self._encode(index, columns[index]) for index in self._slots]
+        return ','.join([self._template % values for values in zip(*encoded)])
+
+
+def encode_json(table, rows):
+    """
+        Encode rows as a JSON list of objects, as jsonify encodes the dicts of the rows.
+
+        Args:
+            table (str): The table the rows were selected from.
+            rows (Rows): The rows, as returned by crud.
+
+        Returns:
+            str: The JSON text.
+    """
+    layout = _JSONLayout(table, rows.columns)
+    chunks = [layout.render(rows.data[start:start + JSON_CHUNK_ROWS])
+              for start in range(0, len(rows), JSON_CHUNK_ROWS)]
+    return '[' + ','.join(chunks) + ']\n'
+
+
+def _render_tree(layouts, groups, level, data):
+    """
+        Render rows of a level with their children, grandchildren... nested.
+    """
+    layout = layouts[level]
+    if layout.child is None:
+        return layout.render(data)
+    children = groups[level + 1]
+    texts = ['[' + _render_tree(layouts, groups, level + 1, children.get(row[layout.id_index], ())) + ']'
+             for row in data]
+    return layout.render(data, texts)
+
+
+def encode_json_tree(levels):
+    """
+        Encode the rows of a table with their children nested, as jsonify encodes Model.to_dict.
+
+        The children of every level are grouped by parent with references to their
+        tuples, and rendered one chunk of top-level rows at a time, so that no dict or
+        ORM object is built per row.
+
+        Args:
+            levels (list[tuple]): The table and Rows of the top level, then of its children, grandchildren...
+
+        Returns:
+            str: The JSON text.
+    """
+    layouts, groups = [], []
+    for depth, (table, rows) in enumerate(levels):
+        child = JSON_CHILDREN[table][0] if depth + 1 < len(levels) else None
+        layouts.append(_JSONLayout(table, rows.columns, typed=True, child=child))
+        group = None
+        if depth:
+            parent_index = rows.columns.index(JSON_CHILDREN[levels[depth - 1][0]][1])
+            group = {}
+            for row in rows.data:
+                group.setdefault(row[parent_index], []).append(row)
+        groups.append(group)
+    data = levels[0][1].data
+    chunks = [_render_tree(layouts, groups, 0, data[start:start + JSON_CHUNK_ROWS])
+              for start in range(0, len(data), JSON_CHUNK_ROWS)]
+    return '[' + ','.join(chunks) + ']\n'
+
+
+def encode(mimetype, table, rows):
+    """
+        Encode rows in a format picked by negotiate.
+
+        Args:
+            mimetype (str): JSON, MSGPACK or ARROW_STREAM.
+            table (str): The table the rows were selected from.
+            rows (Rows): The rows, as returned by crud.
+
+        Returns:
+            bytes: The encoded rows, or str for JSON.
+    """
+    if mimetype == JSON:
+        return encode_json(table, rows)
+    if mimetype == ARROW_STREAM:
+        return encode_arrow(table, rows)
+    return encode_msgpack(table, rows)
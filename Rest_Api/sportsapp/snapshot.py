@@ -0,0 +1,196 @@
+import gzip
+import time
+import click
+import msgpack
+from flask.cli import AppGroup
+from sqlalchemy import text, bindparam
+from sportsapp import models, serializers
+from sportsapp.crud import Rows
+from sportsapp.compression import LEVELS
+from sportsapp.database import db
+
+FORMAT = 'sportsapp-snapshot'
+FORMAT_VERSION = 1
+# Catalog tables in insertion order, parents before children, then the archive tables
+TABLES = ('sports', 'events', 'selections', 'events_archive', 'selections_archive')
+# Rows per chunk: each is one columnar MessagePack document on export and one transaction on import
+CHUNK_ROWS = 100000
+
+
+class SnapshotError(ValueError):
+    """
+        Raised when a snapshot cannot be imported.
+    """
+
+
+def export_snapshot(fileobj, chunk_rows=CHUNK_ROWS, progress=None):
+    """
+        Stream the catalog to a gzip-compressed snapshot.
+
+        The snapshot is a sequence of MessagePack frames: a header with the row count of
+        every table, one frame per chunk of rows holding a columnar document of
+        serializers.encode_msgpack, and an end frame with the row counts written. The
+        tables are read in one transaction, so the snapshot is consistent. Timestamps
+        are written as epoch milliseconds, aware ones converted to UTC, except in chunks
+        holding a free-form timestamp, whose column keeps the strings as stored.
+
+        Args:
+            fileobj (file): The binary file the snapshot is written to.
+            chunk_rows (int): The number of rows per chunk.
+            progress (callable, optional): Called with the table, the rows written so far and its row count.
+
+        Returns:
+            dict: The number of rows written per table.
+    """
+    written = {}
+    with db.engine.connect() as conn, \
+            gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=LEVELS['gzip']) as out:
+        # pysqlite only begins transactions for writes; an explicit one pins the reads to one snapshot
+        conn.exec_driver_sql('BEGIN')
+        counts = {table: conn.execute(text(f'SELECT COUNT(*) FROM {table}')).scalar() for table in TABLES}
+        out.write(msgpack.packb({"format": FORMAT, "version": FORMAT_VERSION, "rows": counts}))
+        for table in TABLES:
+            written[table] = 0
+            result = conn.execution_options(yield_per=chunk_rows).execute(text(f'SELECT * FROM {table} ORDER BY id'))
+            columns = tuple(result.keys())
+            for rows in result.partitions(chunk_rows):
+                data = serializers.encode_msgpack(table, Rows(columns, rows))
+                out.write(msgpack.packb({"table": table, "data": data}, use_bin_type=True))
+                written[table] += len(rows)
+                if progress is not None:
+                    progress(table, written[table], counts[table])
+        conn.rollback()
+        out.write(msgpack.packb({"end": True, "rows": written}))
+    return written
+
+
+def _drop_deferred(conn):
+    """
+        Drop the indexes and triggers of the catalog tables before a bulk load.
+
+        Returns:
+            list[str]: The CREATE INDEX statements to run after the load.
+    """
+    tables = {"tables": list(TABLES)}
+    indexes = conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+                                "AND tbl_name IN :tables").bindparams(bindparam('tables', expanding=True)),
+                           tables).all()
+    triggers = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name IN :tables")
+                            .bindparams(bindparam('tables', expanding=True)), tables).scalars().all()
+    for name, _ in indexes:
+        conn.exec_driver_sql(f'DROP INDEX "{name}"')
+    for name in triggers:
+        conn.exec_driver_sql(f'DROP TRIGGER "{name}"')
+    return [sql for _, sql in indexes]
+
+
+def import_snapshot(fileobj, progress=None):
+    """
+        Load a snapshot written by export_snapshot into an empty catalog.
+
+        Every chunk is inserted with one executemany statement in its own transaction.
+        The indexes and change log triggers of the catalog tables are dropped for the
+        load, and recreated once afterwards, the change log being backfilled with one
+        entry per imported row. Columns unknown to the current schema are skipped. The
+        chunks committed before a failure are kept.
+
+        Args:
+            fileobj (file): The binary file the snapshot is read from.
+            progress (callable, optional): Called with the table, the rows imported so far and its row count.
+
+        Returns:
+            dict: The number of rows imported per table.
+
+        Raises:
+            SnapshotError: If the catalog is not empty, or the snapshot is invalid or truncated.
+    """
+    unpacker = msgpack.Unpacker(gzip.GzipFile(fileobj=fileobj, mode='rb'), raw=False,
+                                max_buffer_size=2 ** 31 - 1)
+    header = next(unpacker, None)
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise SnapshotError("Not a catalog snapshot")
+    if header["version"] > FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {header['version']}")
+    engine = db.engine
+    with engine.begin() as conn:
+        for table in TABLES:
+            if conn.execute(text(f'SELECT EXISTS (SELECT 1 FROM {table})')).scalar():
+                raise SnapshotError(f"Table {table} is not empty")
+        deferred_indexes = _drop_deferred(conn)
+    # Snapshots of older versions may lack some tables
+    imported = {table: 0 for table in TABLES if table in header["rows"]}
+    try:
+        for frame in unpacker:
+            if frame.get("end"):
+                if frame["rows"] != imported:
+                    raise SnapshotError(f"Snapshot lists {frame['rows']} rows, but holds {imported}")
+                return imported
+            table = frame["table"]
+            if table not in imported:
+                raise SnapshotError(f"Unknown table {table}")
+            count, columns = serializers.decode_msgpack(frame["data"])
+            known = db.metadata.tables[table].columns
+            columns = [(name, values) for name, values in columns if name in known]
+            statement = (f"INSERT INTO {table} ({', '.join(name for name, _ in columns)}) "
+                         f"VALUES ({', '.join('?' for _ in columns)})")
+            with engine.begin() as conn:
+                conn.exec_driver_sql(statement, list(zip(*(values for _, values in columns))))
+            imported[table] += count
+            if progress is not None:
+                progress(table, imported[table], header["rows"][table])
+        raise SnapshotError("Snapshot is truncated")
+    finally:
+        with engine.begin() as conn:
+            for statement in deferred_indexes + models.SQLITE_EXTRA_DDL:
+                conn.exec_driver_sql(statement)
+
+
+class _Progress:
+    """
+        Report the progress of an export or import on stderr, at most once per second.
+    """
+
+    def __init__(self, verb):
+        self.verb = verb
+        self.start = time.monotonic()
+        self.reported = 0.0
+
+    def __call__(self, table, done, total):
+        now = time.monotonic()
+        if now - self.reported < 1.0 and done < total:
+            return
+        self.reported = now
+        rate = done / max(now - self.start, 1e-9)
+        click.echo(f"{self.verb} {table}: {done}/{total} rows ({rate:,.0f} rows/s)", err=True)
+        if done >= total:
+            self.start = now
+
+
+cli = AppGroup('snapshot', help='Export and import catalog snapshots.')
+
+
+@cli.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--chunk-rows', type=click.IntRange(min=1), default=CHUNK_ROWS, show_default=True,
+              help='Rows per chunk.')
+def export_command(path, chunk_rows):
+    """
+        Export the catalog to a snapshot file, or - for stdout.
+    """
+    with click.open_file(path, 'wb') as fileobj:
+        written = export_snapshot(fileobj, chunk_rows, _Progress('Exported'))
+    click.echo(f"Exported {sum(written.values())} rows to {path}", err=True)
+
+
+@cli.command('import')
+@click.argument('path', type=click.Path(dir_okay=False, allow_dash=True))
+def import_command(path):
+    """
+        Import a snapshot file, or - for stdin, into an empty catalog.
+    """
+    try:
+        with click.open_file(path, 'rb') as fileobj:
+            imported = import_snapshot(fileobj, _Progress('Imported'))
+    except SnapshotError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Imported {sum(imported.values())} rows from {path}", err=True)
@@ -0,0 +1,500 @@
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import random
+import socket
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import HTTPHandler, HTTPSHandler, ProxyHandler, Request, build_opener
+from flask import current_app
+from sqlalchemy import text, bindparam
+from sportsapp.database import db
+from sportsapp.models import WEBHOOK_TRIGGERS
+
+# Topics a subscription can ask for, reported by the triggers of models.WEBHOOK_TRIGGERS
+TOPICS = tuple(WEBHOOK_TRIGGERS)
+# Longest error message kept on a failed delivery
+MAX_ERROR_LENGTH = 500
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def _check_address(host, address):
+    """
+        Reject an address of a webhook host unless it is public.
+
+        Raises:
+            ValueError: If the address is loopback, link-local, private or otherwise not global.
+    """
+    ip = ipaddress.ip_address(address.split('%')[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    if not ip.is_global:
+        raise ValueError(f"The webhook host {host} resolves to the non-public address {ip}")
+
+
+def resolve_destination(url, allow_private=False):
+    """
+        Resolve the host of a webhook URL, rejecting it unless all its addresses are public.
+
+        Without this check any client could have the server POST to itself, to the cloud
+        metadata service at 169.254.169.254, or to the private network.
+
+        Args:
+            url (str): The webhook URL.
+            allow_private (bool): Accept loopback, link-local and private addresses too.
+
+        Returns:
+            list[tuple]: The getaddrinfo entries of the host.
+
+        Raises:
+            ValueError: If the URL is not http(s), its host does not resolve, or an address is not public.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in DEFAULT_PORTS or not parts.hostname:
+        raise ValueError("The webhook URL must be http or https")
+    return _resolve(parts.hostname, parts.port or DEFAULT_PORTS[parts.scheme], allow_private)
+
+
+def _resolve(host, port, allow_private):
+    try:
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"The webhook host {host} does not resolve: {e}")
+    if not allow_private:
+        for *_, sockaddr in addresses:
+            _check_address(host, sockaddr[0])
+    return addresses
+
+
+def create_subscription(subscription):
+    """
+        Subscribe an endpoint to webhook topics.
+
+        Args:
+            subscription (WebhookSubscriptionCreate): The URL, topics and optional secret.
+
+        Returns:
+            dict: The subscription, without its secret.
+
+        Raises:
+            ValueError: If the URL is not http(s), does not resolve to public addresses
+                unless WEBHOOK_ALLOW_PRIVATE_URLS, or a topic is unknown.
+    """
+    resolve_destination(subscription.url, current_app.config['WEBHOOK_ALLOW_PRIVATE_URLS'])
+    unknown = sorted(set(subscription.topics) - set(TOPICS))
+    if unknown or not subscription.topics:
+        raise ValueError(f"Unknown webhook topics {unknown}, expected some of {list(TOPICS)}")
+    with db.engine.connect() as conn:
+        subscription_id = conn.execute(
+            text('INSERT INTO webhook_subscriptions (url, topics, secret, created_at, available_at, failures) '
+                 'VALUES (:url, :topics, :secret, :created_at, 0, 0)'),
+            {"url": subscription.url, "topics": ','.join(dict.fromkeys(subscription.topics)),
+             "secret": subscription.secret, "created_at": time.time()}
+        ).lastrowid
+        conn.commit()
+    return get_subscription(subscription_id)
+
+
+def _subscriptions(where='', params=None):
+    with db.engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT s.id, s.url, s.topics, s.created_at, s.failures, "
+            "(SELECT COUNT(*) FROM webhook_deliveries d WHERE d.status = 'pending' AND d.subscription_id = s.id), "
+            "(SELECT COUNT(*) FROM webhook_deliveries d WHERE d.status = 'dead' AND d.subscription_id = s.id) "
+            f"FROM webhook_subscriptions s {where} ORDER BY s.id"
+        ), params or {}).all()
+    return [{
+        "id": row[0], "url": row[1], "topics": row[2].split(','), "created_at": row[3], "failures": row[4],
+        "pending": row[5], "dead": row[6]
+    } for row in rows]
+
+
+def get_subscription(subscription_id):
+    """
+        Retrieve a webhook subscription with the number of its pending and dead deliveries.
+
+        Returns:
+            dict: The subscription, without its secret, or None if it does not exist.
+    """
+    subscriptions = _subscriptions('WHERE s.id = :id', {"id": subscription_id})
+    return subscriptions[0] if subscriptions else None
+
+
+def get_subscriptions():
+    """
+        Retrieve all webhook subscriptions with the number of their pending and dead deliveries.
+    """
+    return _subscriptions()
+
+
+def delete_subscription(subscription_id):
+    """
+        Unsubscribe an endpoint, dropping its undelivered notifications.
+
+        Returns:
+            bool: True if the subscription existed.
+    """
+    with db.engine.connect() as conn:
+        conn.execute(text('DELETE FROM webhook_deliveries WHERE subscription_id = :id'), {"id": subscription_id})
+        deleted = conn.execute(text('DELETE FROM webhook_subscriptions WHERE id = :id'),
+                               {"id": subscription_id}).rowcount
+        conn.commit()
+    return bool(deleted)
+
+
+def get_dead_letters(subscription_id, limit=100):
+    """
+        Retrieve the deliveries of a subscription that failed too many times.
+
+        Returns:
+            list[dict]: The oldest dead deliveries, with their attempts and last error.
+    """
+    with db.engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT id, topic, payload, created_at, attempts, last_error FROM webhook_deliveries "
+            "WHERE status = 'dead' AND subscription_id = :id ORDER BY id LIMIT :limit"
+        ), {"id": subscription_id, "limit": limit}).all()
+    return [{"id": row[0], "topic": row[1], "data": json.loads(row[2]), "created_at": row[3],
+             "attempts": row[4], "last_error": row[5]} for row in rows]
+
+
+def replay_dead_letters(subscription_id):
+    """
+        Queue the dead deliveries of a subscription again, with a fresh retry budget.
+
+        Returns:
+            int: The number of deliveries queued again.
+    """
+    with db.engine.connect() as conn:
+        replayed = conn.execute(text(
+            "UPDATE webhook_deliveries SET status = 'pending', attempts = 0 "
+            "WHERE status = 'dead' AND subscription_id = :id"
+        ), {"id": subscription_id}).rowcount
+        conn.execute(text('UPDATE webhook_subscriptions SET available_at = 0, failures = 0 WHERE id = :id'),
+                     {"id": subscription_id})
+        conn.commit()
+    notify()
+    return replayed
+
+
+def get_delivery_status():
+    """
+        Retrieve the depth and lag of the webhook deliveries.
+
+        Returns:
+            dict: The number of pending and dead deliveries, and the age in seconds of the oldest pending one.
+    """
+    with db.engine.connect() as conn:
+        pending, dead, oldest = conn.execute(text(
+            "SELECT COUNT(*) FILTER (WHERE status = 'pending'), COUNT(*) FILTER (WHERE status = 'dead'), "
+            "MIN(created_at) FILTER (WHERE status = 'pending') FROM webhook_deliveries"
+        )).one()
+    return {
+        'pending': pending,
+        'dead': dead,
+        'lag_seconds': round(time.time() - oldest, 3) if oldest is not None else 0.0
+    }
+
+
+def sign(secret, body):
+    """
+        Compute the X-Webhook-Signature header of a request body.
+    """
+    return 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def notify():
+    """
+        Wake the webhook dispatcher of the current application after a write.
+    """
+    dispatcher = current_app.extensions.get('webhook_dispatcher')
+    if dispatcher is not None:
+        dispatcher.notify()
+
+
+class _GuardedHTTPConnection(http.client.HTTPConnection):
+    """
+        HTTP connection going through WebhookDispatcher._connect, which checks and leases every attempt.
+    """
+
+    def __init__(self, *args, connect, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect
+
+
+class _GuardedHTTPSConnection(http.client.HTTPSConnection):
+    """
+        HTTPS connection going through WebhookDispatcher._connect, which checks and leases every attempt.
+    """
+
+    def __init__(self, *args, connect, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = connect
+
+
+class _GuardedHTTPHandler(HTTPHandler):
+    def __init__(self, connect):
+        super().__init__()
+        self._connect = connect
+
+    def http_open(self, req):
+        return self.do_open(_GuardedHTTPConnection, req, connect=self._connect)
+
+
+class _GuardedHTTPSHandler(HTTPSHandler):
+    def __init__(self, connect):
+        super().__init__()
+        self._connect = connect
+
+    def https_open(self, req):
+        return self.do_open(_GuardedHTTPSConnection, req, context=self._context, connect=self._connect)
+
+
+class WebhookDispatcher:
+    """
+        Bounded worker pool POSTing webhook deliveries to the subscribed endpoints.
+
+        A worker claims an endpoint by leasing its subscription, sends up to batch_size
+        of its pending deliveries in one request, and then deletes them, so an endpoint
+        has at most one request in flight and gets its notifications in order. A failed
+        request backs the endpoint off exponentially, from backoff up to max_backoff
+        seconds, and deliveries failing max_attempts times are dead-lettered for replay.
+        Delivery is at least once: the receiver deduplicates on the delivery IDs.
+
+        Every connection, redirects included, goes to an address resolved and checked
+        by resolve_destination's rules just before connecting, so a host re-pointed to
+        a private address after subscribing is refused too. The lease is extended before
+        each connection attempt, however long resolving the host took.
+
+        Attributes:
+            app (Flask): The application whose database holds the deliveries.
+            workers (int): The number of worker threads.
+            batch_size (int): The maximum number of deliveries per request.
+            timeout (float): Seconds an endpoint has to answer.
+            max_attempts (int): The number of failed attempts after which a delivery is dead.
+            backoff (float): Seconds an endpoint backs off after its first failure.
+            max_backoff (float): The longest backoff in seconds.
+            poll_interval (float): Seconds an idle worker waits before polling again.
+            allow_private (bool): Whether endpoints may resolve to non-public addresses.
+            sent (int): The number of deliveries accepted by their endpoints.
+            failed (int): The number of failed requests.
+            dead (int): The number of deliveries dead-lettered.
+    """
+
+    def __init__(self, app, workers=4, batch_size=100, timeout=5.0, max_attempts=8, backoff=1.0,
+                 max_backoff=300.0, poll_interval=1.0, allow_private=False):
+        self.app = app
+        self.workers = workers
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.allow_private = allow_private
+        self.sent = 0
+        self.failed = 0
+        self.dead = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """
+            Start the worker threads.
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'webhooks-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """
+            Stop the worker threads after their current request, leaving pending deliveries queued.
+
+            Args:
+                timeout (float, optional): Seconds to wait for each worker.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """
+            Wake idle workers after deliveries may have been enqueued.
+        """
+        self._wakeup.set()
+
+    def stats(self):
+        """
+            Report the worker pool size and the delivery counts of this process.
+        """
+        with self._lock:
+            return {'workers': self.workers, 'sent': self.sent, 'failed': self.failed, 'dead': self.dead}
+
+    def _claim(self):
+        """
+            Lease the endpoint with the oldest pending delivery, and read a batch of its deliveries.
+
+            Returns:
+                tuple: The subscription row and its deliveries, or None if no endpoint is due.
+        """
+        now = time.time()
+        with db.engine.connect() as conn:
+            # The lease outlives the request, so a worker dying mid-request only delays the endpoint
+            subscription = conn.execute(text(
+                "UPDATE webhook_subscriptions SET available_at = :leased_until WHERE id = ("
+                "SELECT d.subscription_id FROM webhook_deliveries d "
+                "JOIN webhook_subscriptions s ON s.id = d.subscription_id "
+                "WHERE d.status = 'pending' AND s.available_at <= :now ORDER BY d.id LIMIT 1"
+                ") RETURNING id, url, secret, failures"
+            ), {"now": now, "leased_until": now + 2 * self.timeout}).one_or_none()
+            if subscription is None:
+                conn.rollback()
+                return None
+            deliveries = conn.execute(text(
+                "SELECT id, topic, payload, created_at, attempts FROM webhook_deliveries "
+                "WHERE status = 'pending' AND subscription_id = :id ORDER BY id LIMIT :limit"
+            ), {"id": subscription.id, "limit": self.batch_size}).all()
+            conn.commit()
+        return subscription, deliveries
+
+    def _lease(self, subscription_id):
+        """
+            Extend the lease of an endpoint to cover a connection attempt and its request.
+        """
+        with db.engine.connect() as conn:
+            conn.execute(text('UPDATE webhook_subscriptions SET available_at = :leased_until WHERE id = :id'),
+                         {"id": subscription_id, "leased_until": time.time() + 2 * self.timeout})
+            conn.commit()
+
+    def _connect(self, subscription_id, address, timeout=None, source_address=None):
+        """
+            Connect to an endpoint like socket.create_connection, only to the addresses checked.
+        """
+        host, port = address
+        error = None
+        for family, socktype, proto, _, sockaddr in _resolve(host, port, self.allow_private):
+            self._lease(subscription_id)
+            sock = socket.socket(family, socktype, proto)
+            try:
+                sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                error = e
+                sock.close()
+        raise error or OSError(f"No address to connect to for {host}")
+
+    def _post(self, subscription, deliveries):
+        """
+            POST a batch of deliveries to their endpoint.
+
+            Returns:
+                str: The error, or None if the endpoint accepted the batch.
+        """
+        body = json.dumps({"deliveries": [
+            {"id": row.id, "topic": row.topic, "created_at": row.created_at, "data": json.loads(row.payload)}
+            for row in deliveries
+        ]}).encode()
+        headers = {'Content-Type': 'application/json'}
+        if subscription.secret:
+            headers['X-Webhook-Signature'] = sign(subscription.secret, body)
+
+        def connect(address, timeout=None, source_address=None):
+            return self._connect(subscription.id, address, timeout, source_address)
+
+        handlers = [_GuardedHTTPHandler(connect), _GuardedHTTPSHandler(connect)]
+        if not self.allow_private:
+            # A proxy would connect on our behalf, to addresses that are not checked
+            handlers.append(ProxyHandler({}))
+        try:
+            with build_opener(*handlers).open(Request(subscription.url, data=body, headers=headers, method='POST'),
+                                              timeout=self.timeout):
+                return None
+        except HTTPError as e:
+            return f"HTTP {e.code}"
+        except Exception as e:
+            return str(e) or type(e).__name__
+
+    def _settle(self, subscription, deliveries, error):
+        """
+            Delete an accepted batch, or count the failed attempt and back the endpoint off.
+        """
+        params = {"id": subscription.id, "ids": [row.id for row in deliveries]}
+        ids = bindparam('ids', expanding=True)
+        with db.engine.connect() as conn:
+            if error is None:
+                conn.execute(text('DELETE FROM webhook_deliveries WHERE id IN :ids').bindparams(ids), params)
+                conn.execute(text('UPDATE webhook_subscriptions SET available_at = 0, failures = 0 WHERE id = :id'),
+                             params)
+                dead = 0
+            else:
+                dead = conn.execute(text(
+                    "UPDATE webhook_deliveries SET attempts = attempts + 1, last_error = :error, "
+                    "status = CASE WHEN attempts + 1 >= :max_attempts THEN 'dead' ELSE status END "
+                    "WHERE id IN :ids RETURNING status"
+                ).bindparams(ids), {**params, "error": error[:MAX_ERROR_LENGTH],
+                                    "max_attempts": self.max_attempts}).scalars().all().count('dead')
+                # Full jitter keeps endpoints that failed together from retrying together
+                delay = min(self.backoff * 2 ** subscription.failures, self.max_backoff)
+                conn.execute(text('UPDATE webhook_subscriptions SET available_at = :available_at, '
+                                  'failures = failures + 1 WHERE id = :id'),
+                             {**params, "available_at": time.time() + random.uniform(delay / 2, delay)})
+            conn.commit()
+        with self._lock:
+            if error is None:
+                self.sent += len(deliveries)
+            else:
+                self.failed += 1
+                self.dead += dead
+
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    claimed = self._claim()
+                    if claimed is not None:
+                        self._settle(*claimed, self._post(*claimed))
+                        continue
+                except Exception as e:
+                    print(f"Error delivering webhooks: {e}")
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+
+def init_app(app):
+    """
+        Attach a started webhook dispatcher to the application.
+
+        Deliveries left over from a previous process are picked up on start.
+
+        Args:
+            app (Flask): The Flask application instance.
+
+        Returns:
+            WebhookDispatcher: The started dispatcher.
+    """
+    dispatcher = WebhookDispatcher(
+        app,
+        workers=app.config['WEBHOOK_WORKERS'],
+        batch_size=app.config['WEBHOOK_BATCH_SIZE'],
+        timeout=app.config['WEBHOOK_TIMEOUT'],
+        max_attempts=app.config['WEBHOOK_MAX_ATTEMPTS'],
+        backoff=app.config['WEBHOOK_BACKOFF'],
+        max_backoff=app.config['WEBHOOK_MAX_BACKOFF'],
+        poll_interval=app.config['WEBHOOK_POLL_INTERVAL'],
+        allow_private=app.config['WEBHOOK_ALLOW_PRIVATE_URLS']
+    )
+    app.extensions['webhook_dispatcher'] = dispatcher
+    dispatcher.start()
+    return dispatcher
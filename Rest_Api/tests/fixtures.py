@@ -0,0 +1,192 @@
+import atexit
+import itertools
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+from benchmarks.catalog import insert_catalog
+from sportsapp import create_app
+from sportsapp.database import db, bootstrap_schema
+from sportsapp.models import Sport, Event, Selection
+
+# IDs of the base fixture rows
+SPORT_ID = 1
+EVENT_ID = 1
+
+# Template databases of this process, per catalog shape, built once and cloned for every test
+_templates = {}
+_clone_ids = itertools.count()
+# Clones are files, on tmpfs where there is one: unlike shared-cache in-memory databases,
+# concurrent writers then wait on the busy timeout as in production instead of failing
+_clone_dir = tempfile.mkdtemp(prefix='sportsapp-test-', dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+atexit.register(shutil.rmtree, _clone_dir, ignore_errors=True)
+
+
+def seed_base_catalog(conn):
+    """
+        Insert the base fixture: one cricket sport with one event and three selections.
+
+        Args:
+            conn (Connection): The connection, committed by the caller.
+    """
+    conn.execute(Sport.__table__.insert(), [{"id": SPORT_ID, "name": "Cricket", "slug": "cricket", "active": True}])
+    conn.execute(Event.__table__.insert(), [{
+        "id": EVENT_ID, "name": "Cricket Match", "slug": "cricket-match", "active": True, "type": "preplay",
+        "sport_id": SPORT_ID, "status": "Pending", "scheduled_start": datetime(2023, 6, 10, 20, 0)
+    }])
+    conn.execute(Selection.__table__.insert(), [
+        {"name": name, "event_id": EVENT_ID, "price": price, "active": True, "outcome": "Unsettled"}
+        for name, price in (("1", 1.63), ("X", 4.20), ("2", 5.00))
+    ])
+
+
+def template_database(catalog=None):
+    """
+        Return the in-memory template database of a catalog shape, building it on first use.
+
+        The schema is created and the rows inserted once per process, so each test only
+        pays for a page-level copy of the template.
+
+        Args:
+            catalog (tuple, optional): (sports, events per sport, selections per event) for
+                a bulk synthetic catalog; the base fixture if None.
+
+        Returns:
+            sqlite3.Connection: The template database.
+    """
+    template = _templates.get(catalog)
+    if template is None:
+        template = sqlite3.connect(':memory:', check_same_thread=False)
+        engine = create_engine('sqlite://', creator=lambda: template, poolclass=StaticPool)
+        bootstrap_schema(engine)
+        with engine.begin() as conn:
+            if catalog is None:
+                seed_base_catalog(conn)
+            else:
+                insert_catalog(conn, *catalog)
+        _templates[catalog] = template
+    return template
+
+
+def clone_database(catalog=None):
+    """
+        Copy a template into a new database file with the SQLite backup API.
+
+        The file lives in a directory of the process, so parallel workers never share
+        one, and is removed with it at exit.
+
+        Args:
+            catalog (tuple, optional): The catalog shape, as for template_database.
+
+        Returns:
+            tuple: The SQLAlchemy URI of the clone and the path of its file.
+    """
+    path = os.path.join(_clone_dir, f'{next(_clone_ids)}.db')
+    clone = sqlite3.connect(path)
+    template_database(catalog).backup(clone)
+    clone.close()
+    return f'sqlite:///{path}', path
+
+
+class APITestCase(unittest.TestCase):
+    """
+        Base test case running every test against its own clone of a template database.
+
+        Attributes:
+            catalog (tuple): (sports, events per sport, selections per event) to test
+                against a bulk synthetic catalog instead of the base fixture.
+            app (FlaskClient): The test client of the application under test.
+            sport_id (int): The ID of the base fixture sport.
+    """
+    catalog = None
+
+    def setUp(self):
+        """
+                Set up the test client on a fresh clone of the template database.
+        """
+        self.database_uri, self._database_path = clone_database(self.catalog)
+        self._apps = []
+        self.app = self.create_app().test_client()
+        self.app.testing = True
+        self.sport_id = SPORT_ID
+
+    def tearDown(self):
+        """
+                Tear down the test environment by disposing of the engines and removing the database clone.
+        """
+        for app in self._apps:
+            with app.app_context():
+                db.session.remove()
+                for engine in db.engines.values():
+                    engine.dispose()
+        os.remove(self._database_path)
+
+    def create_app(self, config=None):
+        """
+            Create an application on the database clone of the test.
+
+            Args:
+                config (dict, optional): Configuration values overriding the defaults.
+
+            Returns:
+                Flask: The application.
+        """
+        app = create_app({"SQLALCHEMY_DATABASE_URI": self.database_uri, **(config or {})})
+        self._apps.append(app)
+        return app
+
+
+class WebhookStub:
+    """
+        Local HTTP server recording the webhook requests it receives.
+
+        Attributes:
+            url (str): The URL to subscribe.
+            requests (list): The headers and raw body of every request received.
+            status (int): The status code answered.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                stub.requests.append((dict(self.headers), self.rfile.read(int(self.headers['Content-Length']))))
+                self.send_response(stub.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_port}/hook'
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        """
+            Stop the server.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def wait(self, count, timeout=5.0):
+        """
+            Wait until count requests have been received.
+
+            Returns:
+                list: The requests received.
+        """
+        deadline = time.monotonic() + timeout
+        while len(self.requests) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.requests